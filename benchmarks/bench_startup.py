@@ -0,0 +1,118 @@
+"""
+Import-time and startup benchmark for the headless collector path.
+
+Each measurement runs in a fresh interpreter so it reflects a cold start:
+- interpreter baseline (``python -c pass``)
+- ``import collector`` (headless path, must not load Qt or open the database)
+- collector ready: import plus opening a new database and creating the collector
+- ``import main`` (GUI path), when PyQt5 is installed
+The slowest modules from ``python -X importtime`` are listed for the headless import.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHECK_HEADLESS = '''
+import sys
+import collector, database
+assert database._db_manager is None, 'database opened at import time'
+qt = sorted(name for name in sys.modules if name.startswith('PyQt5'))
+assert not qt, f'Qt loaded by the headless path: {qt}'
+'''
+
+COLLECTOR_READY = '''
+import sys
+from database import DatabaseManager
+from collector import HeadlessCollector
+db = DatabaseManager(sys.argv[1])
+HeadlessCollector(db)
+db.close()
+'''
+
+
+def time_python(code: str, runs: int, args=()) -> list:
+    """
+    Run a snippet in fresh interpreters.
+
+    :param code: Python source passed with -c
+    :param runs: Number of runs
+    :param args: Extra arguments for the snippet
+    :return: Wall times in milliseconds
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code, *args], env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def slowest_imports(module: str, top: int) -> list:
+    """
+    Parse ``-X importtime`` output for a module import.
+
+    :return: (cumulative microseconds, module name) pairs, slowest first
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               env=env, capture_output=True, text=True, check=True)
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def report(label: str, times: list):
+    print(f"{label:<28}: median {statistics.median(times):8.1f} ms   "
+          f"min {min(times):8.1f} ms   max {max(times):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless import/startup benchmark')
+    parser.add_argument('--runs', type=int, default=10, help='Runs per measurement')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list')
+    args = parser.parse_args()
+
+    time_python(CHECK_HEADLESS, 1)
+    print("headless import check      : no Qt, no database connection")
+
+    baseline = time_python('pass', args.runs)
+    headless = time_python('import collector', args.runs)
+    with tempfile.TemporaryDirectory() as tmp:
+        ready = [time_python(COLLECTOR_READY, 1, [os.path.join(tmp, f'startup{i}.db')])[0]
+                 for i in range(args.runs)]
+
+    report('interpreter', baseline)
+    report('import collector', headless)
+    report('collector ready (new db)', ready)
+    print(f"{'headless import overhead':<28}: "
+          f"{statistics.median(headless) - statistics.median(baseline):8.1f} ms")
+
+    try:
+        import PyQt5  # noqa: F401
+    except ImportError:
+        print("import main                 : skipped (PyQt5 not installed)")
+    else:
+        report('import main (GUI)', time_python('import main', args.runs))
+
+    print(f"\nslowest imports for collector (cumulative):")
+    for cumulative, name in slowest_imports('collector', args.top):
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,640 @@
+"""
+Benchmark suite for collection, database ingest, queries, concurrent
+readers and writers, agent push ingestion and UI model refreshes.
+
+Runs on any platform: PowerShell is replaced by benchmarks/fake_powershell.py,
+both as the shell host worker and as ``powershell.exe`` on PATH for the
+spawn-per-call path, with scripted latency, output size and failure rate.
+Every measurement reports p50/p95/p99 latency and throughput, and the
+results are saved as JSON so runs can be compared between commits.
+
+Usage:
+    python benchmarks/bench_suite.py [--suites collection,ingest,query,concurrency,push,ui]
+        [--sizes 1e3,1e4,1e5] [--calls 50] [--latency-ms 5] [--failure-rate 0]
+        [--output bench_results.json] [--compare previous.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from database import DatabaseManager, insert_update_logs
+from device_health import DeviceHealthMonitor
+from update_tracker import WindowsUpdateTracker
+from shell_host import ShellHost
+from timeseries import TimeSeriesStore
+
+FAKE_POWERSHELL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_powershell.py')
+SUITES = ('collection', 'ingest', 'query', 'concurrency', 'push', 'ui')
+SAMPLE = {'cpu_usage': 12.5, 'memory_usage': 48.0, 'disk_health': 'GOOD', 'status': 'OK'}
+INSERT_CHUNK = 50000
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(suite: str, name: str, latencies, elapsed: float, errors: int = 0,
+              rows: int = None, items: int = None) -> dict:
+    """
+    Build a result entry from per-operation latencies.
+
+    :param latencies: Seconds per operation
+    :param elapsed: Wall time for all operations (used for throughput)
+    :param errors: Operations that failed
+    :param rows: Table size the measurement ran against
+    :param items: Items processed, if different from the operation count
+    """
+    values = sorted(latencies)
+    count = len(values)
+    processed = items if items is not None else count
+    result = {
+        'suite': suite,
+        'name': name,
+        'rows': rows,
+        'count': count,
+        'errors': errors,
+        'p50_ms': percentile(values, 0.50) * 1000,
+        'p95_ms': percentile(values, 0.95) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'mean_ms': (sum(values) / count * 1000) if count else 0.0,
+        'throughput_per_sec': processed / elapsed if elapsed > 0 else 0.0,
+    }
+    size = f" @ {rows:,} rows" if rows is not None else ''
+    print(f"  {name + size:<44} p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  "
+          f"p99 {result['p99_ms']:9.3f} ms  {result['throughput_per_sec']:12,.1f}/s"
+          + (f"  errors {errors}" if errors else ''))
+    return result
+
+
+def measure(suite: str, name: str, operation, count: int, rows: int = None,
+            is_error=None, concurrency: int = 1) -> dict:
+    """
+    Time ``operation()`` ``count`` times, optionally from several threads.
+
+    :param is_error: Predicate on the operation result marking failures
+    :param concurrency: Threads issuing operations concurrently
+    """
+    def timed(_):
+        started = time.perf_counter()
+        try:
+            result = operation()
+            failed = bool(is_error and is_error(result))
+        except Exception:
+            failed = True
+        return time.perf_counter() - started, failed
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(timed, range(count)))
+    else:
+        samples = [timed(i) for i in range(count)]
+    elapsed = time.perf_counter() - started
+
+    return summarize(suite, name, [latency for latency, _ in samples], elapsed,
+                     errors=sum(failed for _, failed in samples), rows=rows)
+
+
+def install_fake_powershell(directory: str):
+    """Put a ``powershell.exe`` shim for the fake backend first on PATH."""
+    shim = os.path.join(directory, 'powershell.exe')
+    with open(shim, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_POWERSHELL}" "$@"\n')
+    os.chmod(shim, os.stat(shim).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ['PATH'] = directory + os.pathsep + os.environ.get('PATH', '')
+
+
+def is_error_result(result) -> bool:
+    return isinstance(result, dict) and result.get('status') == 'error'
+
+
+def run_collection(args, tmp: str) -> list:
+    """Collection calls through the warm shell host and spawned per call."""
+    print("collection")
+    results = []
+    host = ShellHost(command=[sys.executable, FAKE_POWERSHELL], pool_size=args.pool_size)
+    try:
+        monitor = DeviceHealthMonitor(shell_host=host, health_backend='script')
+        tracker = WindowsUpdateTracker(shell_host=host)
+        # Start every worker so pool start-up is not charged to the first calls
+        measure('collection', 'warmup', monitor.get_system_health, args.pool_size,
+                concurrency=args.pool_size)
+        results.append(measure('collection', 'get_system_health (host)',
+                               monitor.get_system_health, args.calls, is_error=is_error_result))
+        results.append(measure('collection', 'get_device_configuration (host)',
+                               monitor.get_device_configuration, args.calls, is_error=is_error_result))
+        results.append(measure('collection', 'check_pending_updates (host)',
+                               tracker.check_pending_updates, args.calls, is_error=is_error_result))
+        results.append(measure('collection', f'get_system_health (host x{args.pool_size})',
+                               monitor.get_system_health, args.calls * args.pool_size,
+                               is_error=is_error_result, concurrency=args.pool_size))
+    finally:
+        host.close()
+
+    native = DeviceHealthMonitor(shell_host=host, health_backend='auto')
+    if native.health_backends[0].name != 'script':
+        native.get_system_health()
+        results.append(measure('collection', f'get_system_health ({native.health_backends[0].name})',
+                               native.get_system_health, args.calls, is_error=is_error_result))
+    native.close()
+
+    if os.name == 'posix':
+        # The spawned path runs powershell.exe, which resolves to the shim
+        script_dir = os.path.join(ROOT, 'powershell')
+        monitor = DeviceHealthMonitor(os.path.join(script_dir, 'device_info.ps1'),
+                                      health_backend='script')
+        tracker = WindowsUpdateTracker(os.path.join(script_dir, 'update_manager.ps1'))
+        spawn_calls = max(1, args.calls // 5)
+        results.append(measure('collection', 'get_system_health (spawn)',
+                               monitor.get_system_health, spawn_calls, is_error=is_error_result))
+        results.append(measure('collection', 'check_pending_updates (spawn)',
+                               tracker.check_pending_updates, spawn_calls, is_error=is_error_result))
+    return results
+
+
+def run_ingest(args, tmp: str) -> list:
+    """Buffered health ingest, timing each call plus the final flush."""
+    print("ingest")
+    results = []
+    for size in args.sizes:
+        db = DatabaseManager(os.path.join(tmp, f'ingest-{size}.db'))
+        latencies = []
+        started = time.perf_counter()
+        for i in range(size):
+            call_started = time.perf_counter()
+            db.log_device_health(SAMPLE, device_id=f'device-{i % 100}')
+            latencies.append(time.perf_counter() - call_started)
+        flush_started = time.perf_counter()
+        db.flush()
+        latencies.append(time.perf_counter() - flush_started)
+        elapsed = time.perf_counter() - started
+        db.close()
+        results.append(summarize('ingest', 'log_device_health', latencies, elapsed,
+                                 rows=size, items=size))
+    return results
+
+
+def populate(db: DatabaseManager, rows: int, devices: int = 100):
+    """
+    Bulk-load ``rows`` health samples and ``rows // 10`` update log entries,
+    spread over the last ``rows`` seconds, without going through the buffer.
+    """
+    start = datetime.utcnow() - timedelta(seconds=rows)
+    statuses = ('Installed', 'Installed', 'Installed', 'Failed', 'Pending')
+    rng = random.Random(1)
+
+    def health_rows(first, last):
+        for i in range(first, last):
+            yield ((start + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S'),
+                   f'device-{i % devices}', rng.uniform(1, 99), rng.uniform(20, 90), 'GOOD', 'OK')
+
+    def update_rows(first, last):
+        for i in range(first, last):
+            kb = 5000000 + i % 500
+            status = statuses[i % len(statuses)]
+            yield ((start + timedelta(seconds=i * 10)).strftime('%Y-%m-%d %H:%M:%S'),
+                   f'2024-{i % 12 + 1:02d} Cumulative Update (KB{kb})', status,
+                   f'Installed Update: KB{kb} - Status: {status}', f'device-{i % devices}')
+
+    with db.lock:
+        for first in range(0, rows, INSERT_CHUNK):
+            last = min(rows, first + INSERT_CHUNK)
+            with db.conn:
+                db.conn.executemany('''
+                    INSERT INTO device_health
+                        (timestamp, device_id, cpu_usage, memory_usage, disk_health, status)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', health_rows(first, last))
+                insert_update_logs(db.conn.cursor(), list(update_rows(first // 10, last // 10)))
+
+
+def run_query(args, tmp: str) -> list:
+    """Read paths at each table size."""
+    print("query")
+    results = []
+    repeats = args.query_repeats
+    for size in args.sizes:
+        db = DatabaseManager(os.path.join(tmp, f'query-{size}.db'))
+        started = time.perf_counter()
+        populate(db, size)
+        results.append(summarize('query', 'populate', [time.perf_counter() - started],
+                                 time.perf_counter() - started, rows=size, items=size))
+
+        with db.lock:
+            middle = db.conn.execute(
+                'SELECT * FROM device_health ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?',
+                (size // 2,)
+            ).fetchone()
+        middle_key = db.log_row_key('device_health', middle)
+
+        results.append(measure('query', 'get_recent_device_health(100)',
+                               lambda: db.get_recent_device_health(100), repeats, rows=size))
+        results.append(measure('query', 'fetch_log_page first page',
+                               lambda: db.fetch_log_page('device_health'), repeats, rows=size))
+        results.append(measure('query', 'fetch_log_page deep keyset page',
+                               lambda: db.fetch_log_page('device_health', after=middle_key),
+                               repeats, rows=size))
+        results.append(measure('query', 'fetch_log_page sorted by cpu',
+                               lambda: db.fetch_log_page('device_health', sort_column='cpu_usage'),
+                               repeats, rows=size))
+        results.append(measure('query', 'fetch_log_page status filter',
+                               lambda: db.fetch_log_page('update_logs', filters={'status': 'Failed'}),
+                               repeats, rows=size))
+        results.append(measure('query', 'search_update_logs',
+                               lambda: db.search_update_logs('cumulative KB50001'),
+                               repeats, rows=size))
+        results.append(measure('query', 'fetch_log_page kb filter',
+                               lambda: db.fetch_log_page('update_logs', filters={'kb': 'KB5000001'}),
+                               repeats, rows=size))
+        results.append(measure('query', 'update_failure_rates',
+                               lambda: db.update_failure_rates(limit=20), repeats, rows=size))
+
+        store = TimeSeriesStore(db)
+        started = time.perf_counter()
+        store.rollup()
+        results.append(summarize('query', 'timeseries rollup', [time.perf_counter() - started],
+                                 time.perf_counter() - started, rows=size, items=size))
+        now = datetime.utcnow()
+        window_start = now - timedelta(seconds=size + 3600)
+        results.append(measure('query', 'query_health 1h buckets',
+                               lambda: store.query_health(window_start, now, resolution=3600),
+                               repeats, rows=size))
+        db.close()
+    return results
+
+
+def fail_check(result: dict, message: str):
+    """Record a failed correctness check against a result; the run exits non-zero."""
+    print(f"  {message}")
+    result['errors'] += 1
+    result['check_failed'] = True
+
+
+def run_concurrency(args, tmp: str) -> list:
+    """
+    Dashboard queries from many threads while writer threads commit batches.
+    Each size runs twice, on separate copies of the data: reads serialized
+    through the writer connection, then on the read-only connection pool.
+    Afterwards the row count is checked against what the writers committed;
+    a mismatch or a failed write batch makes the run exit non-zero.
+    """
+    print("concurrency")
+    results = []
+    queries = (
+        lambda db: db.fetch_log_page('device_health'),
+        lambda db: db.fetch_log_page('update_logs', filters={'status': 'Failed'}),
+        lambda db: db.fetch_log_page('device_health', filters={'device_id': 'device-7'}),
+        lambda db: db.search_update_logs('cumulative KB50001'),
+    )
+    for size in args.sizes:
+        for readers in (0, args.readers):
+            db = DatabaseManager(os.path.join(tmp, f'concurrency-{size}-{readers}.db'),
+                                 buffered=False, readers=readers)
+            populate(db, size)
+            mode = f'pool of {readers}' if readers else 'serialized'
+            stop = threading.Event()
+            write_latencies, write_errors, written = [], [0], [0]
+            stats_lock = threading.Lock()
+
+            def writer(worker):
+                rng = random.Random(worker)
+                while not stop.is_set():
+                    batch = [(datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), f'device-{rng.randrange(100)}',
+                              rng.uniform(1, 99), rng.uniform(20, 90), 'GOOD', 'OK')
+                             for _ in range(args.write_batch)]
+                    started = time.perf_counter()
+                    try:
+                        with db.write_cursor() as cursor:
+                            cursor.executemany('''
+                                INSERT INTO device_health
+                                    (timestamp, device_id, cpu_usage, memory_usage, disk_health, status)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                            ''', batch)
+                        committed, failed = len(batch), 0
+                    except Exception:
+                        committed, failed = 0, 1
+                    with stats_lock:
+                        write_latencies.append(time.perf_counter() - started)
+                        written[0] += committed
+                        write_errors[0] += failed
+
+            writers = [threading.Thread(target=writer, args=(worker,)) for worker in range(args.writers)]
+            writers_started = time.perf_counter()
+            for thread in writers:
+                thread.start()
+
+            counter = iter(range(10 ** 9))
+            results.append(measure('concurrency', f'reads, {args.threads} threads, {mode}',
+                                   lambda: queries[next(counter) % len(queries)](db),
+                                   args.query_repeats * args.threads, rows=size,
+                                   concurrency=args.threads))
+            stop.set()
+            for thread in writers:
+                thread.join()
+            results.append(summarize('concurrency', f'write batches, {args.writers} writers, {mode}',
+                                     write_latencies, time.perf_counter() - writers_started,
+                                     errors=write_errors[0], rows=size, items=written[0]))
+
+            with db.read_cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM device_health')
+                expected = size + written[0]
+                actual = cursor.fetchone()[0]
+            if actual != expected:
+                fail_check(results[-1], f"row count mismatch: expected {expected:,}, found {actual:,}")
+            if write_errors[0]:
+                fail_check(results[-1], f"{write_errors[0]} write batch(es) failed")
+            db.close()
+    return results
+
+
+def run_push(args, tmp: str) -> list:
+    """
+    Simulated agents pushing batched reports to a loopback ingestion server.
+    The agents are multiplexed over a few threads. Each agent pushes a number
+    of batches; then the server goes away while every agent spools another
+    batch to disk, comes back, and the spooled backlog is drained. Finally
+    the stored rows are checked against what the agents sent, and a resent
+    batch is checked to be acknowledged without being stored twice.
+    """
+    from ingest import AgentClient, IngestServer
+
+    print("push")
+    db = DatabaseManager(os.path.join(tmp, 'push.db'), buffered=False)
+    server = IngestServer(db, port=0)
+    port = server.start()
+    agents = [AgentClient(f'http://127.0.0.1:{port}', device_id=f'agent-{index}',
+                          spool_dir=os.path.join(tmp, 'spool', str(index)),
+                          batch_size=args.agent_batch, flush_interval=3600)
+              for index in range(args.agents)]
+    slices = [agents[worker::args.agent_threads] for worker in range(args.agent_threads)]
+
+    def fill(agent, rng):
+        for _ in range(args.agent_batch - 1):
+            agent.add_health({'cpu_usage': rng.uniform(1, 99), 'memory_usage': rng.uniform(20, 90),
+                              'disk_health': 'GOOD', 'status': 'OK'})
+        # The last row seals the batch
+        agent.add_update(f'KB{rng.randrange(5000000, 5100000)}', rng.choice(('Installed', 'Failed')),
+                         'x' * rng.randrange(200))
+
+    def run_phase(work):
+        latencies, failures = [], [0]
+        lock = threading.Lock()
+
+        def worker(index):
+            rng = random.Random(index)
+            local, failed = [], 0
+            for agent in slices[index]:
+                failed += work(agent, rng, local)
+            with lock:
+                latencies.extend(local)
+                failures[0] += failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.agent_threads) as pool:
+            list(pool.map(worker, range(args.agent_threads)))
+        return latencies, failures[0], time.perf_counter() - started
+
+    def push_online(agent, rng, latencies):
+        failed = 0
+        for _ in range(args.agent_rounds):
+            fill(agent, rng)
+            started = time.perf_counter()
+            failed += not agent.send_pending()
+            latencies.append(time.perf_counter() - started)
+        return failed
+
+    results = []
+    latencies, failures, elapsed = run_phase(push_online)
+    batches = args.agents * args.agent_rounds
+    results.append(summarize('push', f'batches, {args.agents} agents, {args.agent_threads} threads',
+                             latencies, elapsed, errors=failures, items=batches * args.agent_batch))
+
+    server.stop()
+    def push_offline(agent, rng, _):
+        fill(agent, rng)
+        return int(agent.send_pending())
+
+    _, offline_sent, _ = run_phase(push_offline)
+    spooled = sum(agent.spool_size()[0] for agent in agents)
+    print(f"  server offline: {spooled:,} batches spooled, {offline_sent} sent")
+    server.start()
+
+    def drain(agent, rng, latencies):
+        started = time.perf_counter()
+        failed = not agent.send_pending()
+        latencies.append(time.perf_counter() - started)
+        return failed
+
+    latencies, failures, elapsed = run_phase(drain)
+    failures += sum(agent.spool_size()[0] for agent in agents)
+    batches += args.agents
+    results.append(summarize('push', f'spool drain after outage, {args.agents} agents',
+                             latencies, elapsed, errors=failures, items=args.agents * args.agent_batch))
+
+    # A retry after a lost response carries the same batch id
+    agent = agents[0]
+    fill(agent, random.Random(0))
+    name = agent._spooled()[0]
+    body = agent._read_spooled(name)
+    first, retry = agent._post(body), agent._post(body)
+    duplicate_ok = first[0] == retry[0] == 200 and json.loads(retry[1]).get('duplicate')
+    agent.send_pending()
+    batches += 1
+
+    for agent in agents:
+        agent.close()
+    server.stop()
+
+    with db.read_cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM device_health')
+        health_rows = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM update_logs')
+        update_rows = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM ingest_batches')
+        stored_batches = cursor.fetchone()[0]
+    expected = batches * args.agent_batch
+    if health_rows + update_rows != expected or update_rows != batches or stored_batches != batches:
+        fail_check(results[-1], f"row count mismatch: expected {expected:,} rows in {batches:,} batches, "
+                                f"found {health_rows + update_rows:,} rows in {stored_batches:,} batches")
+    if not duplicate_ok:
+        fail_check(results[-1], "resent batch was not acknowledged as a duplicate")
+    db.close()
+    return results
+
+
+def run_ui(args, tmp: str) -> list:
+    """PagedLogModel refreshes without a display."""
+    print("ui")
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5.QtCore import QCoreApplication, Qt
+        from log_model import PagedLogModel
+    except ImportError as e:
+        print(f"  skipped: {e}")
+        return [{'suite': 'ui', 'name': 'skipped', 'reason': str(e)}]
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    results = []
+    repeats = args.query_repeats
+    for size in args.sizes:
+        db = DatabaseManager(os.path.join(tmp, f'ui-{size}.db'))
+        populate(db, size)
+        model = PagedLogModel(db, 'device_health')
+
+        def refresh():
+            model.refresh()
+            model.fetchMore()
+            for row in range(model.rowCount()):
+                model.data(model.index(row, 0))
+
+        def scroll():
+            model.refresh()
+            for _ in range(10):
+                model.fetchMore()
+            for row in range(model.rowCount()):
+                model.data(model.index(row, 3))
+
+        def resort():
+            model.sort(3, Qt.AscendingOrder if model.descending else Qt.DescendingOrder)
+            model.fetchMore()
+
+        results.append(measure('ui', 'PagedLogModel refresh', refresh, repeats, rows=size))
+        results.append(measure('ui', 'PagedLogModel scroll 10 pages', scroll, repeats, rows=size))
+        results.append(measure('ui', 'PagedLogModel sort', resort, repeats, rows=size))
+        db.close()
+    app.processEvents()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(results: list, baseline_path: str):
+    """Print p50 and throughput changes against a previous results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['suite'], r['name'], r.get('rows')): r for r in baseline['results'] if 'p50_ms' in r}
+
+    print(f"\ncompared with {baseline_path} ({baseline['meta'].get('commit') or 'unknown commit'})")
+    for result in results:
+        old = previous.get((result['suite'], result['name'], result.get('rows')))
+        if old is None or 'p50_ms' not in result:
+            continue
+        p50_change = (result['p50_ms'] / old['p50_ms'] - 1) * 100 if old['p50_ms'] else 0.0
+        rate_change = ((result['throughput_per_sec'] / old['throughput_per_sec'] - 1) * 100
+                       if old['throughput_per_sec'] else 0.0)
+        size = f" @ {result['rows']:,}" if result.get('rows') is not None else ''
+        print(f"  {result['suite'] + ': ' + result['name'] + size:<56} "
+              f"p50 {p50_change:+7.1f}%  throughput {rate_change:+7.1f}%")
+
+
+def parse_sizes(text: str) -> list:
+    return [int(float(size)) for size in text.split(',') if size.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AutoPatch Guardian benchmark suite')
+    parser.add_argument('--suites', default=','.join(SUITES),
+                        help=f"Comma-separated suites to run ({', '.join(SUITES)})")
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('1e3,1e4,1e5'),
+                        help='Comma-separated table sizes, e.g. 1e3,1e4,1e5,1e6,1e7')
+    parser.add_argument('--calls', type=int, default=50, help='Collection calls per measurement')
+    parser.add_argument('--query-repeats', type=int, default=50, help='Repeats per query measurement')
+    parser.add_argument('--pool-size', type=int, default=3, help='Shell host workers')
+    parser.add_argument('--threads', type=int, default=8, help='Reader threads in the concurrency suite')
+    parser.add_argument('--writers', type=int, default=2, help='Writer threads in the concurrency suite')
+    parser.add_argument('--write-batch', type=int, default=1000, help='Rows per writer transaction')
+    parser.add_argument('--readers', type=int, default=4, help='Read-only database connections')
+    parser.add_argument('--agents', type=int, default=1000, help='Simulated agents in the push suite')
+    parser.add_argument('--agent-threads', type=int, default=32, help='Threads the simulated agents share')
+    parser.add_argument('--agent-rounds', type=int, default=3, help='Batches each agent pushes while online')
+    parser.add_argument('--agent-batch', type=int, default=20, help='Rows per pushed batch')
+    parser.add_argument('--startup-ms', type=float, default=200.0,
+                        help='Fake interpreter start-up delay')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Fake per-action latency')
+    parser.add_argument('--jitter-ms', type=float, default=1.0, help='Fake latency jitter')
+    parser.add_argument('--record-delay-ms', type=float, default=0.0,
+                        help='Fake delay between streamed update records')
+    parser.add_argument('--updates', type=int, default=20, help='Fake pending updates per scan')
+    parser.add_argument('--title-bytes', type=int, default=60, help='Fake update title length')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fake action failure rate')
+    parser.add_argument('--seed', type=int, default=1, help='Fake backend random seed')
+    parser.add_argument('--output', default='bench_results.json', help='JSON results file')
+    parser.add_argument('--compare', help='Previous JSON results file to compare against')
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(',') if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    fake_config = {
+        'FAKE_PS_STARTUP_MS': args.startup_ms,
+        'FAKE_PS_LATENCY_MS': args.latency_ms,
+        'FAKE_PS_JITTER_MS': args.jitter_ms,
+        'FAKE_PS_RECORD_DELAY_MS': args.record_delay_ms,
+        'FAKE_PS_UPDATES': args.updates,
+        'FAKE_PS_TITLE_BYTES': args.title_bytes,
+        'FAKE_PS_FAILURE_RATE': args.failure_rate,
+        'FAKE_PS_SEED': args.seed,
+    }
+    os.environ.update({name: str(value) for name, value in fake_config.items()})
+
+    runners = {'collection': run_collection, 'ingest': run_ingest, 'query': run_query,
+               'concurrency': run_concurrency, 'push': run_push, 'ui': run_ui}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_powershell(tmp)
+        for suite in suites:
+            results.extend(runners[suite](args, tmp))
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlite': __import__('sqlite3').sqlite_version,
+            'suites': suites,
+            'sizes': args.sizes,
+            'fake_backend': fake_config,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    failed = [result['name'] for result in results if result.get('check_failed')]
+    if failed:
+        print(f"\ncorrectness checks failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
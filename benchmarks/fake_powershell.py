@@ -0,0 +1,156 @@
+"""
+Stand-in for powershell.exe used by the benchmarks on any platform.
+
+Invoked with ``-File shell_host.ps1`` (or with no ``-File``), it serves the
+shell host's framed request protocol. Invoked with ``-File <script>.ps1
+-Action <action>``, it answers one action and exits, like a spawned script.
+Behaviour is scripted through environment variables:
+
+    FAKE_PS_STARTUP_MS       interpreter start-up delay (default 0)
+    FAKE_PS_LATENCY_MS       delay before an action produces output (default 0)
+    FAKE_PS_JITTER_MS        uniform +/- jitter added to each delay (default 0)
+    FAKE_PS_RECORD_DELAY_MS  delay between streamed update records and
+                             download/install progress lines (default 0)
+    FAKE_PS_UPDATES          pending updates reported by CheckUpdates (default 5)
+    FAKE_PS_TITLE_BYTES      approximate length of each update title (default 60)
+    FAKE_PS_FAILURE_RATE     probability that an action fails (default 0)
+    FAKE_PS_SEED             random seed for jitter and failures
+"""
+import json
+import os
+import random
+import sys
+import time
+
+FRAME_MARKER = '@@APG@@'
+
+
+def _env_float(name: str, default: float = 0.0) -> float:
+    return float(os.environ.get(name) or default)
+
+
+STARTUP = _env_float('FAKE_PS_STARTUP_MS') / 1000
+LATENCY = _env_float('FAKE_PS_LATENCY_MS') / 1000
+JITTER = _env_float('FAKE_PS_JITTER_MS') / 1000
+RECORD_DELAY = _env_float('FAKE_PS_RECORD_DELAY_MS') / 1000
+UPDATES = int(_env_float('FAKE_PS_UPDATES', 5))
+TITLE_BYTES = int(_env_float('FAKE_PS_TITLE_BYTES', 60))
+FAILURE_RATE = _env_float('FAKE_PS_FAILURE_RATE')
+
+_random = random.Random(os.environ.get('FAKE_PS_SEED'))
+
+
+def _sleep(seconds: float):
+    if JITTER:
+        seconds += _random.uniform(-JITTER, JITTER)
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def _update_title(index: int) -> str:
+    title = f"2024-{index % 12 + 1:02d} Cumulative Update for Windows (KB5{index:06d})"
+    if len(title) < TITLE_BYTES:
+        title += ' ' + 'x' * (TITLE_BYTES - len(title) - 1)
+    return title
+
+
+def run_action(action: str, json_format: bool):
+    """
+    Yield ('out' | 'err', text) output lines for an action, then the return code.
+    """
+    _sleep(LATENCY)
+    if FAILURE_RATE and _random.random() < FAILURE_RATE:
+        yield 'err', f"{action} failed: simulated failure"
+        return 1
+
+    if action == 'GetSystemHealth':
+        cpu = round(_random.uniform(1, 99), 1)
+        memory = round(_random.uniform(20, 90), 1)
+        if json_format:
+            yield 'out', json.dumps({'v': 1, 'type': 'health', 'cpu_usage': cpu,
+                                     'memory_usage': memory, 'disk_health': 'GOOD'})
+        else:
+            yield 'out', f"{cpu}|{memory}|GOOD"
+    elif action == 'GetDeviceConfig':
+        if json_format:
+            yield 'out', json.dumps({'v': 1, 'type': 'config', 'total_memory': '16 GB',
+                                     'storage_info': 'C: 512 GB'})
+        else:
+            yield 'out', '16 GB|C: 512 GB'
+    elif action == 'CheckUpdates':
+        for index in range(UPDATES):
+            if index and RECORD_DELAY:
+                _sleep(RECORD_DELAY)
+            title = _update_title(index)
+            if json_format:
+                yield 'out', json.dumps({'v': 1, 'type': 'update', 'kb': f"5{index:06d}",
+                                         'title': title, 'size': '1 MB'})
+            else:
+                yield 'out', title
+    elif action in ('DownloadUpdate', 'InstallUpdate'):
+        for percent in (25, 50, 75, 100):
+            if RECORD_DELAY:
+                _sleep(RECORD_DELAY)
+            yield 'out', f"{action} {percent}%"
+    elif action in ('InstallUpdates', 'RollbackUpdates', 'RollbackUpdate'):
+        yield 'out', f"{action} completed"
+    else:
+        yield 'err', f"Unknown action: {action}"
+        return 1
+    return 0
+
+
+def _drain(action: str, json_format: bool, emit) -> int:
+    """Run an action, passing each output line to emit, and return its exit code."""
+    lines = run_action(action, json_format)
+    while True:
+        try:
+            emit(*next(lines))
+        except StopIteration as stop:
+            return stop.value or 0
+
+
+def serve():
+    """Serve framed requests from stdin like shell_host.ps1."""
+    def write_frame(frame):
+        sys.stdout.write(FRAME_MARKER + json.dumps(frame) + '\n')
+        sys.stdout.flush()
+
+    write_frame({'id': 0, 'kind': 'ready'})
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        request_id = request['id']
+        json_format = request.get('args', {}).get('Format') == 'Json'
+        returncode = _drain(request['action'], json_format,
+                            lambda kind, data: write_frame({'id': request_id, 'kind': kind, 'data': data}))
+        write_frame({'id': request_id, 'kind': 'end', 'returncode': returncode})
+
+
+def run_once(args):
+    """Answer a single ``-Action`` invocation and exit."""
+    options = {}
+    for index, arg in enumerate(args):
+        if arg.startswith('-') and index + 1 < len(args):
+            options[arg[1:].lower()] = args[index + 1]
+
+    def emit(kind, data):
+        print(data, file=sys.stdout if kind == 'out' else sys.stderr, flush=True)
+
+    return _drain(options.get('action', ''), options.get('format', '').lower() == 'json', emit)
+
+
+def main(args):
+    _sleep(STARTUP)
+    script = ''
+    if '-File' in args:
+        script = os.path.basename(args[args.index('-File') + 1]).lower()
+    if script in ('', 'shell_host.ps1'):
+        serve()
+        return 0
+    return run_once(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,383 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Headless entry point: nothing here (or in the modules it imports) loads Qt
+from database import DatabaseManager, get_db_manager, LOCAL_DEVICE_ID
+from device_health import DeviceHealthMonitor, get_device_health_monitor
+from update_tracker import WindowsUpdateTracker, get_update_tracker
+from update_cache import PendingUpdatesCache
+from timeseries import TimeSeriesStore
+from compliance import ComplianceEngine, CSV_SECTIONS, SCAN_UPDATE_NAME
+from history_io import export_table, import_table
+from output_store import OutputStore
+from ingest import AgentClient, IngestServer, DEFAULT_INGEST_PORT
+from refresh_scheduler import RefreshScheduler
+from metrics import registry as metrics, MetricsServer, MetricsSnapshotter
+
+
+class HeadlessCollector:
+    """
+    Collects local health samples and pending updates on a schedule without
+    the GUI. Each task runs at its own interval on a single thread; results
+    are written to the database just like the desktop application does.
+    """
+    def __init__(self, db: DatabaseManager = None, monitor: DeviceHealthMonitor = None,
+                 tracker: WindowsUpdateTracker = None, health_interval: float = 60.0,
+                 updates_interval: float = 3600.0, maintenance_interval: float = 300.0,
+                 analysis_interval: float = 900.0, rollback_policy: str = 'flag',
+                 device_id: Optional[str] = None, push: Optional[AgentClient] = None):
+        """
+        Initialize the headless collector.
+
+        :param db: DatabaseManager for results (defaults to the shared manager)
+        :param monitor: Health monitor (defaults to the shared monitor)
+        :param tracker: Update tracker (defaults to the shared tracker)
+        :param health_interval: Seconds between health samples
+        :param updates_interval: Seconds between pending-update scans
+        :param maintenance_interval: Seconds between rollup/retention passes (0 disables)
+        :param analysis_interval: Seconds between post-install regression checks (0 disables)
+        :param rollback_policy: 'flag' to log regressions, 'auto' to also roll back
+        :param device_id: Device the results belong to (defaults to this machine)
+        :param push: Agent client that also forwards results to an ingestion server
+        """
+        self.db = db or get_db_manager()
+        self.push = push
+        self.monitor = monitor or get_device_health_monitor()
+        self.device_id = device_id or LOCAL_DEVICE_ID
+        self.updates_cache = PendingUpdatesCache(tracker or get_update_tracker(),
+                                                 ttl=0, db=self.db, device_id=self.device_id)
+        # Output of automatic rollbacks goes to this collector's database
+        if self.updates_cache.tracker.output_store is None:
+            self.updates_cache.tracker.output_store = OutputStore(self.db)
+        self.timeseries = TimeSeriesStore(self.db) if maintenance_interval > 0 else None
+        # Installs the triggers that keep compliance aggregates current
+        self.compliance = ComplianceEngine(self.db)
+
+        # Task name -> (interval, callable); all tasks are due immediately
+        self.tasks: Dict[str, tuple] = {
+            'health': (health_interval, self.collect_health),
+            'pending_updates': (updates_interval, self.collect_updates),
+        }
+        if self.timeseries is not None:
+            self.tasks['maintenance'] = (maintenance_interval, self.timeseries.run_maintenance)
+        if analysis_interval > 0:
+            # Imported here so NumPy is only loaded when the check is enabled
+            from health_analysis import HealthRegressionDetector, RollbackPolicy
+            self.rollback_policy = RollbackPolicy(HealthRegressionDetector(self.db),
+                                                  self.updates_cache.tracker,
+                                                  mode=rollback_policy, device_id=self.device_id)
+            self.tasks['health_analysis'] = (analysis_interval, self.rollback_policy.run)
+
+        self._stop_event = threading.Event()
+
+    def collect_health(self) -> Dict[str, Any]:
+        """
+        Sample system health and store it.
+
+        :return: Health dictionary or error dictionary
+        """
+        health = self.monitor.get_system_health()
+        if health.get('status') == 'error':
+            self.db.record_device(self.device_id, 'error')
+            return health
+
+        self.db.log_device_health(health, device_id=self.device_id)
+        self.db.record_device(self.device_id, 'success')
+        if self.push is not None:
+            self.push.add_health(health)
+        return health
+
+    def collect_updates(self) -> Dict[str, Any]:
+        """
+        Scan for pending updates and sync the stored snapshot.
+
+        :return: Scan result with the diff against the previous scan
+        """
+        result = self.updates_cache.get(force=True)
+        if result['status'] == 'error':
+            self.db.log_update(SCAN_UPDATE_NAME, 'Failed', result.get('message', ''),
+                               device_id=self.device_id)
+            if self.push is not None:
+                self.push.add_update(SCAN_UPDATE_NAME, 'Failed', result.get('message', ''))
+        return result
+
+    def run_once(self, tasks: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Run every task (or the given ones) once.
+
+        :param tasks: Task names to run, or None for all
+        :return: Task name -> result
+        """
+        results = {}
+        for name, (_, task) in self.tasks.items():
+            if tasks is None or name in tasks:
+                results[name] = self._run_task(name, task)
+        self.db.flush()
+        return results
+
+    def run(self, on_result: Optional[Callable[[str, Any], None]] = None):
+        """
+        Run tasks on their schedules until ``stop()`` is called.
+
+        :param on_result: Optional callback invoked with each task name and result
+        """
+        self._stop_event.clear()
+        # Jitter keeps a fleet of collectors from scanning in lockstep; failing
+        # tasks back off up to 8x their interval
+        scheduler = RefreshScheduler()
+        for name, (interval, _) in self.tasks.items():
+            scheduler.add_source(name, interval)
+
+        while not self._stop_event.is_set():
+            delay = scheduler.seconds_until_next()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+
+            for name in scheduler.due():
+                if self._stop_event.is_set():
+                    break
+                scheduler.begin(name)
+                result = self._run_task(name, self.tasks[name][1])
+                if on_result:
+                    on_result(name, result)
+                # Scheduled from the finish time so a slow scan never queues up runs
+                failed = isinstance(result, dict) and result.get('status') == 'error'
+                scheduler.finish(name, success=not failed)
+
+        self.db.flush()
+
+    def stop(self):
+        """Stop the scheduling loop after the current task."""
+        self._stop_event.set()
+
+    def _run_task(self, name: str, task: Callable[[], Any]) -> Any:
+        try:
+            return task()
+        except Exception as e:
+            print(f"Collector task {name} failed: {e}", file=sys.stderr)
+            return {'status': 'error', 'message': str(e)}
+
+
+def _summarize(name: str, result: Any) -> str:
+    """One-line description of a task result for the console."""
+    if not isinstance(result, dict):
+        return f"{name}: {result}"
+    if result.get('status') == 'error':
+        return f"{name}: error: {result.get('message', '')}"
+    if name == 'health':
+        return f"{name}: cpu {result['cpu_usage']:.1f}% memory {result['memory_usage']:.1f}%"
+    if name == 'health_analysis':
+        return (f"{name}: {result['checked']} install(s) checked, "
+                f"{len(result['regressions'])} regression(s)")
+    if name == 'pending_updates':
+        return (f"{name}: {len(result['pending_updates'])} pending "
+                f"(+{len(result['added'])} -{len(result['removed'])})")
+    return f"{name}: {result}"
+
+
+def _report(db: DatabaseManager, args) -> int:
+    """Run the ``report`` command."""
+    compliance = ComplianceEngine(db)
+    if args.rebuild:
+        compliance.rebuild()
+    if not args.output:
+        print(json.dumps(compliance.snapshot(), indent=2))
+        return 0
+
+    result = compliance.export(args.output, args.format, args.section)
+    if result['status'] == 'error':
+        print(f"Export failed: {result['message']}", file=sys.stderr)
+        return 1
+    print(f"Wrote {result['rows']} row(s) to {result['path']}")
+    return 0
+
+
+def _export(db: DatabaseManager, args) -> int:
+    """Run the ``export`` command."""
+    filters = {'device_id': args.device, 'since': args.since, 'until': args.until}
+    result = export_table(db, args.table, args.output, filters)
+    if result['status'] == 'error':
+        print(f"Export failed: {result['message']}", file=sys.stderr)
+        return 1
+    print(f"Wrote {result['rows']} row(s) to {result['path']}")
+    return 0
+
+
+def _import(db: DatabaseManager, args) -> int:
+    """Run the ``import`` command."""
+    result = import_table(db, args.input, args.table)
+    if result['status'] == 'error':
+        print(f"Import failed: {result['message']}", file=sys.stderr)
+        return 1
+    print(f"Loaded {result['rows']} row(s) into {result['table']}")
+    return 0
+
+
+def _output(db: DatabaseManager, args) -> int:
+    """Run the ``output`` command."""
+    store = OutputStore(db)
+    info = store.get(args.output_id)
+    if info is None:
+        print(f"No stored output #{args.output_id}", file=sys.stderr)
+        return 1
+    print(f"# {info['operation']} {info['subject'] or ''} on {info['device_id']}: {info['status']}, "
+          f"started {info['started_at']}", file=sys.stderr)
+    # Written chunk by chunk so large outputs are never held in memory
+    for stream, data in store.iter_chunks(args.output_id, None if args.stream == 'all' else args.stream):
+        (sys.stderr if stream == 'err' else sys.stdout).write(data)
+    return 0
+
+
+def _serve(db: DatabaseManager, args) -> int:
+    """Run the ``serve`` command until interrupted."""
+    server = IngestServer(db, host=args.host, port=args.port, token=args.token)
+    print(f"Accepting agent reports on http://{args.host}:{server.start()}/v1/reports", flush=True)
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    try:
+        while not stop.wait(1.0):
+            pass
+    finally:
+        server.stop()
+        db.flush()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command-line entry point: ``python -m collector <collect|serve|report|export|import|output>``.
+
+    :param argv: Arguments (defaults to sys.argv)
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(prog='python -m collector',
+                                     description='AutoPatch Guardian headless collector')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    collect = commands.add_parser('collect', help='Collect health and pending updates on a schedule')
+    collect.add_argument('--db', help='Database file (default: AUTOPATCH_DB_PATH or autopatch_guardian.db)')
+    collect.add_argument('--health-interval', type=float, default=60.0,
+                         help='Seconds between health samples (default: 60)')
+    collect.add_argument('--updates-interval', type=float, default=3600.0,
+                         help='Seconds between pending-update scans (default: 3600)')
+    collect.add_argument('--maintenance-interval', type=float, default=300.0,
+                         help='Seconds between rollup/retention passes, 0 to disable (default: 300)')
+    collect.add_argument('--analysis-interval', type=float, default=900.0,
+                         help='Seconds between post-install health regression checks, 0 to disable (default: 900)')
+    collect.add_argument('--rollback-policy', choices=('flag', 'auto'), default='flag',
+                         help="On a regression, only log it ('flag') or also roll the update back ('auto')")
+    collect.add_argument('--metrics-port', type=int,
+                         help='Record metrics and serve them as Prometheus text on this local port')
+    collect.add_argument('--metrics-interval', type=float, default=60.0,
+                         help='Seconds between metrics snapshots into the database (default: 60)')
+    collect.add_argument('--push', metavar='URL',
+                         help='Also push results to an ingestion server, e.g. http://server:8765')
+    collect.add_argument('--spool-dir',
+                         help='Directory for batches not yet pushed (default: keep them in memory)')
+    collect.add_argument('--token', default=os.environ.get('AUTOPATCH_INGEST_TOKEN'),
+                         help='Bearer token for the ingestion server (default: AUTOPATCH_INGEST_TOKEN)')
+    collect.add_argument('--once', action='store_true', help='Run every task once and exit')
+    collect.add_argument('--quiet', action='store_true', help='Do not print task results')
+
+    serve = commands.add_parser('serve', help='Accept health and update reports pushed by agents')
+    serve.add_argument('--db', help='Database file (default: AUTOPATCH_DB_PATH or autopatch_guardian.db)')
+    serve.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+    serve.add_argument('--port', type=int, default=DEFAULT_INGEST_PORT,
+                       help=f'Port to listen on (default: {DEFAULT_INGEST_PORT})')
+    serve.add_argument('--token', default=os.environ.get('AUTOPATCH_INGEST_TOKEN'),
+                       help='Bearer token agents must send (default: AUTOPATCH_INGEST_TOKEN)')
+
+    report = commands.add_parser('report', help='Export a compliance report')
+    report.add_argument('--db', help='Database file (default: AUTOPATCH_DB_PATH or autopatch_guardian.db)')
+    report.add_argument('--output', '-o', help='Output file (default: print JSON to stdout)')
+    report.add_argument('--format', choices=('json', 'csv'), help='Output format (default: from the file extension)')
+    report.add_argument('--section', choices=CSV_SECTIONS, default='devices',
+                        help='Report section written as CSV (default: devices)')
+    report.add_argument('--rebuild', action='store_true',
+                        help='Recompute the aggregates from the log tables first')
+
+    export = commands.add_parser('export', help='Stream a history table to a CSV, NDJSON or .npz file')
+    export.add_argument('table', choices=('device_health', 'update_logs'))
+    export.add_argument('output', help='Output file: .csv, .ndjson (optionally .gz) or .npz')
+    export.add_argument('--db', help='Database file (default: AUTOPATCH_DB_PATH or autopatch_guardian.db)')
+    export.add_argument('--device', help='Only rows from this device')
+    export.add_argument('--since', help='Only rows at or after this UTC timestamp')
+    export.add_argument('--until', help='Only rows before this UTC timestamp')
+
+    load = commands.add_parser('import', help='Bulk-load a history export into a database')
+    load.add_argument('input', help='File written by the export command')
+    load.add_argument('--db', help='Database file (default: AUTOPATCH_DB_PATH or autopatch_guardian.db)')
+    load.add_argument('--table', choices=('device_health', 'update_logs'),
+                      help='Target table (default: detected from the file)')
+
+    output = commands.add_parser('output', help='Print the stored output of an install or rollback')
+    output.add_argument('output_id', type=int, help='Output id shown with the install or rollback result')
+    output.add_argument('--db', help='Database file (default: AUTOPATCH_DB_PATH or autopatch_guardian.db)')
+    output.add_argument('--stream', choices=('all', 'out', 'err'), default='all',
+                        help='Output stream to print (default: all, stderr to stderr)')
+
+    args = parser.parse_args(argv)
+
+    db = DatabaseManager(args.db) if args.db else get_db_manager()
+    if args.command in ('serve', 'report', 'export', 'import', 'output'):
+        try:
+            return {'serve': _serve, 'report': _report, 'export': _export, 'import': _import,
+                    'output': _output}[args.command](db, args)
+        finally:
+            if args.db:
+                db.close()
+
+    collector = HeadlessCollector(
+        db,
+        health_interval=args.health_interval,
+        updates_interval=args.updates_interval,
+        maintenance_interval=args.maintenance_interval,
+        analysis_interval=args.analysis_interval,
+        rollback_policy=args.rollback_policy,
+        push=AgentClient(args.push, spool_dir=args.spool_dir, token=args.token) if args.push else None
+    )
+    server = snapshotter = None
+    if args.metrics_port is not None:
+        metrics.enable()
+        server = MetricsServer(port=args.metrics_port)
+        print(f"Serving metrics on http://127.0.0.1:{server.start()}/metrics", flush=True)
+    if metrics.enabled:
+        snapshotter = MetricsSnapshotter(db)
+        snapshotter.start(args.metrics_interval)
+
+    report = None if args.quiet else (lambda name, result: print(_summarize(name, result), flush=True))
+    if collector.push is not None:
+        collector.push.start()
+
+    try:
+        if args.once:
+            results = collector.run_once()
+            if report:
+                for name, result in results.items():
+                    report(name, result)
+            failed = any(isinstance(r, dict) and r.get('status') == 'error' for r in results.values())
+            return 1 if failed else 0
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: collector.stop())
+        collector.run(on_result=report)
+        return 0
+    finally:
+        if collector.push is not None:
+            collector.push.close()
+        if snapshotter is not None:
+            snapshotter.stop()
+        if server is not None:
+            server.stop()
+        if args.db:
+            db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,431 @@
+import csv
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from database import update_title_sql
+
+# update_logs name used by the collector for failed pending-update scans;
+# those rows count as scan failures rather than failed installs
+SCAN_UPDATE_NAME = 'Pending update scan'
+
+# Columns of the per-device report, in export order
+DEVICE_REPORT_COLUMNS = (
+    'device_id', 'compliant', 'pending_count', 'installed_count', 'failed_installs',
+    'scan_failures', 'last_scan_at', 'seconds_since_scan', 'last_install_at',
+    'last_failure_at', 'last_health_at', 'cpu_usage', 'memory_usage', 'disk_health',
+)
+
+KB_REPORT_COLUMNS = ('kb', 'title', 'pending_count')
+
+
+def _pending_kb_sql(row: str) -> str:
+    """SQL expression for the compliance_pending_kb key of a pending_updates row."""
+    return (f"COALESCE((SELECT COALESCE(kb, title) FROM update_catalog WHERE id = {row}.update_id), "
+            f"{row}.kb, {row}.update_name)")
+
+# Report sections that can be exported as CSV
+CSV_SECTIONS = ('devices', 'pending_by_kb', 'fleet')
+
+# Triggers that keep the aggregates current as rows are written, so reports
+# read a handful of rows instead of scanning the log tables
+_TRIGGERS = {
+    # Only registers the device; reports read its latest sample through the
+    # (device_id, timestamp) index, so known devices cost one lookup per sample
+    'compliance_health_insert': '''
+        AFTER INSERT ON device_health BEGIN
+            INSERT OR IGNORE INTO compliance_devices (device_id) VALUES (COALESCE(new.device_id, ''));
+        END
+    ''',
+    'compliance_install_insert': f'''
+        AFTER INSERT ON update_logs
+        WHEN new.status = 'Installed' OR (new.status = 'Failed' AND {update_title_sql('new')} IS NOT '{SCAN_UPDATE_NAME}')
+        BEGIN
+            INSERT INTO compliance_devices (device_id, installed_count, failed_installs,
+                                            last_install_at, last_failure_at)
+            VALUES (COALESCE(new.device_id, ''), new.status = 'Installed', new.status = 'Failed',
+                    CASE WHEN new.status = 'Installed' THEN new.timestamp END,
+                    CASE WHEN new.status = 'Failed' THEN new.timestamp END)
+            ON CONFLICT(device_id) DO UPDATE SET
+                installed_count = installed_count + excluded.installed_count,
+                failed_installs = failed_installs + excluded.failed_installs,
+                last_install_at = COALESCE(MAX(last_install_at, excluded.last_install_at),
+                                           last_install_at, excluded.last_install_at),
+                last_failure_at = COALESCE(MAX(last_failure_at, excluded.last_failure_at),
+                                           last_failure_at, excluded.last_failure_at);
+        END
+    ''',
+    'compliance_scan_failure_insert': f'''
+        AFTER INSERT ON update_logs
+        WHEN new.status = 'Failed' AND {update_title_sql('new')} = '{SCAN_UPDATE_NAME}'
+        BEGIN
+            INSERT INTO compliance_devices (device_id, scan_failures, last_scan_failure_at)
+            VALUES (COALESCE(new.device_id, ''), 1, new.timestamp)
+            ON CONFLICT(device_id) DO UPDATE SET
+                scan_failures = scan_failures + 1,
+                last_scan_failure_at = COALESCE(MAX(last_scan_failure_at, new.timestamp), new.timestamp);
+        END
+    ''',
+    'compliance_pending_insert': f'''
+        AFTER INSERT ON pending_updates BEGIN
+            INSERT INTO compliance_devices (device_id, pending_count)
+            VALUES (COALESCE(new.device_id, ''), 1)
+            ON CONFLICT(device_id) DO UPDATE SET pending_count = pending_count + 1;
+            INSERT INTO compliance_pending_kb (kb, title, pending_count)
+            VALUES ({_pending_kb_sql('new')}, {update_title_sql('new')}, 1)
+            ON CONFLICT(kb) DO UPDATE SET pending_count = pending_count + 1;
+        END
+    ''',
+    'compliance_pending_delete': f'''
+        AFTER DELETE ON pending_updates BEGIN
+            UPDATE compliance_devices SET pending_count = pending_count - 1
+            WHERE device_id = COALESCE(old.device_id, '');
+            UPDATE compliance_pending_kb SET pending_count = pending_count - 1
+            WHERE kb = {_pending_kb_sql('old')};
+            DELETE FROM compliance_pending_kb
+            WHERE kb = {_pending_kb_sql('old')} AND pending_count <= 0;
+        END
+    ''',
+    'compliance_scan_insert': '''
+        AFTER INSERT ON devices WHEN new.last_scan IS NOT NULL BEGIN
+            INSERT INTO compliance_devices (device_id, last_scan_at) VALUES (new.device_id, new.last_scan)
+            ON CONFLICT(device_id) DO UPDATE SET last_scan_at = excluded.last_scan_at;
+        END
+    ''',
+    'compliance_scan_update': '''
+        AFTER UPDATE OF last_scan ON devices WHEN new.last_scan IS NOT NULL BEGIN
+            INSERT INTO compliance_devices (device_id, last_scan_at) VALUES (new.device_id, new.last_scan)
+            ON CONFLICT(device_id) DO UPDATE SET last_scan_at = excluded.last_scan_at;
+        END
+    ''',
+    # Fleet totals follow the per-device rows; health-only updates don't fire these
+    'compliance_fleet_insert': '''
+        AFTER INSERT ON compliance_devices BEGIN
+            UPDATE compliance_fleet SET
+                devices = devices + 1,
+                scanned_devices = scanned_devices + (new.last_scan_at IS NOT NULL),
+                patched_devices = patched_devices + (new.last_scan_at IS NOT NULL AND new.pending_count = 0),
+                pending_total = pending_total + new.pending_count,
+                installed_total = installed_total + new.installed_count,
+                failed_installs = failed_installs + new.failed_installs
+            WHERE id = 1;
+        END
+    ''',
+    'compliance_fleet_update': '''
+        AFTER UPDATE OF pending_count, installed_count, failed_installs, last_scan_at
+        ON compliance_devices BEGIN
+            UPDATE compliance_fleet SET
+                scanned_devices = scanned_devices
+                    + (new.last_scan_at IS NOT NULL) - (old.last_scan_at IS NOT NULL),
+                patched_devices = patched_devices
+                    + (new.last_scan_at IS NOT NULL AND new.pending_count = 0)
+                    - (old.last_scan_at IS NOT NULL AND old.pending_count = 0),
+                pending_total = pending_total + new.pending_count - old.pending_count,
+                installed_total = installed_total + new.installed_count - old.installed_count,
+                failed_installs = failed_installs + new.failed_installs - old.failed_installs
+            WHERE id = 1;
+        END
+    ''',
+    'compliance_fleet_delete': '''
+        AFTER DELETE ON compliance_devices BEGIN
+            UPDATE compliance_fleet SET
+                devices = devices - 1,
+                scanned_devices = scanned_devices - (old.last_scan_at IS NOT NULL),
+                patched_devices = patched_devices - (old.last_scan_at IS NOT NULL AND old.pending_count = 0),
+                pending_total = pending_total - old.pending_count,
+                installed_total = installed_total - old.installed_count,
+                failed_installs = failed_installs - old.failed_installs
+            WHERE id = 1;
+        END
+    ''',
+}
+
+
+def rebuild_aggregates(cursor: sqlite3.Cursor):
+    """
+    Recompute every compliance aggregate from the base tables.
+
+    :param cursor: Cursor inside the caller's transaction
+    """
+    # Deleting and re-inserting device rows also resets the fleet totals through the triggers
+    cursor.execute('DELETE FROM compliance_devices')
+    cursor.execute('DELETE FROM compliance_pending_kb')
+    cursor.execute('''
+        UPDATE compliance_fleet SET devices = 0, scanned_devices = 0, patched_devices = 0,
+            pending_total = 0, installed_total = 0, failed_installs = 0
+    ''')
+    cursor.execute(f'''
+        WITH ids AS (
+            SELECT device_id FROM devices
+            UNION SELECT COALESCE(device_id, '') FROM pending_updates
+            UNION SELECT COALESCE(device_id, '') FROM update_logs WHERE status IN ('Installed', 'Failed')
+            UNION SELECT COALESCE(device_id, '') FROM device_health
+        ),
+        titled AS (
+            SELECT device_id, status, timestamp, {update_title_sql()} AS update_name
+            FROM update_logs WHERE status IN ('Installed', 'Failed')
+        ),
+        logs AS (
+            SELECT COALESCE(device_id, '') AS device_id,
+                   SUM(status = 'Installed') AS installed,
+                   SUM(status = 'Failed' AND update_name IS NOT :scan) AS failed,
+                   SUM(status = 'Failed' AND update_name IS :scan) AS scan_failures,
+                   MAX(CASE WHEN status = 'Installed' THEN timestamp END) AS last_install,
+                   MAX(CASE WHEN status = 'Failed' AND update_name IS NOT :scan THEN timestamp END) AS last_failure,
+                   MAX(CASE WHEN status = 'Failed' AND update_name IS :scan THEN timestamp END) AS last_scan_failure
+            FROM titled
+            GROUP BY 1
+        ),
+        pending AS (
+            SELECT COALESCE(device_id, '') AS device_id, COUNT(*) AS pending_count
+            FROM pending_updates GROUP BY 1
+        )
+        INSERT INTO compliance_devices
+            (device_id, pending_count, installed_count, failed_installs, scan_failures,
+             last_scan_at, last_scan_failure_at, last_install_at, last_failure_at)
+        SELECT ids.device_id, COALESCE(pending.pending_count, 0), COALESCE(logs.installed, 0),
+               COALESCE(logs.failed, 0), COALESCE(logs.scan_failures, 0),
+               devices.last_scan, logs.last_scan_failure, logs.last_install, logs.last_failure
+        FROM ids
+        LEFT JOIN logs ON logs.device_id = ids.device_id
+        LEFT JOIN pending ON pending.device_id = ids.device_id
+        LEFT JOIN devices ON devices.device_id = ids.device_id
+    ''', {'scan': SCAN_UPDATE_NAME})
+    cursor.execute(f'''
+        INSERT INTO compliance_pending_kb (kb, title, pending_count)
+        SELECT {_pending_kb_sql('pending_updates')}, MIN({update_title_sql('pending_updates')}), COUNT(*)
+        FROM pending_updates GROUP BY 1
+    ''')
+
+
+class ComplianceEngine:
+    """
+    Per-device and fleet-wide compliance aggregates: pending updates per
+    device and per KB, installs and failed installs, scan recency and the
+    share of fully patched devices. SQLite triggers update the aggregates on
+    every insert into update_logs, device_health, pending_updates and
+    devices, so reports cost the same however long the logs grow.
+    """
+    def __init__(self, db=None):
+        """
+        Initialize the compliance engine, creating aggregates and triggers.
+
+        :param db: DatabaseManager to report on (defaults to the shared manager)
+        """
+        if db is None:
+            from database import get_db_manager
+            db = get_db_manager()
+
+        self.db = db
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create aggregate tables and triggers; backfill them on first use."""
+        with self.db.lock, self.db.conn:
+            cursor = self.db.conn.cursor()
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'compliance_fleet'"
+            )
+            exists = cursor.fetchone() is not None
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS compliance_devices (
+                    device_id TEXT PRIMARY KEY,
+                    pending_count INTEGER NOT NULL DEFAULT 0,
+                    installed_count INTEGER NOT NULL DEFAULT 0,
+                    failed_installs INTEGER NOT NULL DEFAULT 0,
+                    scan_failures INTEGER NOT NULL DEFAULT 0,
+                    last_scan_at DATETIME,
+                    last_scan_failure_at DATETIME,
+                    last_install_at DATETIME,
+                    last_failure_at DATETIME
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS compliance_pending_kb (
+                    kb TEXT PRIMARY KEY,
+                    title TEXT,
+                    pending_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS compliance_fleet (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    devices INTEGER NOT NULL DEFAULT 0,
+                    scanned_devices INTEGER NOT NULL DEFAULT 0,
+                    patched_devices INTEGER NOT NULL DEFAULT 0,
+                    pending_total INTEGER NOT NULL DEFAULT 0,
+                    installed_total INTEGER NOT NULL DEFAULT 0,
+                    failed_installs INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute('INSERT OR IGNORE INTO compliance_fleet (id) VALUES (1)')
+
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+            installed = dict(cursor.fetchall())
+            changed = False
+            for name, body in _TRIGGERS.items():
+                sql = f'CREATE TRIGGER {name} {body.rstrip()}'
+                if installed.get(name) == sql:
+                    continue
+                # Triggers from an older release are replaced; the aggregates
+                # they maintained are rebuilt below
+                changed = changed or name in installed
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                cursor.execute(sql)
+
+            # Latest-sample columns of older releases; reports now read device_health
+            cursor.execute('PRAGMA table_info(compliance_devices)')
+            legacy = [row[1] for row in cursor.fetchall()
+                      if row[1] in ('last_health_at', 'cpu_usage', 'memory_usage', 'disk_health')]
+            try:
+                for column in legacy:
+                    cursor.execute(f'ALTER TABLE compliance_devices DROP COLUMN {column}')
+            except sqlite3.OperationalError:
+                pass  # SQLite before 3.35 keeps them, unused
+
+            # Aggregate rows written before the triggers existed or changed
+            if not exists or changed:
+                rebuild_aggregates(cursor)
+
+    def rebuild(self):
+        """Recompute every aggregate from the base tables (e.g. after bulk edits)."""
+        self.db.flush()
+        try:
+            with self.db.lock, self.db.conn:
+                rebuild_aggregates(self.db.conn.cursor())
+        except sqlite3.Error as e:
+            print(f"Database error when rebuilding compliance aggregates: {e}")
+
+    def fleet_summary(self) -> Dict[str, Any]:
+        """
+        Fleet-wide totals.
+
+        :return: Device counts, patched percentage and install totals
+        """
+        self.db.flush()
+        columns = ('devices', 'scanned_devices', 'patched_devices', 'pending_total',
+                   'installed_total', 'failed_installs')
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute(f'SELECT {", ".join(columns)} FROM compliance_fleet WHERE id = 1')
+                summary = dict(zip(columns, cursor.fetchone()))
+        except sqlite3.Error as e:
+            print(f"Database error when reading compliance summary: {e}")
+            summary = dict.fromkeys(columns, 0)
+
+        scanned = summary['scanned_devices']
+        summary['patched_percent'] = round(summary['patched_devices'] * 100.0 / scanned, 2) if scanned else 0.0
+        return summary
+
+    def device_report(self, device_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Per-device compliance.
+
+        :param device_id: Restrict to one device, or None for all devices
+        :return: Rows with DEVICE_REPORT_COLUMNS; ``compliant`` means scanned with nothing pending
+        """
+        self.db.flush()
+        params = []
+        device_filter = ''
+        if device_id is not None:
+            device_filter = 'WHERE d.device_id = ?'
+            params.append(device_id)
+
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT d.device_id,
+                           d.last_scan_at IS NOT NULL AND d.pending_count = 0,
+                           d.pending_count, d.installed_count, d.failed_installs, d.scan_failures,
+                           d.last_scan_at,
+                           CAST((julianday('now') - julianday(d.last_scan_at)) * 86400 AS INTEGER),
+                           d.last_install_at, d.last_failure_at,
+                           h.timestamp, h.cpu_usage, h.memory_usage, h.disk_health
+                    FROM compliance_devices d
+                    LEFT JOIN device_health h ON h.id = (
+                        SELECT id FROM device_health WHERE device_id IS NULLIF(d.device_id, '')
+                        ORDER BY timestamp DESC LIMIT 1
+                    )
+                    {device_filter}
+                    ORDER BY d.device_id
+                ''', params)
+                rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error when reading device compliance: {e}")
+            return []
+
+        report = [dict(zip(DEVICE_REPORT_COLUMNS, row)) for row in rows]
+        for row in report:
+            row['compliant'] = bool(row['compliant'])
+        return report
+
+    def pending_by_kb(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Pending update counts per KB across the fleet, most widespread first.
+
+        :param limit: Maximum number of rows, or None for all
+        :return: Rows with kb, title and pending_count
+        """
+        self.db.flush()
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute('''
+                    SELECT kb, title, pending_count FROM compliance_pending_kb
+                    ORDER BY pending_count DESC, kb
+                    LIMIT ?
+                ''', (-1 if limit is None else limit,))
+                return [dict(zip(KB_REPORT_COLUMNS, row)) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Database error when reading pending updates by KB: {e}")
+            return []
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Full compliance report.
+
+        :return: Generation time (UTC), fleet summary, devices and pending updates by KB
+        """
+        return {
+            'generated_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()),
+            'fleet': self.fleet_summary(),
+            'devices': self.device_report(),
+            'pending_by_kb': self.pending_by_kb(),
+        }
+
+    def export(self, path: str, fmt: Optional[str] = None, section: str = 'devices') -> Dict[str, Any]:
+        """
+        Export a compliance snapshot to a file.
+
+        :param path: Output file
+        :param fmt: 'json' or 'csv' (defaults to the file extension)
+        :param section: Section written to CSV: 'devices', 'pending_by_kb' or 'fleet'
+                        (JSON always contains the full snapshot)
+        :return: Result with status, path and number of rows written
+        """
+        fmt = (fmt or os.path.splitext(path)[1].lstrip('.') or 'json').lower()
+        if fmt not in ('json', 'csv'):
+            return {'status': 'error', 'message': f"Unsupported export format: {fmt}"}
+        if fmt == 'csv' and section not in CSV_SECTIONS:
+            return {'status': 'error', 'message': f"Unknown report section: {section}"}
+
+        snapshot = self.snapshot()
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                if fmt == 'json':
+                    json.dump(snapshot, f, indent=2)
+                    rows = len(snapshot['devices'])
+                else:
+                    columns = {'devices': DEVICE_REPORT_COLUMNS, 'pending_by_kb': KB_REPORT_COLUMNS,
+                               'fleet': tuple(snapshot['fleet'])}[section]
+                    data = [snapshot['fleet']] if section == 'fleet' else snapshot[section]
+                    writer = csv.DictWriter(f, fieldnames=columns)
+                    writer.writeheader()
+                    writer.writerows(data)
+                    rows = len(data)
+        except OSError as e:
+            return {'status': 'error', 'message': str(e)}
+
+        return {'status': 'success', 'path': path, 'rows': rows}
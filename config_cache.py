@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Default seconds a cached configuration is trusted while the fingerprint matches
+DEFAULT_TTL = 24 * 3600.0
+
+
+def boot_time() -> Optional[int]:
+    """
+    Time the machine booted, without spawning a process.
+
+    :return: Unix timestamp (to the minute on Windows), or None if unknown
+    """
+    try:
+        if sys.platform.startswith('linux'):
+            with open('/proc/stat') as f:
+                for line in f:
+                    if line.startswith('btime '):
+                        return int(line.split()[1])
+        elif os.name == 'nt':
+            import ctypes
+            tick_count = ctypes.windll.kernel32.GetTickCount64
+            tick_count.restype = ctypes.c_ulonglong
+            # Derived from uptime, so rounded to absorb clock drift between calls
+            return int(round((time.time() - tick_count() / 1000.0) / 60.0)) * 60
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def local_fingerprint() -> str:
+    """
+    Cheap fingerprint of the local machine's configuration. Hardware and OS
+    changes that the configuration reports (memory, disks, OS build) need a
+    reboot, which changes the boot time.
+
+    :return: Hex digest of boot time, hostname, OS release/build and architecture
+    """
+    parts = [boot_time(), platform.node(), platform.system(), platform.release(),
+             platform.version(), platform.machine()]
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _field_value(value: Any) -> Optional[str]:
+    """Text form of a configuration value for the history table."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, sort_keys=True)
+
+
+class DeviceConfigCache:
+    """
+    Persistent cache of device configurations, one entry per device, with a
+    per-field change history. An entry is served while the device
+    fingerprint matches and it is younger than the TTL; otherwise the
+    configuration is collected again and any changed fields are recorded,
+    so configuration drift across the fleet can be queried without
+    rescanning devices.
+    """
+    def __init__(self, db=None, ttl: float = DEFAULT_TTL):
+        """
+        Initialize the cache and create its tables.
+
+        :param db: DatabaseManager to store entries in (defaults to the shared manager)
+        :param ttl: Seconds an entry is trusted while its fingerprint matches
+        """
+        if db is None:
+            from database import get_db_manager
+            db = get_db_manager()
+
+        self.db = db
+        self.ttl = ttl
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create the cache and history tables."""
+        with self.db.write_cursor() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS device_config (
+                    device_id TEXT PRIMARY KEY,
+                    fingerprint TEXT,
+                    config TEXT NOT NULL,
+                    collected_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    validated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS device_config_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    device_id TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    old_value TEXT,
+                    new_value TEXT,
+                    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_device_config_history_device
+                ON device_config_history (device_id, changed_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_device_config_history_field
+                ON device_config_history (field, changed_at)
+            ''')
+
+    def get(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached entry for a device.
+
+        :param device_id: Device identifier
+        :return: Entry with config, fingerprint, collected_at, validated_at and
+                 age (seconds since validation), or None if nothing is cached
+        """
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute('''
+                    SELECT config, fingerprint, collected_at, validated_at,
+                           (julianday('now') - julianday(validated_at)) * 86400
+                    FROM device_config WHERE device_id = ?
+                ''', (device_id,))
+                row = cursor.fetchone()
+        except sqlite3.Error as e:
+            print(f"Database error when reading cached configuration: {e}")
+            return None
+
+        if row is None:
+            return None
+        return {
+            'config': json.loads(row[0]),
+            'fingerprint': row[1],
+            'collected_at': row[2],
+            'validated_at': row[3],
+            'age': row[4],
+        }
+
+    def is_fresh(self, entry: Optional[Dict[str, Any]], fingerprint: Optional[str]) -> bool:
+        """
+        Whether a cached entry can be served without collecting again.
+
+        :param entry: Entry from ``get``
+        :param fingerprint: Current device fingerprint, or None to rely on the TTL only
+        :return: True if the fingerprint matches and the entry is within the TTL
+        """
+        if entry is None or entry['age'] is None or entry['age'] >= self.ttl:
+            return False
+        return fingerprint is None or entry['fingerprint'] == fingerprint
+
+    def store(self, device_id: str, config: Dict[str, Any],
+              fingerprint: Optional[str] = None) -> List[str]:
+        """
+        Store a freshly collected configuration and record what changed.
+
+        :param device_id: Device identifier
+        :param config: Collected configuration
+        :param fingerprint: Device fingerprint at collection time
+        :return: Names of the fields that changed (all fields for a new device)
+        """
+        try:
+            with self.db.write_cursor() as cursor:
+                cursor.execute('SELECT config FROM device_config WHERE device_id = ?', (device_id,))
+                row = cursor.fetchone()
+                previous = json.loads(row[0]) if row else {}
+
+                changed = sorted(field for field in set(previous) | set(config)
+                                 if previous.get(field) != config.get(field))
+                cursor.executemany('''
+                    INSERT INTO device_config_history (device_id, field, old_value, new_value)
+                    VALUES (?, ?, ?, ?)
+                ''', [(device_id, field, _field_value(previous.get(field)), _field_value(config.get(field)))
+                      for field in changed])
+
+                cursor.execute('''
+                    INSERT INTO device_config (device_id, fingerprint, config) VALUES (?, ?, ?)
+                    ON CONFLICT(device_id) DO UPDATE SET
+                        fingerprint = excluded.fingerprint,
+                        config = excluded.config,
+                        collected_at = CASE WHEN device_config.config = excluded.config
+                                            THEN device_config.collected_at
+                                            ELSE CURRENT_TIMESTAMP END,
+                        validated_at = CURRENT_TIMESTAMP
+                ''', (device_id, fingerprint, json.dumps(config, sort_keys=True)))
+            return changed
+        except sqlite3.Error as e:
+            print(f"Database error when caching configuration of {device_id}: {e}")
+            return []
+
+    def history(self, device_id: Optional[str] = None, field: Optional[str] = None,
+                since: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Configuration changes, newest first.
+
+        :param device_id: Only this device
+        :param field: Only this field
+        :param since: Only changes at or after this UTC timestamp
+        :param limit: Maximum rows
+        :return: Rows with device_id, field, old_value, new_value and changed_at
+        """
+        conditions, params = [], []
+        for column, value in (('device_id = ?', device_id), ('field = ?', field), ('changed_at >= ?', since)):
+            if value is not None:
+                conditions.append(column)
+                params.append(value)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+        columns = ('device_id', 'field', 'old_value', 'new_value', 'changed_at')
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT {', '.join(columns)} FROM device_config_history
+                    {where}
+                    ORDER BY changed_at DESC, id DESC
+                    LIMIT ?
+                ''', params + [limit])
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Database error when reading configuration history: {e}")
+            return []
+
+    def distribution(self, field: str) -> List[Dict[str, Any]]:
+        """
+        How many devices currently report each value of a field, e.g. to
+        spot OS builds lagging behind the rest of the fleet.
+
+        :param field: Configuration field
+        :return: Rows with value and devices, most common first
+        """
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute('''
+                    SELECT json_extract(config, ?) AS value, COUNT(*) AS devices
+                    FROM device_config
+                    GROUP BY value
+                    ORDER BY devices DESC, value
+                ''', ('$."' + field.replace('"', '') + '"',))
+                return [{'value': value, 'devices': devices} for value, devices in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Database error when reading configuration distribution: {e}")
+            return []
+
+
+# Shared configuration cache, created on first use
+_config_cache = None
+_config_cache_lock = threading.Lock()
+
+
+def get_config_cache() -> DeviceConfigCache:
+    """
+    Return the configuration cache on the shared database, creating it on first use.
+
+    :return: Process-wide DeviceConfigCache instance
+    """
+    global _config_cache
+    with _config_cache_lock:
+        if _config_cache is None:
+            _config_cache = DeviceConfigCache()
+        return _config_cache
@@ -1,27 +1,296 @@
 import sqlite3
+import atexit
 import os
-from typing import List, Dict, Any
+import collections
+import json
+import pathlib
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+from metrics import instrumented, registry as metrics
+from protocol import classify_update, extract_kb
+
+# Device identifier used for rows collected from the local machine
+LOCAL_DEVICE_ID = platform.node() or 'localhost'
+
+# Columns exposed by the paged log API, in result order (id first)
+LOG_TABLE_COLUMNS = {
+    'update_logs': ('id', 'timestamp', 'device_id', 'update_name', 'status', 'details'),
+    'device_health': ('id', 'timestamp', 'device_id', 'cpu_usage', 'memory_usage',
+                      'disk_health', 'status'),
+}
+
+# Bound parameters per IN (...) lookup, well under SQLite's variable limit
+_LOOKUP_CHUNK = 500
+
+# Rows per transaction when moving legacy update titles into the catalog
+_MIGRATION_BATCH = 50000
+
+# Failed flushes a buffered batch survives before its rows are dropped
+_FLUSH_ATTEMPTS = 3
+
+
+def update_title_sql(table: str = 'update_logs') -> str:
+    """
+    SQL expression for the title of an update_logs or pending_updates row.
+    Titles live in update_catalog. The legacy update_name column is only
+    set on rows written before the catalog existed that have not been
+    migrated yet (the migration commits in batches and may be cut off). It
+    is kept rather than dropped because DROP COLUMN needs SQLite 3.35 and
+    rewrites the whole table in one transaction.
+
+    :param table: Table name or alias the expression refers to
+    :return: SQL expression
+    """
+    return (f"COALESCE((SELECT title FROM update_catalog WHERE update_catalog.id = {table}.update_id), "
+            f"{table}.update_name)")
+
+# Log columns that are not stored as-is in their table
+_COLUMN_EXPRESSIONS = {
+    'update_name': f'{update_title_sql()} AS update_name',
+}
+
+# Sort expressions for paged queries. Nullable columns are coalesced so
+# keyset comparisons never see NULL; id and timestamp use their indexes.
+_SORT_EXPRESSIONS = {
+    'id': 'id',
+    'timestamp': 'timestamp',
+    'device_id': "COALESCE(device_id, '')",
+    'update_name': f"COALESCE({update_title_sql()}, '')",
+    'status': "COALESCE(status, '')",
+    'details': "COALESCE(details, '')",
+    'disk_health': "COALESCE(disk_health, '')",
+    'cpu_usage': 'COALESCE(cpu_usage, 0)',
+    'memory_usage': 'COALESCE(memory_usage, 0)',
+}
+
+# Handed to a waiting reader in place of a connection: open a new one
+_OPEN_CONNECTION = object()
+
+def fts_query(text: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: every word must match, the last
+    one as a prefix, and FTS operators in the input are treated as text.
+    
+    :param text: User search text
+    :return: FTS5 MATCH expression
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if not terms:
+        return '""'
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def intern_updates(cursor: sqlite3.Cursor, titles: Iterable[str]) -> Dict[str, int]:
+    """
+    Catalog ids for update titles, adding titles seen for the first time.
+    A title is parsed (KB id, classification) only when it is added.
+
+    :param cursor: Cursor inside the caller's write transaction
+    :param titles: Update titles (None and duplicates are skipped)
+    :return: Title -> update_catalog id
+    """
+    wanted = list({title for title in titles if title is not None})
+    ids = {}
+    for _ in range(2):
+        missing = [title for title in wanted if title not in ids]
+        for first in range(0, len(missing), _LOOKUP_CHUNK):
+            chunk = missing[first:first + _LOOKUP_CHUNK]
+            cursor.execute(f'''
+                SELECT title, id FROM update_catalog WHERE title IN ({', '.join('?' * len(chunk))})
+            ''', chunk)
+            ids.update(cursor.fetchall())
+
+        missing = [title for title in wanted if title not in ids]
+        if not missing:
+            break
+        cursor.executemany('''
+            INSERT OR IGNORE INTO update_catalog (kb, title, classification) VALUES (?, ?, ?)
+        ''', [(extract_kb(title) or None, title, classify_update(title)) for title in missing])
+    return ids
+
+def insert_update_logs(cursor: sqlite3.Cursor, rows: List[tuple]):
+    """
+    Insert update log rows, storing each title as a catalog reference.
+
+    :param cursor: Cursor inside the caller's write transaction
+    :param rows: Tuples of (timestamp, update_name, status, details, device_id)
+    """
+    ids = intern_updates(cursor, (row[1] for row in rows))
+    cursor.executemany('''
+        INSERT INTO update_logs
+        (timestamp, update_id, status, details, device_id)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(timestamp, ids.get(name), status, details, device_id)
+          for timestamp, name, status, details, device_id in rows])
+
+class ReaderPool:
+    """
+    Pool of read-only connections to a WAL database. Each reader leases its
+    own connection, so queries run concurrently with each other and with
+    the writer instead of queueing behind it. Connections are opened on
+    demand up to ``size``; further readers wait and are served in arrival
+    order, so a busy thread cannot keep re-leasing the connection it just
+    returned.
+    """
+    def __init__(self, db_path: str, size: int = 4, busy_timeout: float = 30.0):
+        """
+        :param db_path: Path to an existing database file
+        :param size: Maximum open read connections
+        :param busy_timeout: Seconds a statement waits on a locked database
+        """
+        self.uri = pathlib.Path(os.path.abspath(db_path)).as_uri() + '?mode=ro'
+        self.size = max(1, size)
+        self.busy_timeout = busy_timeout
+        self._idle = []
+        self._opened = 0
+        # Waiting readers, oldest first; each is a [event, connection] slot
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    def _connect(self) -> sqlite3.Connection:
+        # Leased to one thread at a time, but not always the one that opened it
+        conn = sqlite3.connect(self.uri, uri=True, timeout=self.busy_timeout,
+                               check_same_thread=False)
+        conn.execute('PRAGMA query_only=ON')
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+            if self._idle and not self._waiters:
+                return self._idle.pop()
+            if self._opened < self.size and not self._waiters:
+                self._opened += 1
+                slot = [None, _OPEN_CONNECTION]
+            else:
+                slot = [threading.Event(), None]
+                self._waiters.append(slot)
+        
+        if slot[0] is not None:
+            slot[0].wait()
+            if slot[1] is None:
+                raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        if slot[1] is not _OPEN_CONNECTION:
+            return slot[1]
+        
+        try:
+            return self._connect()
+        except sqlite3.Error:
+            # Give the slot to the next waiter, which will try to open one itself
+            self._release(None)
+            raise
+    
+    def _release(self, conn: Optional[sqlite3.Connection]):
+        """Hand a connection (or, if None, a free slot) to the oldest waiter."""
+        with self._lock:
+            if self._closed:
+                if conn is not None:
+                    conn.close()
+                self._opened -= 1
+            elif self._waiters:
+                waiter = self._waiters.popleft()
+                waiter[1] = conn if conn is not None else _OPEN_CONNECTION
+                waiter[0].set()
+            elif conn is not None:
+                self._idle.append(conn)
+            else:
+                self._opened -= 1
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Lease a read connection for the duration of the block.
+        
+        :return: Read-only connection
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+    
+    def close(self):
+        """Close idle connections; leased ones are closed when returned."""
+        with self._lock:
+            self._closed = True
+            for conn in self._idle:
+                conn.close()
+            self._opened -= len(self._idle)
+            self._idle = []
+            while self._waiters:
+                self._waiters.popleft()[0].set()
 
 class DatabaseManager:
     """
     Manages SQLite database operations for AutoPatch Guardian.
     Handles device health, update logs, and compliance reporting.
+    
+    All writes go through a single writer connection guarded by ``lock``.
+    Reads use ``read_cursor()``, which leases a read-only connection from a
+    pool, so dashboard queries do not wait for ingest or for each other.
     """
-    def __init__(self, db_path: str = 'autopatch_guardian.db'):
+    def __init__(self, db_path: str = 'autopatch_guardian.db', buffered: bool = True,
+                 batch_size: int = 500, flush_interval: float = 1.0,
+                 readers: int = 4, busy_timeout: float = 30.0):
         """
         Initialize database connection and create necessary tables.
         
         :param db_path: Path to the SQLite database file
+        :param buffered: Queue health and update rows and write them in batches
+        :param batch_size: Buffered row count that triggers a flush
+        :param flush_interval: Maximum seconds a buffered row waits before a flush
+        :param readers: Read-only connections for concurrent queries (0 reads
+                        through the writer connection)
+        :param busy_timeout: Seconds a statement waits while another process
+                             (e.g. the headless collector) holds the write lock
         """
         # Ensure the database directory exists
         os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
         
-        # Establish database connection
-        self.conn = sqlite3.connect(db_path)
+        # Establish the writer connection. It is shared with background
+        # jobs, so access is serialized through a lock.
+        self.conn = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False)
         self.cursor = self.conn.cursor()
+        self.lock = threading.RLock()
+        
+        # Lets retention compaction return free pages incrementally
+        # (only takes effect on newly created databases)
+        self.cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        
+        # WAL lets readers run alongside the writer; NORMAL sync is durable
+        # across application crashes and only fsyncs at checkpoints.
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute('PRAGMA synchronous=NORMAL')
         
         # Create tables
         self._create_tables()
+        
+        # In-memory databases are private to their connection
+        self._readers = None
+        if readers > 0 and db_path != ':memory:':
+            self._readers = ReaderPool(db_path, size=readers, busy_timeout=busy_timeout)
+        
+        # Write-behind buffers for high-rate inserts
+        self.buffered = buffered
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._health_buffer = []
+        self._update_buffer = []
+        self._buffer_cond = threading.Condition()
+        self._flushing = False
+        self._flush_failures = 0
+        self._closed = False
+        self._writer = None
+        
+        if self.buffered:
+            self._writer = threading.Thread(target=self._writer_loop, name='db-writer', daemon=True)
+            self._writer.start()
     
     def _create_tables(self):
         """Create essential tables for tracking updates and device health."""
@@ -48,48 +317,526 @@ class DatabaseManager:
             )
         ''')
         
+        # Tag health and update rows with the device they came from
+        self._add_missing_columns('device_health', {'device_id': 'TEXT'})
+        self._add_missing_columns('update_logs', {'device_id': 'TEXT'})
+        
+        # Paged log queries sort by timestamp, overall or per device
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_update_logs_timestamp
+            ON update_logs (timestamp)
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_update_logs_device_timestamp
+            ON update_logs (device_id, timestamp)
+        ''')
+        
+        # Time-series indexes: latest samples overall and per-device ranges
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_device_health_timestamp
+            ON device_health (timestamp)
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_device_health_device_timestamp
+            ON device_health (device_id, timestamp)
+        ''')
+        
+        # Fleet device inventory
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS devices (
+                device_id TEXT PRIMARY KEY,
+                last_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+                status TEXT,
+                configuration TEXT
+            )
+        ''')
+        # Time of the last successful pending-update scan
+        self._add_missing_columns('devices', {'last_scan': 'DATETIME'})
+        
+        # Latest pending update snapshot per device
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pending_updates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                device_id TEXT,
+                update_name TEXT,
+                detected_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_pending_updates_device
+            ON pending_updates (device_id)
+        ''')
+        self._add_missing_columns('pending_updates', {'kb': 'TEXT'})
+        
+        # Update titles, parsed and stored once; logs and snapshots reference them by id
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS update_catalog (
+                id INTEGER PRIMARY KEY,
+                kb TEXT,
+                title TEXT NOT NULL UNIQUE,
+                classification TEXT,
+                first_seen DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_update_catalog_kb
+            ON update_catalog (kb)
+        ''')
+        self._add_missing_columns('update_logs', {'update_id': 'INTEGER REFERENCES update_catalog (id)'})
+        self._add_missing_columns('pending_updates', {'update_id': 'INTEGER REFERENCES update_catalog (id)'})
+        
+        # Per-update queries: install outcomes per KB, devices still missing a KB
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_update_logs_update_status
+            ON update_logs (update_id, status, timestamp)
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_pending_updates_update
+            ON pending_updates (update_id, device_id)
+        ''')
+        migrated = self._migrate_update_titles()
+        
+        # Full-text index over update names and details
+        self.fts_enabled = self._create_update_logs_fts(rebuild=migrated)
+        
         # Commit changes
         self.conn.commit()
+        
+        # Indexes and triggers left dropped by a bulk import that was killed
+        self._restore_bulk_load()
+    
+    def _restore_bulk_load(self):
+        """Finish restoring after an interrupted ``history_io.bulk_load``, if there was one."""
+        self.cursor.execute('''
+            SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bulk_load_saved'
+        ''')
+        if self.cursor.fetchone() is None:
+            return
+        
+        from history_io import restore_bulk_load
+        try:
+            with self.conn:
+                self.cursor.execute('BEGIN IMMEDIATE')
+                restore_bulk_load(self.cursor)
+        except sqlite3.Error as e:
+            print(f"Database error when restoring after an interrupted bulk load: {e}")
+    
+    def _migrate_update_titles(self) -> bool:
+        """
+        Move update titles stored in update_logs and pending_updates rows
+        into update_catalog, replacing them with catalog ids. Runs for
+        databases created before the catalog existed, one committed batch
+        of rows at a time, so the write lock is released between batches and
+        an interrupted migration carries on at the next start. The space
+        freed by the titles is reused by new rows (VACUUM returns it to the
+        filesystem).
+        
+        :return: True if update_logs rows were migrated (the full-text index
+                 must then be rebuilt)
+        """
+        self.cursor.execute('''
+            SELECT EXISTS (SELECT 1 FROM update_logs WHERE update_id IS NULL AND update_name IS NOT NULL),
+                   EXISTS (SELECT 1 FROM pending_updates WHERE update_id IS NULL AND update_name IS NOT NULL)
+        ''')
+        logs, pending = self.cursor.fetchone()
+        if not logs and not pending:
+            return False
+        
+        # The index triggers would reindex every migrated row; the index is
+        # rebuilt once afterwards instead
+        if logs:
+            self._drop_legacy_update_logs_fts()
+            for trigger in ('update_logs_fts_insert', 'update_logs_fts_delete', 'update_logs_fts_update'):
+                self.cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        
+        for table, seen, migrate in (('update_logs', 'timestamp', logs),
+                                     ('pending_updates', 'detected_at', pending)):
+            if not migrate:
+                continue
+            self.cursor.execute(f'''
+                SELECT update_name, MIN({seen}) FROM {table}
+                WHERE update_id IS NULL AND update_name IS NOT NULL
+                GROUP BY update_name
+            ''')
+            self.cursor.executemany('''
+                INSERT OR IGNORE INTO update_catalog (kb, title, classification, first_seen)
+                VALUES (?, ?, ?, ?)
+            ''', [(extract_kb(title) or None, title, classify_update(title), first_seen)
+                  for title, first_seen in self.cursor.fetchall()])
+            self.conn.commit()
+            
+            last_id = 0
+            while True:
+                with self.conn:
+                    self.cursor.execute(f'''
+                        SELECT MAX(id) FROM (
+                            SELECT id FROM {table}
+                            WHERE id > ? AND update_id IS NULL AND update_name IS NOT NULL
+                            ORDER BY id LIMIT ?
+                        )
+                    ''', (last_id, _MIGRATION_BATCH))
+                    upper = self.cursor.fetchone()[0]
+                    if upper is None:
+                        break
+                    self.cursor.execute(f'''
+                        UPDATE {table} SET
+                            update_id = (SELECT id FROM update_catalog WHERE title = {table}.update_name),
+                            update_name = NULL
+                            {', kb = NULL' if table == 'pending_updates' else ''}
+                        WHERE id > ? AND id <= ? AND update_id IS NULL AND update_name IS NOT NULL
+                    ''', (last_id, upper))
+                last_id = upper
+        return bool(logs)
+    
+    def _create_update_logs_fts(self, rebuild: bool = False) -> bool:
+        """
+        Create the FTS5 index over update titles and details, kept in sync by
+        triggers. Titles are indexed from update_catalog through the
+        update_logs_text view.
+        
+        :param rebuild: Reindex every row even if the index already exists
+        :return: False if this SQLite build lacks FTS5 (search falls back to LIKE)
+        """
+        self._drop_legacy_update_logs_fts()
+        self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'update_logs_fts'"
+        )
+        exists = self.cursor.fetchone() is not None
+        
+        self.cursor.execute(f'''
+            CREATE VIEW IF NOT EXISTS update_logs_text AS
+            SELECT id, {update_title_sql()} AS update_name, details FROM update_logs
+        ''')
+        try:
+            self.cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS update_logs_fts
+                USING fts5(update_name, details, content='update_logs_text', content_rowid='id')
+            ''')
+        except sqlite3.OperationalError:
+            return False
+        
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS update_logs_fts_insert AFTER INSERT ON update_logs BEGIN
+                INSERT INTO update_logs_fts (rowid, update_name, details)
+                VALUES (new.id, {update_title_sql('new')}, new.details);
+            END
+        ''')
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS update_logs_fts_delete AFTER DELETE ON update_logs BEGIN
+                INSERT INTO update_logs_fts (update_logs_fts, rowid, update_name, details)
+                VALUES ('delete', old.id, {update_title_sql('old')}, old.details);
+            END
+        ''')
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS update_logs_fts_update AFTER UPDATE ON update_logs BEGIN
+                INSERT INTO update_logs_fts (update_logs_fts, rowid, update_name, details)
+                VALUES ('delete', old.id, {update_title_sql('old')}, old.details);
+                INSERT INTO update_logs_fts (rowid, update_name, details)
+                VALUES (new.id, {update_title_sql('new')}, new.details);
+            END
+        ''')
+        
+        # Index rows logged before the index existed or while it was off
+        if rebuild or not exists:
+            self.cursor.execute("INSERT INTO update_logs_fts (update_logs_fts) VALUES ('rebuild')")
+        return True
     
-    def log_device_health(self, health_data: Dict[str, Any]):
+    def _drop_legacy_update_logs_fts(self):
+        """Drop a full-text index from before the catalog, which read titles from update_logs itself."""
+        self.cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'update_logs_fts'"
+        )
+        row = self.cursor.fetchone()
+        if row is None or "content='update_logs_text'" in row[0]:
+            return
+        for trigger in ('update_logs_fts_insert', 'update_logs_fts_delete', 'update_logs_fts_update'):
+            self.cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        self.cursor.execute('DROP TABLE update_logs_fts')
+    
+    def _add_missing_columns(self, table: str, columns: Dict[str, str]):
+        """
+        Add columns to an existing table if an older database lacks them.
+        
+        :param table: Table name
+        :param columns: Mapping of column name to SQL type
+        """
+        self.cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in self.cursor.fetchall()}
+        for name, sql_type in columns.items():
+            if name not in existing:
+                self.cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {sql_type}')
+    
+    @contextmanager
+    def read_cursor(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Cursor for queries, on a pooled read-only connection. It sees
+        committed data only; call ``flush()`` first if buffered rows must
+        be visible.
+        
+        :return: Cursor, closed when the block exits
+        """
+        if self._readers is None:
+            with self.lock:
+                cursor = self.conn.cursor()
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+            return
+        
+        with self._readers.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+    
+    @contextmanager
+    def write_cursor(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Cursor on the writer connection, inside a transaction that commits
+        when the block exits and rolls back if it raises.
+        
+        :return: Cursor, closed when the block exits
+        """
+        with self.lock, self.conn:
+            cursor = self.conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+    
+    def _writer_loop(self):
+        """Background writer: flush when a batch fills up or the interval elapses."""
+        while True:
+            with self._buffer_cond:
+                # After a failed flush, wait out the interval before retrying
+                if not self._closed and (self._flush_failures or
+                                         self._buffered_rows() < self.batch_size):
+                    self._buffer_cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+    
+    def _buffered_rows(self) -> int:
+        """Number of rows waiting to be written (caller holds the buffer lock)."""
+        return len(self._health_buffer) + len(self._update_buffer)
+    
+    def _enqueue(self, buffer: list, row: tuple) -> bool:
+        """
+        Queue a row for the background writer.
+        
+        :param buffer: Target buffer
+        :param row: Row values in insert order
+        :return: False if the manager is closing and the row must be written directly
+        """
+        with self._buffer_cond:
+            # Checked under the lock so no row lands after close()'s final flush
+            if self._closed:
+                return False
+            buffer.append(row)
+            pending = self._buffered_rows()
+            if pending >= self.batch_size:
+                self._buffer_cond.notify()
+        
+        # Apply backpressure if the writer falls far behind
+        if pending >= self.batch_size * 20:
+            self.flush()
+        return True
+    
+    def flush(self):
+        """Write all buffered rows in a single transaction."""
+        # Readers call this before every query; with nothing buffered or being
+        # written they return without waiting for the writer lock
+        with self._buffer_cond:
+            if not self._flushing and not self._buffered_rows():
+                return
+        
+        with self.lock:
+            with self._buffer_cond:
+                health_rows, self._health_buffer = self._health_buffer, []
+                update_rows, self._update_buffer = self._update_buffer, []
+                self._flushing = bool(health_rows or update_rows)
+            
+            if not health_rows and not update_rows:
+                return
+            
+            try:
+                # Only flushes that write rows are timed, so idle writer wakeups don't skew latency
+                with metrics.timer('db', 'flush'), self.write_cursor() as cursor:
+                    if health_rows:
+                        cursor.executemany('''
+                            INSERT INTO device_health 
+                            (timestamp, cpu_usage, memory_usage, disk_health, status, device_id) 
+                            VALUES (?, ?, ?, ?, ?, ?)
+                        ''', health_rows)
+                    if update_rows:
+                        insert_update_logs(cursor, update_rows)
+            except sqlite3.Error as e:
+                metrics.record_error('db', 'flush')
+                self._requeue(health_rows, update_rows, e)
+            else:
+                self._flush_failures = 0
+            finally:
+                with self._buffer_cond:
+                    self._flushing = False
+    
+    def _requeue(self, health_rows: list, update_rows: list, error: sqlite3.Error):
+        """
+        Put a batch that failed to write back at the front of the buffers,
+        so it is retried ahead of newer rows. After ``_FLUSH_ATTEMPTS``
+        consecutive failures the batch is dropped (caller holds the writer lock).
+        """
+        rows = len(health_rows) + len(update_rows)
+        self._flush_failures += 1
+        if self._flush_failures >= _FLUSH_ATTEMPTS:
+            self._flush_failures = 0
+            metrics.record_error('db', 'flush_dropped')
+            print(f"Database error when flushing {rows} buffered rows, dropping them: {error}")
+            return
+        
+        print(f"Database error when flushing {rows} buffered rows, will retry: {error}")
+        with self._buffer_cond:
+            self._health_buffer[:0] = health_rows
+            self._update_buffer[:0] = update_rows
+    
+    @staticmethod
+    def _timestamp() -> str:
+        """Current UTC time in SQLite CURRENT_TIMESTAMP format."""
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+    
+    @instrumented('db')
+    def log_device_health(self, health_data: Dict[str, Any], device_id: Optional[str] = None):
         """
         Log device health metrics to the database.
         
         :param health_data: Dictionary containing device health information
+        :param device_id: Device the sample was collected from (defaults to this machine)
         """
+        row = (
+            self._timestamp(),
+            health_data.get('cpu_usage', 0),
+            health_data.get('memory_usage', 0),
+            health_data.get('disk_health', 'Unknown'),
+            health_data.get('status', 'OK'),
+            device_id or LOCAL_DEVICE_ID
+        )
+        
+        if self.buffered and self._enqueue(self._health_buffer, row):
+            return
+        
         try:
-            self.cursor.execute('''
-                INSERT INTO device_health 
-                (cpu_usage, memory_usage, disk_health, status) 
-                VALUES (?, ?, ?, ?)
-            ''', (
-                health_data.get('cpu_usage', 0),
-                health_data.get('memory_usage', 0),
-                health_data.get('disk_health', 'Unknown'),
-                health_data.get('status', 'OK')
-            ))
-            self.conn.commit()
+            with self.write_cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO device_health 
+                    (timestamp, cpu_usage, memory_usage, disk_health, status, device_id) 
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', row)
         except sqlite3.Error as e:
+            metrics.record_error('db', 'log_device_health')
             print(f"Database error when logging device health: {e}")
     
-    def log_update(self, update_name: str, status: str, details: str = ''):
+    @instrumented('db')
+    def log_update(self, update_name: str, status: str, details: str = '',
+                   device_id: Optional[str] = None):
         """
         Log Windows update information.
         
         :param update_name: Name of the update
         :param status: Update installation status
         :param details: Additional update details
+        :param device_id: Device the update belongs to (defaults to this machine)
         """
+        row = (self._timestamp(), update_name, status, details, device_id or LOCAL_DEVICE_ID)
+        
+        if self.buffered and self._enqueue(self._update_buffer, row):
+            return
+        
         try:
-            self.cursor.execute('''
-                INSERT INTO update_logs 
-                (update_name, status, details) 
-                VALUES (?, ?, ?)
-            ''', (update_name, status, details))
-            self.conn.commit()
+            with self.write_cursor() as cursor:
+                insert_update_logs(cursor, [row])
         except sqlite3.Error as e:
+            metrics.record_error('db', 'log_update')
             print(f"Database error when logging update: {e}")
     
+    @instrumented('db')
+    def record_device(self, device_id: str, status: str,
+                      configuration: Optional[Dict[str, Any]] = None):
+        """
+        Record that a device was contacted, with its latest configuration.
+        
+        :param device_id: Device identifier
+        :param status: Outcome of the last collection ('success' or 'error')
+        :param configuration: Device configuration, kept as before if None
+        """
+        try:
+            with self.write_cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO devices (device_id, last_seen, status, configuration)
+                    VALUES (?, CURRENT_TIMESTAMP, ?, ?)
+                    ON CONFLICT(device_id) DO UPDATE SET
+                        last_seen = excluded.last_seen,
+                        status = excluded.status,
+                        configuration = COALESCE(excluded.configuration, devices.configuration)
+                ''', (device_id, status, json.dumps(configuration) if configuration is not None else None))
+        except sqlite3.Error as e:
+            metrics.record_error('db', 'record_device')
+            print(f"Database error when recording device: {e}")
+    
+    @instrumented('db')
+    def replace_pending_updates(self, device_id: str, updates: List[str]):
+        """
+        Replace the pending update snapshot for a device.
+        
+        :param device_id: Device identifier
+        :param updates: Pending update titles from the latest scan
+        """
+        try:
+            # Delete and insert in one transaction (rolled back on error)
+            with self.write_cursor() as cursor:
+                cursor.execute('DELETE FROM pending_updates WHERE device_id = ?', (device_id,))
+                ids = intern_updates(cursor, updates)
+                cursor.executemany('''
+                    INSERT INTO pending_updates (device_id, update_id) VALUES (?, ?)
+                ''', [(device_id, ids[update]) for update in updates])
+                self._record_scan(cursor, device_id)
+        except sqlite3.Error as e:
+            metrics.record_error('db', 'replace_pending_updates')
+            print(f"Database error when storing pending updates: {e}")
+    
+    @instrumented('db')
+    def apply_pending_updates_diff(self, device_id: str, added: List[str], removed: List[str]):
+        """
+        Apply an incremental change to the pending update snapshot for a device.
+        
+        :param device_id: Device identifier
+        :param added: Update titles that appeared since the previous scan
+        :param removed: Update titles that are no longer pending
+        """
+        try:
+            with self.write_cursor() as cursor:
+                ids = intern_updates(cursor, added + removed)
+                cursor.executemany('''
+                    DELETE FROM pending_updates WHERE device_id = ? AND update_id = ?
+                ''', [(device_id, ids[update]) for update in removed])
+                cursor.executemany('''
+                    INSERT INTO pending_updates (device_id, update_id) VALUES (?, ?)
+                ''', [(device_id, ids[update]) for update in added])
+                self._record_scan(cursor, device_id)
+        except sqlite3.Error as e:
+            metrics.record_error('db', 'apply_pending_updates_diff')
+            print(f"Database error when updating pending updates: {e}")
+    
+    @staticmethod
+    def _record_scan(cursor: sqlite3.Cursor, device_id: str):
+        """Stamp a device's last successful scan inside the caller's write transaction."""
+        cursor.execute('''
+            INSERT INTO devices (device_id, last_scan) VALUES (?, CURRENT_TIMESTAMP)
+            ON CONFLICT(device_id) DO UPDATE SET last_scan = excluded.last_scan
+        ''', (device_id,))
+    
+    @instrumented('db')
     def get_recent_device_health(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Retrieve recent device health records.
@@ -97,24 +844,324 @@ class DatabaseManager:
         :param limit: Number of recent records to fetch
         :return: List of device health records
         """
+        # Make buffered samples visible to the query
+        self.flush()
         try:
-            self.cursor.execute('''
-                SELECT * FROM device_health 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (limit,))
-            columns = [column[0] for column in self.cursor.description]
-            return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+            with self.read_cursor() as cursor:
+                cursor.execute('''
+                    SELECT * FROM device_health 
+                    ORDER BY timestamp DESC 
+                    LIMIT ?
+                ''', (limit,))
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
         except sqlite3.Error as e:
+            metrics.record_error('db', 'get_recent_device_health')
             print(f"Database error when fetching device health: {e}")
             return []
     
+    def _log_filter_sql(self, table: str, filters: Optional[Dict[str, Any]]):
+        """
+        Build a WHERE fragment for log filters.
+        
+        :param table: Log table name
+        :param filters: Column equality filters plus optional 'since'/'until'
+                        timestamps and, for update_logs, a 'search' text query
+                        and a 'kb' id
+        :return: Tuple of (list of SQL conditions, list of parameters)
+        """
+        conditions, params = [], []
+        for name, value in (filters or {}).items():
+            if value is None or value == '':
+                continue
+            if name == 'search' and table == 'update_logs':
+                if self.fts_enabled:
+                    conditions.append('''id IN (
+                        SELECT rowid FROM update_logs_fts WHERE update_logs_fts MATCH ?
+                    )''')
+                    value = fts_query(value)
+                else:
+                    conditions.append(f"({update_title_sql()} LIKE ? OR details LIKE ?)")
+                    params.append(f'%{value}%')
+                    value = f'%{value}%'
+            elif name == 'kb' and table == 'update_logs':
+                # Resolved through the catalog's KB index, then update_logs' update_id index
+                conditions.append('update_id IN (SELECT id FROM update_catalog WHERE kb = ?)')
+                value = value.upper()
+            elif name == 'update_name' and table == 'update_logs':
+                conditions.append('update_id IN (SELECT id FROM update_catalog WHERE title = ?)')
+            elif name == 'since':
+                conditions.append('timestamp >= ?')
+            elif name == 'until':
+                conditions.append('timestamp < ?')
+            elif name in LOG_TABLE_COLUMNS[table]:
+                conditions.append(f'{name} = ?')
+            else:
+                raise ValueError(f"Unknown filter for {table}: {name}")
+            params.append(value)
+        return conditions, params
+    
+    @instrumented('db')
+    def fetch_log_page(self, table: str, sort_column: str = 'timestamp', descending: bool = True,
+                       after: Optional[tuple] = None, filters: Optional[Dict[str, Any]] = None,
+                       limit: int = 200, flush: bool = True) -> List[tuple]:
+        """
+        Fetch one page of log rows using keyset pagination.
+        
+        :param table: 'update_logs' or 'device_health'
+        :param sort_column: Column to sort by (ties are broken by id)
+        :param descending: Sort direction
+        :param after: Keyset of the last row of the previous page, as returned
+                      by ``log_row_key``; None for the first page
+        :param filters: Column equality filters plus optional 'since'/'until'
+        :param limit: Maximum rows to return
+        :param flush: Write buffered rows first so they are included; pass
+                      False on the GUI thread, where waiting for the writer
+                      lock would stall the UI
+        :return: Rows as tuples in ``LOG_TABLE_COLUMNS[table]`` order
+        """
+        if table not in LOG_TABLE_COLUMNS:
+            raise ValueError(f"Unknown log table: {table}")
+        if sort_column not in LOG_TABLE_COLUMNS[table]:
+            raise ValueError(f"Unknown sort column for {table}: {sort_column}")
+        
+        if flush:
+            self.flush()
+        
+        sort_expr = _SORT_EXPRESSIONS[sort_column]
+        conditions, params = self._log_filter_sql(table, filters)
+        
+        if after is not None:
+            op = '<' if descending else '>'
+            if sort_column == 'id':
+                conditions.append(f'id {op} ?')
+                params.append(after[1])
+            else:
+                conditions.append(f'({sort_expr} {op} ? OR ({sort_expr} = ? AND id {op} ?))')
+                params.extend([after[0], after[0], after[1]])
+        
+        direction = 'DESC' if descending else 'ASC'
+        order_by = 'id ' + direction if sort_column == 'id' else f'{sort_expr} {direction}, id {direction}'
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        
+        try:
+            with self.read_cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT {', '.join(_COLUMN_EXPRESSIONS.get(column, column)
+                                      for column in LOG_TABLE_COLUMNS[table])} FROM {table}
+                    {where}
+                    ORDER BY {order_by}
+                    LIMIT ?
+                ''', params + [limit])
+                return cursor.fetchall()
+        except sqlite3.Error as e:
+            metrics.record_error('db', 'fetch_log_page')
+            print(f"Database error when fetching {table} page: {e}")
+            return []
+    
+    @instrumented('db')
+    def search_update_logs(self, query: str, status: Optional[str] = None,
+                           since: Optional[str] = None, until: Optional[str] = None,
+                           device_id: Optional[str] = None, after: Optional[tuple] = None,
+                           limit: int = 50, highlight: tuple = ('[', ']')) -> Dict[str, Any]:
+        """
+        Full-text search over update names and details, newest first.
+        
+        :param query: Search text; each word must match (last word as a prefix)
+        :param status: Only rows with this status
+        :param since: Only rows at or after this timestamp
+        :param until: Only rows before this timestamp
+        :param device_id: Only rows from this device
+        :param after: ``next`` key from the previous page, or None for the first page
+        :param limit: Maximum rows per page
+        :param highlight: Markers placed around matched terms in snippets
+        :return: Dictionary with 'results' (rows with a highlighted 'snippet')
+                 and 'next' (key for the following page, or None)
+        """
+        self.flush()
+        
+        filters = {'status': status, 'since': since, 'until': until, 'device_id': device_id}
+        conditions, params = self._log_filter_sql('update_logs', filters)
+        conditions = [f'l.{condition}' for condition in conditions]
+        if after is not None:
+            conditions.append('(l.timestamp < ? OR (l.timestamp = ? AND l.id < ?))')
+            params.extend([after[0], after[0], after[1]])
+        
+        if not query.strip():
+            snippet = "substr(l.details, 1, 200)"
+            source = 'update_logs AS l'
+        elif self.fts_enabled:
+            # Pick the page first so snippets and titles are built for its rows only
+            snippet = "snippet(update_logs_fts, -1, ?, ?, '...', 16)"
+            source = f'''(
+                    SELECT l.id FROM update_logs_fts JOIN update_logs AS l ON l.id = update_logs_fts.rowid
+                    WHERE {' AND '.join(['update_logs_fts MATCH ?'] + conditions)}
+                    ORDER BY l.timestamp DESC, l.id DESC
+                    LIMIT ?
+                ) AS page
+                JOIN update_logs AS l ON l.id = page.id
+                JOIN update_logs_fts ON update_logs_fts.rowid = page.id'''
+            params = [highlight[0], highlight[1], fts_query(query)] + params + [limit, fts_query(query)]
+            conditions = ['update_logs_fts MATCH ?']
+        else:
+            snippet = "substr(l.details, 1, 200)"
+            source = 'update_logs AS l'
+            conditions.insert(0, f"({update_title_sql('l')} LIKE ? OR l.details LIKE ?)")
+            params = [f'%{query}%', f'%{query}%'] + params
+        
+        columns = ('id', 'timestamp', 'device_id', 'update_name', 'status', 'snippet')
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        try:
+            with self.read_cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT l.id, l.timestamp, l.device_id, {update_title_sql('l')}, l.status, {snippet}
+                    FROM {source}
+                    {where}
+                    ORDER BY l.timestamp DESC, l.id DESC
+                    LIMIT ?
+                ''', params + [limit])
+                results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            metrics.record_error('db', 'search_update_logs')
+            print(f"Database error when searching update logs: {e}")
+            return {'results': [], 'next': None}
+        
+        next_key = None
+        if len(results) == limit:
+            next_key = (results[-1]['timestamp'], results[-1]['id'])
+        return {'results': results, 'next': next_key}
+    
+    @instrumented('db')
+    def devices_missing_update(self, kb: str) -> List[str]:
+        """
+        Devices whose latest scan still lists an update as pending.
+
+        :param kb: KB id, e.g. 'KB5034441'
+        :return: Device ids, sorted
+        """
+        try:
+            with self.read_cursor() as cursor:
+                cursor.execute('''
+                    SELECT DISTINCT p.device_id
+                    FROM update_catalog c
+                    JOIN pending_updates p ON p.update_id = c.id
+                    WHERE c.kb = ?
+                    ORDER BY p.device_id
+                ''', (kb.upper(),))
+                return [row[0] for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            metrics.record_error('db', 'devices_missing_update')
+            print(f"Database error when finding devices missing {kb}: {e}")
+            return []
+
+    @instrumented('db')
+    def update_failure_rates(self, since: Optional[str] = None, min_attempts: int = 1,
+                             limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Install outcomes per KB, worst first.
+
+        :param since: Only installs logged at or after this UTC timestamp
+        :param min_attempts: Skip KBs with fewer install attempts
+        :param limit: Maximum rows
+        :return: Rows with kb, title, classification, attempts, installed,
+                 failed and failure_rate (0-1)
+        """
+        self.flush()
+        columns = ('kb', 'title', 'classification', 'attempts', 'installed', 'failed', 'failure_rate')
+        try:
+            with self.read_cursor() as cursor:
+                # Counted per catalog entry on the (update_id, status, timestamp)
+                # index, then folded into KBs
+                cursor.execute(f'''
+                    WITH outcomes AS (
+                        SELECT update_id,
+                               SUM(status = 'Installed') AS installed,
+                               SUM(status = 'Failed') AS failed
+                        FROM update_logs
+                        WHERE update_id IS NOT NULL AND status IN ('Installed', 'Failed')
+                              {'AND timestamp >= ?' if since else ''}
+                        GROUP BY update_id
+                    )
+                    SELECT c.kb, MIN(c.title), MIN(c.classification),
+                           SUM(o.installed + o.failed) AS attempts,
+                           SUM(o.installed), SUM(o.failed),
+                           SUM(o.failed) * 1.0 / SUM(o.installed + o.failed) AS failure_rate
+                    FROM outcomes o
+                    JOIN update_catalog c ON c.id = o.update_id
+                    WHERE c.kb IS NOT NULL
+                    GROUP BY c.kb
+                    HAVING attempts >= ?
+                    ORDER BY failure_rate DESC, attempts DESC
+                    LIMIT ?
+                ''', ([since] if since else []) + [min_attempts, limit])
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            metrics.record_error('db', 'update_failure_rates')
+            print(f"Database error when computing update failure rates: {e}")
+            return []
+
+    @staticmethod
+    def log_row_key(table: str, row: tuple, sort_column: str = 'timestamp') -> tuple:
+        """
+        Keyset of a row returned by ``fetch_log_page``, for fetching the next page.
+        
+        :param table: Log table name
+        :param row: Row tuple
+        :param sort_column: Sort column used for the page
+        :return: Tuple of (sort value, id)
+        """
+        value = row[LOG_TABLE_COLUMNS[table].index(sort_column)]
+        if value is None:
+            value = 0 if sort_column in ('cpu_usage', 'memory_usage') else ''
+        return (value, row[0])
+    
     def close(self):
-        """Close database connection."""
-        self.conn.close()
+        """Flush buffered rows and close database connection."""
+        if self._closed:
+            return
+        
+        with self._buffer_cond:
+            self._closed = True
+            self._buffer_cond.notify()
+        if self._writer is not None:
+            self._writer.join(timeout=10)
+        
+        # Guaranteed final flush, even if the writer did not finish in time;
+        # a failed batch is requeued, so retry until it is written or dropped
+        for _ in range(_FLUSH_ATTEMPTS):
+            self.flush()
+            with self._buffer_cond:
+                if not self._buffered_rows():
+                    break
+        if self._readers is not None:
+            self._readers.close()
+        with self.lock:
+            self.conn.close()
+
+# Shared database manager, opened on first use so importing this module
+# does not touch the database file
+_db_manager = None
+_db_manager_lock = threading.Lock()
+
+
+def get_db_manager() -> DatabaseManager:
+    """
+    Return the shared database manager, creating it on first use.
+    The database path can be overridden with ``AUTOPATCH_DB_PATH``.
+
+    :return: Process-wide DatabaseManager instance
+    """
+    global _db_manager
+    with _db_manager_lock:
+        if _db_manager is None:
+            _db_manager = DatabaseManager(os.environ.get('AUTOPATCH_DB_PATH', 'autopatch_guardian.db'))
+            # Ensure proper database closure
+            atexit.register(_db_manager.close)
+        return _db_manager
 
-# Ensure proper database closure
-import atexit
 
-db_manager = DatabaseManager()
-atexit.register(db_manager.close)
\ No newline at end of file
+def __getattr__(name):
+    # Keeps ``from database import db_manager`` working without an import-time connection
+    if name == 'db_manager':
+        return get_db_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,18 +1,55 @@
 import subprocess
 import os
 import platform
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from shell_host import ShellHost, get_shell_host, run_process
+from protocol import parse_single_record
+from metrics import instrumented, registry as metrics
+from health_backends import ScriptHealthBackend, select_health_backends
+from config_cache import DeviceConfigCache, get_config_cache, local_fingerprint
+
+@instrumented('parse', 'health')
+def parse_system_health(output: str) -> Dict[str, Any]:
+    """
+    Parse GetSystemHealth output (an NDJSON health record or legacy ``cpu|mem|disk``).
+    
+    :param output: Script stdout
+    :return: Dictionary of system health information
+    """
+    return parse_single_record(output, 'health').to_dict()
+
+@instrumented('parse', 'config')
+def parse_device_configuration(output: str) -> Dict[str, Any]:
+    """
+    Parse GetDeviceConfig output (an NDJSON config record or legacy ``memory|storage``).
+    
+    :param output: Script stdout
+    :return: Dictionary with total_memory and storage_info
+    """
+    return parse_single_record(output, 'config').to_dict()
 
 class DeviceHealthMonitor:
     """
     Monitors and retrieves system health metrics and device configuration.
     Integrates with PowerShell for comprehensive system information gathering.
     """
-    def __init__(self, powershell_script_path: str = None):
+    # Per-request timeout in seconds
+    request_timeout = 120.0
+
+    def __init__(self, powershell_script_path: str = None, shell_host: ShellHost = None,
+                 health_backend: str = None, config_cache: DeviceConfigCache = None):
         """
         Initialize Device Health Monitor.
         
         :param powershell_script_path: Path to PowerShell device info script
+        :param shell_host: Warm shell host to run actions on. Defaults to the
+                           shared host unless a custom script path is given,
+                           in which case a process is spawned per call.
+        :param health_backend: 'auto' (cheapest available), 'native' or 'script'.
+                               Defaults to AUTOPATCH_HEALTH_BACKEND or 'auto'.
+        :param config_cache: Persistent configuration cache (defaults to the
+                             shared database on first use)
         """
         # Default script path if not provided
         if not powershell_script_path:
@@ -21,70 +58,117 @@ class DeviceHealthMonitor:
                 'powershell', 
                 'device_info.ps1'
             )
+            if shell_host is None:
+                shell_host = get_shell_host()
         
         self.script_path = powershell_script_path
+        self.shell_host = shell_host
+        self.config_cache = config_cache
+        
+        # Cheapest backend first; the script backend stays as the fallback
+        self.health_backends = select_health_backends(
+            ScriptHealthBackend(self._run_action),
+            health_backend or os.environ.get('AUTOPATCH_HEALTH_BACKEND', 'auto')
+        )
     
-    def get_system_health(self) -> Dict[str, Any]:
+    def _run_action(self, action: str) -> subprocess.CompletedProcess:
         """
-        Collect system health metrics.
+        Run a device information action.
         
-        :return: Dictionary of system health information
+        :param action: Script action to run
+        :return: Completed process with returncode, stdout and stderr
         """
-        try:
-            # Execute PowerShell script to get system health
-            result = subprocess.run(
+        if self.shell_host is not None:
+            # The bundled scripts served by the host emit NDJSON records
+            return self.shell_host.run('device_info', action, {'Format': 'Json'},
+                                       timeout=self.request_timeout)
+        
+        with metrics.timer('subprocess', f'device_info.{action}'):
+            result = run_process(
                 ['powershell.exe', '-ExecutionPolicy', 'Bypass', '-File', self.script_path, 
-                 '-Action', 'GetSystemHealth'],
-                capture_output=True, 
-                text=True
+                 '-Action', action],
+                timeout=self.request_timeout
             )
-            
-            if result.returncode == 0:
-                # Parse system health metrics
-                # This is a simplified mock implementation
-                return {
-                    'cpu_usage': float(result.stdout.split('|')[0] or 0),
-                    'memory_usage': float(result.stdout.split('|')[1] or 0),
-                    'disk_health': result.stdout.split('|')[2] or 'Unknown',
-                    'status': 'OK' if float(result.stdout.split('|')[0] or 0) < 80 else 'WARNING'
-                }
-            else:
-                return {
-                    'status': 'error',
-                    'message': result.stderr
-                }
-        except Exception as e:
-            return {
-                'status': 'error',
-                'message': str(e)
-            }
+        if result.returncode != 0:
+            metrics.record_error('subprocess', f'device_info.{action}')
+        return result
+    
+    @instrumented('device_health')
+    def get_system_health(self) -> Dict[str, Any]:
+        """
+        Collect system health metrics from the cheapest backend that works,
+        falling back to the script backend.
+        
+        :return: Dictionary of system health information
+        """
+        error = None
+        for backend in self.health_backends:
+            try:
+                with metrics.timer('health_backend', backend.name):
+                    return backend.sample().to_dict()
+            except Exception as e:
+                error = e
+        
+        return {
+            'status': 'error',
+            'message': str(error)
+        }
+    
+    def _local_device_id(self) -> str:
+        from database import LOCAL_DEVICE_ID
+        return LOCAL_DEVICE_ID
+    
+    def _get_config_cache(self) -> DeviceConfigCache:
+        if self.config_cache is None:
+            self.config_cache = get_config_cache()
+        return self.config_cache
     
-    def get_device_configuration(self) -> Dict[str, Any]:
+    def cached_device_configuration(self) -> Optional[Dict[str, Any]]:
         """
-        Retrieve comprehensive device configuration details.
+        Last collected device configuration, without collecting or validating it.
         
+        :return: Configuration dictionary, or None if none was cached yet
+        """
+        entry = self._get_config_cache().get(self._local_device_id())
+        return entry['config'] if entry else None
+    
+    @instrumented('device_health')
+    def get_device_configuration(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Retrieve comprehensive device configuration details. The cached
+        configuration is returned while the device fingerprint (boot time,
+        hostname, OS build) is unchanged and the cache TTL has not expired.
+        
+        :param force: Collect even if the cached configuration is still valid
         :return: Dictionary of device configuration information
         """
+        cache = self._get_config_cache()
+        device_id = self._local_device_id()
+        fingerprint = local_fingerprint()
+        if not force:
+            entry = cache.get(device_id)
+            if cache.is_fresh(entry, fingerprint):
+                return entry['config']
+        
+        config = self._collect_device_configuration()
+        if config.get('status') != 'error':
+            cache.store(device_id, config, fingerprint)
+        return config
+    
+    def _collect_device_configuration(self) -> Dict[str, Any]:
+        """Run the configuration script."""
         try:
             # Execute PowerShell script to get device configuration
-            result = subprocess.run(
-                ['powershell.exe', '-ExecutionPolicy', 'Bypass', '-File', self.script_path, 
-                 '-Action', 'GetDeviceConfig'],
-                capture_output=True, 
-                text=True
-            )
+            result = self._run_action('GetDeviceConfig')
             
             if result.returncode == 0:
                 # Parse device configuration
-                # This is a simplified mock implementation
-                config_data = result.stdout.split('|')
                 return {
                     'os_version': platform.version(),
                     'os_name': platform.system(),
                     'hostname': platform.node(),
                     'processor': platform.processor(),
-                    'total_memory': config_data[0] if config_data else 'Unknown',
-                    'storage_info': config_data[1] if len(config_data) > 1 else 'Unknown'
+                    **parse_device_configuration(result.stdout)
                 }
             else:
                 return {
@@ -97,5 +181,29 @@ class DeviceHealthMonitor:
                 'message': str(e)
             }
 
-# Singleton instance for global access
-device_health_monitor = DeviceHealthMonitor()
\ No newline at end of file
+    def close(self):
+        """Stop background samplers used by the health backends."""
+        for backend in self.health_backends:
+            backend.close()
+
+# Singleton instance for global access, created on first use
+_device_health_monitor = None
+
+
+def get_device_health_monitor() -> DeviceHealthMonitor:
+    """
+    Return the shared device health monitor, creating it on first use.
+
+    :return: Process-wide DeviceHealthMonitor instance
+    """
+    global _device_health_monitor
+    if _device_health_monitor is None:
+        _device_health_monitor = DeviceHealthMonitor()
+    return _device_health_monitor
+
+
+def __getattr__(name):
+    # Keeps ``from device_health import device_health_monitor`` working lazily
+    if name == 'device_health_monitor':
+        return get_device_health_monitor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
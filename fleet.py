@@ -0,0 +1,226 @@
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from device_health import parse_system_health, parse_device_configuration
+from update_tracker import parse_pending_updates
+from shell_host import ShellHost, ShellHostTimeout, get_shell_host, run_process
+from config_cache import DeviceConfigCache
+
+# Collection actions: name -> (script, script action)
+FLEET_ACTIONS = {
+    'health': ('device_info', 'GetSystemHealth'),
+    'config': ('device_info', 'GetDeviceConfig'),
+    'pending_updates': ('update_manager', 'CheckUpdates'),
+}
+
+# Output parsers for each collection action
+FLEET_PARSERS = {
+    'health': parse_system_health,
+    'config': parse_device_configuration,
+    'pending_updates': parse_pending_updates,
+}
+
+
+class FleetTransportError(Exception):
+    """Raised when an action cannot be completed on a target device."""
+
+
+class FleetTransport:
+    """
+    Base class for transports that run a script action on a target device.
+    """
+    def run(self, target: str, script: str, action: str,
+            timeout: float) -> subprocess.CompletedProcess:
+        """
+        Run a script action on a target.
+
+        :param target: Device identifier (host name or address)
+        :param script: Script name ('device_info' or 'update_manager')
+        :param action: Script action
+        :param timeout: Seconds before the attempt is abandoned
+        :return: Completed process with returncode, stdout and stderr
+        """
+        raise NotImplementedError
+
+
+class RemotingTransport(FleetTransport):
+    """
+    Runs actions on remote computers with PowerShell remoting,
+    dispatched through the warm shell host.
+    """
+    def __init__(self, shell_host: ShellHost = None):
+        """
+        :param shell_host: Shell host to dispatch through (defaults to the shared host)
+        """
+        self.shell_host = shell_host or get_shell_host()
+
+    def run(self, target, script, action, timeout):
+        return self.shell_host.run(script, action, timeout=timeout, computer=target)
+
+
+class LocalProcessTransport(FleetTransport):
+    """
+    Runs a local command per request, invoked as ``command + [target, script, action]``.
+    Used with a stand-in device script to exercise fleet collection off Windows.
+    """
+    def __init__(self, command: List[str]):
+        """
+        :param command: Command prefix of the stand-in device script
+        """
+        self.command = list(command)
+
+    def run(self, target, script, action, timeout):
+        return run_process(self.command + [target, script, action], timeout=timeout)
+
+
+class FleetCollector:
+    """
+    Collects health, configuration and pending updates from many devices
+    with bounded concurrency, per-host timeouts and retry with backoff.
+    Results are written to the database tagged by device.
+    """
+    def __init__(self, transport: FleetTransport, db=None, concurrency: int = 16,
+                 host_timeout: float = 600.0, action_timeout: float = 300.0,
+                 retries: int = 2, backoff: float = 1.0, max_backoff: float = 30.0,
+                 actions: Iterable[str] = tuple(FLEET_ACTIONS)):
+        """
+        Initialize the fleet collector.
+
+        :param transport: Transport used to reach devices
+        :param db: DatabaseManager for results (defaults to the shared manager)
+        :param concurrency: Maximum number of devices collected at once
+        :param host_timeout: Overall time budget per device in seconds
+        :param action_timeout: Maximum time per action attempt in seconds
+        :param retries: Retries per action after the first attempt
+        :param backoff: Base delay in seconds for exponential backoff
+        :param max_backoff: Upper bound for a single backoff delay
+        :param actions: Collection actions to run (keys of FLEET_ACTIONS)
+        """
+        if db is None:
+            from database import get_db_manager
+            db = get_db_manager()
+
+        self.transport = transport
+        self.db = db
+        # Remote configurations feed the same change history as the local one
+        self.config_cache = DeviceConfigCache(db)
+        self.concurrency = max(1, concurrency)
+        self.host_timeout = host_timeout
+        self.action_timeout = action_timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.actions = [action for action in actions if action in FLEET_ACTIONS]
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Stop collection: pending devices are skipped and backoff waits end early."""
+        self._stop_event.set()
+
+    def collect(self, targets: Iterable[str],
+                on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Collect from all targets concurrently.
+
+        :param targets: Device identifiers
+        :param on_result: Optional callback invoked with each device result as it completes
+        :return: List of per-device results in completion order
+        """
+        self._stop_event.clear()
+        targets = list(dict.fromkeys(targets))
+        results = []
+        if not targets:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(targets))) as pool:
+            futures = [pool.submit(self.collect_device, target) for target in targets]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+        return results
+
+    def collect_device(self, target: str) -> Dict[str, Any]:
+        """
+        Run every collection action against one device and store the results.
+
+        :param target: Device identifier
+        :return: Device result with status, parsed action data and errors
+        """
+        started = time.monotonic()
+        deadline = started + self.host_timeout
+        result = {'device_id': target, 'status': 'success', 'attempts': 0, 'errors': {}}
+
+        for name in self.actions:
+            if self._stop_event.is_set():
+                result['errors'][name] = 'cancelled'
+                continue
+            try:
+                output = self._run_with_retry(target, name, deadline, result)
+                result[name] = FLEET_PARSERS[name](output)
+            except Exception as e:
+                result['errors'][name] = str(e)
+
+        if result['errors']:
+            result['status'] = 'error' if len(result['errors']) == len(self.actions) else 'partial'
+        result['elapsed'] = time.monotonic() - started
+
+        self._store(result)
+        return result
+
+    def _run_with_retry(self, target: str, name: str, deadline: float,
+                        result: Dict[str, Any]) -> str:
+        """
+        Run one action with retries, backing off exponentially between attempts.
+
+        :return: Action stdout
+        """
+        script, action = FLEET_ACTIONS[name]
+        error = 'host timeout exceeded'
+
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            result['attempts'] += 1
+            try:
+                completed = self.transport.run(target, script, action,
+                                               min(self.action_timeout, remaining))
+                if completed.returncode == 0:
+                    return completed.stdout
+                error = (completed.stderr or '').strip() or f"exit code {completed.returncode}"
+            except (subprocess.TimeoutExpired, ShellHostTimeout):
+                error = f"{action} timed out"
+            except Exception as e:
+                error = str(e)
+
+            if attempt < self.retries:
+                # Full-jitter exponential backoff, bounded by the host deadline
+                delay = min(self.max_backoff, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+                if self._stop_event.wait(delay):
+                    break
+
+        raise FleetTransportError(f"{target}: {error}")
+
+    def _store(self, result: Dict[str, Any]):
+        """Write a device result to the database, tagged by device."""
+        device_id = result['device_id']
+
+        if 'health' in result:
+            self.db.log_device_health(result['health'], device_id=device_id)
+        if 'pending_updates' in result:
+            self.db.replace_pending_updates(device_id, result['pending_updates'])
+
+        configuration = result.get('config')
+        if configuration is not None:
+            configuration = dict(configuration, hostname=device_id)
+            self.config_cache.store(device_id, configuration)
+        self.db.record_device(device_id, result['status'], configuration)
@@ -0,0 +1,413 @@
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from database import update_title_sql
+from protocol import extract_kb
+from metrics import instrumented
+
+# Disk health labels as ordinal scores (higher is worse); unknown labels are ignored
+DISK_SCORES = {'GOOD': 0, 'MEDIUM': 1, 'LOW': 2}
+
+# Minimum absolute change (percentage points, or disk score levels) that
+# counts as a regression, whatever the baseline noise
+DEFAULT_MIN_DELTA = {
+    'cpu': 15.0,
+    'memory': 10.0,
+    'disk': 0.5,
+}
+
+METRICS = ('cpu', 'memory', 'disk')
+
+# Policy modes
+FLAG = 'flag'
+AUTO_ROLLBACK = 'auto'
+
+_SAMPLE_DTYPE = np.dtype([('t', 'i8'), ('cpu', 'f8'), ('memory', 'f8'), ('disk', 'f8')])
+
+
+def window_stats(keys: np.ndarray, values: np.ndarray, starts: np.ndarray,
+                 ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Count, mean and standard deviation of ``values`` over many key windows at once.
+    NaN values are ignored. Uses prefix sums, so the cost is one pass over
+    the samples plus a binary search per window.
+
+    :param keys: Sorted sample keys
+    :param values: Sample values aligned with keys
+    :param starts: Inclusive window starts
+    :param ends: Exclusive window ends
+    :return: (count, mean, std) arrays, one entry per window (NaN when empty)
+    """
+    valid = ~np.isnan(values)
+    clean = np.where(valid, values, 0.0)
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    sums = np.concatenate(([0.0], np.cumsum(clean)))
+    squares = np.concatenate(([0.0], np.cumsum(clean * clean)))
+
+    lo = np.searchsorted(keys, starts, side='left')
+    hi = np.searchsorted(keys, ends, side='left')
+    n = counts[hi] - counts[lo]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (sums[hi] - sums[lo]) / n
+        variance = (squares[hi] - squares[lo]) / n - mean * mean
+    std = np.sqrt(np.maximum(variance, 0.0))
+    return n, mean, std
+
+
+class HealthRegressionDetector:
+    """
+    Compares device health before and after each installed update.
+    For every install in update_logs, the baseline is the window of samples
+    before it and the observation window starts after a settle period. A
+    metric regresses when its mean rises by at least ``min_delta`` and by
+    ``z_threshold`` baseline standard deviations. Windows for all devices
+    and installs are evaluated together with vectorized prefix sums.
+    """
+    def __init__(self, db=None, baseline_window: float = 86400.0, settle: float = 600.0,
+                 observe_window: float = 21600.0, min_samples: int = 10,
+                 z_threshold: float = 3.0, std_floor: float = 2.0,
+                 min_delta: Dict[str, float] = None, lookback: float = 7 * 86400.0):
+        """
+        Initialize the regression detector.
+
+        :param db: DatabaseManager with health and update history (defaults to the shared manager)
+        :param baseline_window: Seconds of samples before an install used as the baseline
+        :param settle: Seconds after an install that are ignored (install load, reboot)
+        :param observe_window: Seconds after the settle period compared with the baseline
+        :param min_samples: Samples required in each window to judge an install
+        :param z_threshold: Required rise in baseline standard deviations
+        :param std_floor: Lower bound for the baseline standard deviation, so
+                          a flat baseline does not turn noise into regressions
+        :param min_delta: Minimum rise per metric ('cpu', 'memory', 'disk')
+        :param lookback: Seconds back to look for installs that have not been checked
+        """
+        if db is None:
+            from database import get_db_manager
+            db = get_db_manager()
+
+        self.db = db
+        self.baseline_window = baseline_window
+        self.settle = settle
+        self.observe_window = observe_window
+        self.min_samples = min_samples
+        self.z_threshold = z_threshold
+        self.std_floor = std_floor
+        self.min_delta = dict(DEFAULT_MIN_DELTA, **(min_delta or {}))
+        self.lookback = lookback
+
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create the table recording the verdict for each checked install."""
+        with self.db.lock, self.db.conn:
+            self.db.conn.execute('''
+                CREATE TABLE IF NOT EXISTS install_health_checks (
+                    update_log_id INTEGER PRIMARY KEY,
+                    device_id TEXT,
+                    update_name TEXT,
+                    installed_at DATETIME,
+                    checked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    verdict TEXT NOT NULL,
+                    regressed TEXT,
+                    score REAL,
+                    cpu_baseline REAL, cpu_after REAL,
+                    memory_baseline REAL, memory_after REAL,
+                    disk_baseline REAL, disk_after REAL,
+                    action TEXT
+                )
+            ''')
+
+    @property
+    def span(self) -> float:
+        """Seconds from an install to the end of its observation window."""
+        return self.settle + self.observe_window
+
+    def due_installs(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Installs whose observation window has ended and that have not been checked yet.
+
+        :param now: Current time as a Unix timestamp (defaults to the clock)
+        :return: Install events with update_log_id, device_id, update_name and installed_at
+        """
+        now = time.time() if now is None else now
+        self.db.flush()
+        return self._install_events(
+            now - self.lookback, now - self.span,
+            unchecked_only=True
+        )
+
+    def _install_events(self, start: float, end: float, device_ids: Sequence[str] = None,
+                        unchecked_only: bool = False) -> List[Dict[str, Any]]:
+        """Installed updates between two Unix timestamps."""
+        conditions = ["l.status = 'Installed'", 'l.timestamp >= ?', 'l.timestamp < ?']
+        params: List[Any] = [_sqlite_time(start), _sqlite_time(end)]
+        if device_ids is not None:
+            conditions.append(f"COALESCE(l.device_id, '') IN ({', '.join('?' * len(device_ids))})")
+            params.extend(device_ids)
+        if unchecked_only:
+            conditions.append('c.update_log_id IS NULL')
+
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT l.id, COALESCE(l.device_id, ''), {update_title_sql('l')},
+                           CAST(strftime('%s', l.timestamp) AS INTEGER)
+                    FROM update_logs l
+                    LEFT JOIN install_health_checks c ON c.update_log_id = l.id
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY l.id
+                ''', params)
+                rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error when reading install history: {e}")
+            return []
+
+        columns = ('update_log_id', 'device_id', 'update_name', 'installed_at')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def load_samples(self, device_id: str, start: float, end: float) -> np.ndarray:
+        """
+        Load one device's health samples between two Unix timestamps.
+        Failed collections are logged with zero readings and are skipped.
+
+        :param device_id: Device id ('' for rows without one)
+        :param start: Range start (inclusive)
+        :param end: Range end (exclusive)
+        :return: Structured array with t, cpu, memory and disk score, ordered by time
+        """
+        disk_case = ' '.join(f"WHEN '{label}' THEN {score}" for label, score in DISK_SCORES.items())
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT CAST(strftime('%s', timestamp) AS INTEGER),
+                           cpu_usage, memory_usage,
+                           CASE disk_health {disk_case} END
+                    FROM device_health
+                    WHERE device_id IS ? AND timestamp >= ? AND timestamp < ?
+                      AND status IS NOT 'error'
+                    ORDER BY timestamp
+                ''', (device_id or None, _sqlite_time(start), _sqlite_time(end)))
+                rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error when reading device health: {e}")
+            rows = []
+
+        # NULL columns become NaN and are ignored by the window statistics
+        columns = np.array(rows, dtype=np.float64).reshape(-1, len(_SAMPLE_DTYPE.names))
+        samples = np.empty(len(columns), dtype=_SAMPLE_DTYPE)
+        for index, name in enumerate(_SAMPLE_DTYPE.names):
+            samples[name] = columns[:, index]
+        return samples
+
+    @instrumented('health_analysis')
+    def analyze(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Judge each install event against the health samples around it.
+
+        :param events: Install events as returned by ``due_installs``
+        :return: One finding per event with verdict ('ok', 'regression' or
+                 'insufficient_data'), per-metric statistics, regressed metrics
+                 and the candidate updates installed close together
+        """
+        if not events:
+            return []
+
+        self.db.flush()
+        devices = sorted({event['device_id'] for event in events})
+        times = np.array([event['installed_at'] for event in events], dtype=np.int64)
+        # Installs near the checked ones, which may share the blame
+        neighbours = self._install_events(times.min() - self.span, times.max() + self.span + 1,
+                                          devices)
+
+        # Lay every device out on one key axis so all windows are evaluated
+        # at once; device ranges are padded so no window crosses into another
+        origin = int(times.min() - self.baseline_window - self.span)
+        stride = int(times.max() - origin + 2 * (self.baseline_window + self.span)) + 1
+        device_index = {device: index for index, device in enumerate(devices)}
+
+        chunks, chunk_keys = [], []
+        for device in devices:
+            samples = self.load_samples(device, times.min() - self.baseline_window,
+                                        times.max() + self.span)
+            chunks.append(samples)
+            chunk_keys.append(device_index[device] * stride + (samples['t'] - origin))
+        samples = np.concatenate(chunks)
+        keys = np.concatenate(chunk_keys)
+
+        def event_keys(items):
+            offsets = np.array([device_index[item['device_id']] * stride for item in items], dtype=np.int64)
+            return offsets + np.array([item['installed_at'] for item in items], dtype=np.int64) - origin
+
+        install_keys = event_keys(events)
+        stats = {}
+        for metric in METRICS:
+            base = window_stats(keys, samples[metric],
+                                install_keys - int(self.baseline_window), install_keys)
+            after = window_stats(keys, samples[metric],
+                                 install_keys + int(self.settle), install_keys + int(self.span))
+            stats[metric] = (base, after)
+
+        # Candidates: installs on the same device whose windows overlap
+        neighbour_keys = event_keys(neighbours)
+        order = np.argsort(neighbour_keys, kind='stable')
+        sorted_keys = neighbour_keys[order]
+        first = np.searchsorted(sorted_keys, install_keys - int(self.span), side='left')
+        last = np.searchsorted(sorted_keys, install_keys + int(self.span), side='right')
+
+        findings = []
+        for i, event in enumerate(events):
+            candidates = [neighbours[j]['update_name'] for j in order[first[i]:last[i]]]
+            findings.append(self._judge(event, {metric: (stats[metric][0][0][i], stats[metric][0][1][i],
+                                                         stats[metric][0][2][i], stats[metric][1][0][i],
+                                                         stats[metric][1][1][i])
+                                                for metric in METRICS},
+                                        candidates or [event['update_name']]))
+        return findings
+
+    def _judge(self, event: Dict[str, Any], stats: Dict[str, tuple],
+               candidates: List[str]) -> Dict[str, Any]:
+        """Turn window statistics for one install into a finding."""
+        metrics, regressed, score = {}, [], 0.0
+        enough_data = False
+        for metric, (base_n, base_mean, base_std, after_n, after_mean) in stats.items():
+            if base_n < self.min_samples or after_n < self.min_samples:
+                metrics[metric] = None
+                continue
+            enough_data = True
+            delta = after_mean - base_mean
+            z = delta / max(base_std, self.std_floor if metric != 'disk' else 0.1)
+            metrics[metric] = {'baseline': float(base_mean), 'after': float(after_mean),
+                               'delta': float(delta), 'z': float(z)}
+            if delta >= self.min_delta[metric] and z >= self.z_threshold:
+                regressed.append(metric)
+                score = max(score, float(z))
+
+        if not enough_data:
+            verdict = 'insufficient_data'
+        else:
+            verdict = 'regression' if regressed else 'ok'
+
+        return dict(event, verdict=verdict, metrics=metrics, regressed=regressed,
+                    score=score, candidates=candidates)
+
+
+class RollbackPolicy:
+    """
+    Acts on regression findings. In ``flag`` mode a regression is logged
+    to update_logs for review; in ``auto`` mode the update is also rolled
+    back, but only on this device and only when no other install happened
+    close enough to share the blame.
+    """
+    def __init__(self, detector: HealthRegressionDetector = None, tracker=None,
+                 mode: str = FLAG, device_id: Optional[str] = None):
+        """
+        Initialize the rollback policy.
+
+        :param detector: Regression detector (defaults to one on the shared database)
+        :param tracker: WindowsUpdateTracker used for rollbacks (defaults to the shared tracker)
+        :param mode: 'flag' or 'auto'
+        :param device_id: The device this process can roll back (defaults to this machine)
+        """
+        if mode not in (FLAG, AUTO_ROLLBACK):
+            raise ValueError(f"Unknown rollback policy mode: {mode}")
+        if device_id is None:
+            from database import LOCAL_DEVICE_ID
+            device_id = LOCAL_DEVICE_ID
+
+        self.detector = detector or HealthRegressionDetector()
+        self.db = self.detector.db
+        self._tracker = tracker
+        self.mode = mode
+        self.device_id = device_id
+
+    @property
+    def tracker(self):
+        if self._tracker is None:
+            from update_tracker import get_update_tracker
+            self._tracker = get_update_tracker()
+        return self._tracker
+
+    def run(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Check every install whose observation window has ended and apply the policy.
+
+        :param now: Current time as a Unix timestamp (defaults to the clock)
+        :return: Result with status, the number of installs checked and the regressions found
+        """
+        try:
+            findings = self.detector.analyze(self.detector.due_installs(now))
+        except (sqlite3.Error, ValueError) as e:
+            return {'status': 'error', 'message': str(e)}
+
+        for finding in findings:
+            finding['action'] = self.apply(finding)
+            self._record(finding)
+
+        return {
+            'status': 'success',
+            'checked': len(findings),
+            'regressions': [finding for finding in findings if finding['verdict'] == 'regression'],
+        }
+
+    def apply(self, finding: Dict[str, Any]) -> Optional[str]:
+        """
+        Apply the policy to one finding.
+
+        :param finding: Finding from ``HealthRegressionDetector.analyze``
+        :return: Action taken ('flagged', 'rolled_back', 'rollback_failed') or None
+        """
+        if finding['verdict'] != 'regression':
+            return None
+
+        update, device_id = finding['update_name'], finding['device_id']
+        summary = ', '.join(
+            f"{metric} {finding['metrics'][metric]['baseline']:.1f} -> {finding['metrics'][metric]['after']:.1f}"
+            for metric in finding['regressed']
+        )
+        others = [candidate for candidate in finding['candidates'] if candidate != update]
+        if others:
+            summary += f"; also installed nearby: {', '.join(others)}"
+        self.db.log_update(update, 'Regression Detected', summary, device_id=device_id or None)
+
+        if self.mode != AUTO_ROLLBACK or others or device_id != self.device_id:
+            return 'flagged'
+
+        result = self.tracker.rollback_updates(extract_kb(update) or update)
+        if result['status'] == 'success':
+            self.db.log_update(update, 'Rolled Back', f"Automatic rollback after regression: {summary}",
+                               device_id=device_id)
+            return 'rolled_back'
+
+        self.db.log_update(update, 'Rollback Failed',
+                           result.get('error') or result.get('message', ''), device_id=device_id)
+        return 'rollback_failed'
+
+    def _record(self, finding: Dict[str, Any]):
+        """Store the verdict so the install is not checked again."""
+        values = []
+        for metric in METRICS:
+            stats = finding['metrics'][metric]
+            values.extend((stats['baseline'], stats['after']) if stats else (None, None))
+
+        try:
+            with self.db.lock, self.db.conn:
+                self.db.conn.execute('''
+                    INSERT OR REPLACE INTO install_health_checks
+                    (update_log_id, device_id, update_name, installed_at, verdict, regressed, score,
+                     cpu_baseline, cpu_after, memory_baseline, memory_after,
+                     disk_baseline, disk_after, action)
+                    VALUES (?, ?, ?, datetime(?, 'unixepoch'), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (finding['update_log_id'], finding['device_id'], finding['update_name'],
+                      finding['installed_at'], finding['verdict'], ','.join(finding['regressed']),
+                      finding['score'], *values, finding['action']))
+        except sqlite3.Error as e:
+            print(f"Database error when saving install health check: {e}")
+
+
+def _sqlite_time(value: float) -> str:
+    """Unix timestamp to SQLite's UTC text format."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(value))
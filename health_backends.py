@@ -0,0 +1,256 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable, List, Tuple
+
+from protocol import HealthRecord, parse_single_record
+from shell_host import ShellActionError
+from metrics import registry as metrics
+
+
+def disk_health_label(free_percent: float) -> str:
+    """Classify free space on the system drive like device_info.ps1 does."""
+    if free_percent < 10:
+        return 'LOW'
+    if free_percent < 20:
+        return 'MEDIUM'
+    return 'GOOD'
+
+
+class HealthBackend:
+    """
+    Base class for system health collectors.
+    Backends with a lower ``cost`` are preferred when several are available.
+    """
+    name = 'base'
+    cost = 100
+
+    @classmethod
+    def available(cls) -> bool:
+        """Whether the backend can run on this machine."""
+        return True
+
+    def sample(self) -> HealthRecord:
+        """
+        Collect one health record.
+
+        :return: Health record
+        :raises Exception: If the backend cannot produce a sample
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources held by the backend."""
+
+
+class ScriptHealthBackend(HealthBackend):
+    """
+    Runs the GetSystemHealth script action (PowerShell and WMI queries).
+    Works everywhere the scripts do, but every sample costs a script run.
+    """
+    name = 'script'
+    cost = 100
+
+    def __init__(self, run_action: Callable[[str], subprocess.CompletedProcess]):
+        """
+        :param run_action: Runs a device_info action and returns the completed process
+        """
+        self.run_action = run_action
+
+    def sample(self) -> HealthRecord:
+        result = self.run_action('GetSystemHealth')
+        if result.returncode != 0:
+            raise ShellActionError(result.returncode, result.stderr)
+        with metrics.timer('parse', 'health'):
+            return parse_single_record(result.stdout, 'health')
+
+
+def _read_linux_cpu_times() -> Tuple[int, int]:
+    """Return (busy, total) jiffies across all CPUs from /proc/stat."""
+    with open('/proc/stat') as f:
+        fields = f.readline().split()
+    # user nice system idle iowait irq softirq steal (guest time is already in user)
+    values = [int(value) for value in fields[1:9]]
+    idle = values[3] + values[4]
+    total = sum(values)
+    return total - idle, total
+
+
+def _read_linux_memory_percent() -> float:
+    """Return used physical memory in percent from /proc/meminfo."""
+    info = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            info[name] = int(value.split()[0])
+    total = info['MemTotal']
+    available = info.get('MemAvailable')
+    if available is None:
+        available = info.get('MemFree', 0) + info.get('Buffers', 0) + info.get('Cached', 0)
+    return (total - available) / total * 100 if total else 0.0
+
+
+def _windows_counters():
+    """Build ctypes readers for GetSystemTimes and GlobalMemoryStatusEx."""
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+
+    class MEMORYSTATUSEX(ctypes.Structure):
+        _fields_ = [
+            ('dwLength', wintypes.DWORD),
+            ('dwMemoryLoad', wintypes.DWORD),
+            ('ullTotalPhys', ctypes.c_ulonglong),
+            ('ullAvailPhys', ctypes.c_ulonglong),
+            ('ullTotalPageFile', ctypes.c_ulonglong),
+            ('ullAvailPageFile', ctypes.c_ulonglong),
+            ('ullTotalVirtual', ctypes.c_ulonglong),
+            ('ullAvailVirtual', ctypes.c_ulonglong),
+            ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+        ]
+
+    def read_cpu_times() -> Tuple[int, int]:
+        idle, kernel, user = (ctypes.c_ulonglong(), ctypes.c_ulonglong(), ctypes.c_ulonglong())
+        if not kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)):
+            raise ctypes.WinError(ctypes.get_last_error())
+        # Kernel time includes idle time
+        total = kernel.value + user.value
+        return total - idle.value, total
+
+    def read_memory_percent() -> float:
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if not kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            raise ctypes.WinError(ctypes.get_last_error())
+        total = status.ullTotalPhys
+        return (total - status.ullAvailPhys) / total * 100 if total else 0.0
+
+    return read_cpu_times, read_memory_percent
+
+
+class NativeHealthSampler(HealthBackend):
+    """
+    Reads OS counters in-process: /proc on Linux, GetSystemTimes and
+    GlobalMemoryStatusEx through ctypes on Windows, and free space of the
+    system drive via statvfs/GetDiskFreeSpaceEx. A background thread
+    samples every ``interval`` seconds; ``sample()`` returns the average
+    CPU and memory load over the last ``window`` seconds.
+    """
+    name = 'native'
+    cost = 1
+
+    def __init__(self, interval: float = 0.5, window: float = 5.0, disk_path: str = None):
+        """
+        :param interval: Seconds between counter reads
+        :param window: Seconds of samples averaged by ``sample()``
+        :param disk_path: Path whose file system is checked for free space
+                          (defaults to the system drive)
+        """
+        if sys.platform == 'win32':
+            self._read_cpu_times, self._read_memory_percent = _windows_counters()
+            default_disk = os.environ.get('SystemDrive', 'C:') + '\\'
+        else:
+            self._read_cpu_times = _read_linux_cpu_times
+            self._read_memory_percent = _read_linux_memory_percent
+            default_disk = '/'
+
+        self.interval = interval
+        self.window = window
+        self.disk_path = disk_path or default_disk
+
+        self._samples = deque()     # (monotonic time, cpu percent, memory percent)
+        self._lock = threading.Lock()
+        self._first_sample = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._previous = None
+
+    @classmethod
+    def available(cls) -> bool:
+        if sys.platform == 'win32':
+            return True
+        return sys.platform.startswith('linux') and os.path.exists('/proc/stat')
+
+    def start(self):
+        """Start background sampling (done automatically by ``sample()``)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._previous = self._read_cpu_times()
+            self._thread = threading.Thread(target=self._run, name='health-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self._tick()
+            except (OSError, ValueError):
+                continue
+
+    def _tick(self):
+        """Read counters once and add a sample to the window."""
+        busy, total = self._read_cpu_times()
+        previous_busy, previous_total = self._previous
+        self._previous = (busy, total)
+        elapsed = total - previous_total
+        cpu = (busy - previous_busy) / elapsed * 100 if elapsed > 0 else 0.0
+        memory = self._read_memory_percent()
+
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, max(0.0, min(100.0, cpu)), memory))
+            while self._samples and self._samples[0][0] < now - self.window:
+                self._samples.popleft()
+        self._first_sample.set()
+
+    def sample(self) -> HealthRecord:
+        self.start()
+        # The first call waits for one interval so CPU load has a baseline
+        if not self._first_sample.wait(self.interval * 4 + 1):
+            raise TimeoutError("Native health sampler produced no samples")
+
+        with self._lock:
+            samples = list(self._samples)
+        cpu = sum(sample[1] for sample in samples) / len(samples)
+        memory = sum(sample[2] for sample in samples) / len(samples)
+
+        usage = shutil.disk_usage(self.disk_path)
+        disk = disk_health_label(usage.free / usage.total * 100) if usage.total else 'UNKNOWN'
+        return HealthRecord(round(cpu, 2), round(memory, 2), disk)
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# Backends that need no arguments, considered by select_health_backends
+NATIVE_BACKENDS = (NativeHealthSampler,)
+
+
+def select_health_backends(script_backend: HealthBackend, preference: str = 'auto',
+                           native_backends: Iterable[type] = NATIVE_BACKENDS) -> List[HealthBackend]:
+    """
+    Order the usable health backends from cheapest to most expensive.
+    The script backend is always last so it can fill in when a cheaper one fails.
+
+    :param script_backend: Script-based backend used as the fallback
+    :param preference: 'auto' (cheapest available), 'native' or 'script'
+    :param native_backends: In-process backend classes to consider
+    :return: Backends to try, in order
+    """
+    if preference == 'script':
+        return [script_backend]
+
+    backends = [backend() for backend in sorted(native_backends, key=lambda cls: cls.cost)
+                if backend.available()]
+    if preference == 'native' and not backends:
+        raise ValueError("No native health backend is available on this platform")
+    return backends + [script_backend]
@@ -0,0 +1,300 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from health_analysis import DISK_SCORES, METRICS
+
+# Samples kept per device: a day at one sample per second, with headroom
+DEFAULT_CAPACITY = 128 * 1024
+
+
+def decimate(times: np.ndarray, values: np.ndarray, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce a series to at most two points per bucket, the minimum and the
+    maximum, in the order they occur. Drawn as a line, the result covers
+    the same vertical extent per bucket as the full series, so spikes stay
+    visible however many samples fall into one pixel column.
+
+    :param times: Sorted sample times
+    :param values: Sample values aligned with times (NaN values are skipped)
+    :param buckets: Number of equal-width time buckets, e.g. the chart width in pixels
+    :return: (times, values) of the decimated series
+    """
+    valid = ~np.isnan(values)
+    times, values = times[valid], values[valid]
+    if len(times) <= 2 * buckets or buckets < 1:
+        return times, values
+
+    # All samples at one instant fall into a single bucket
+    span = times[-1] - times[0]
+    scale = buckets / span if span > 0 else 0.0
+    index = np.minimum(((times - times[0]) * scale).astype(np.int64), buckets - 1)
+    starts = np.flatnonzero(np.concatenate(([True], index[1:] != index[:-1])))
+
+    bucket_of = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(values))))
+
+    def first_position(extreme: np.ndarray) -> np.ndarray:
+        # First sample in each bucket equal to that bucket's extreme
+        positions = np.flatnonzero(values == extreme[bucket_of])
+        buckets_hit = bucket_of[positions]
+        return positions[np.concatenate(([True], buckets_hit[1:] != buckets_hit[:-1]))]
+
+    picks = np.union1d(first_position(np.minimum.reduceat(values, starts)),
+                       first_position(np.maximum.reduceat(values, starts)))
+    return times[picks], values[picks]
+
+
+class HealthRingBuffer:
+    """
+    Fixed-capacity ring buffer of one device's health samples, stored as
+    preallocated NumPy arrays (one column per metric). Appending overwrites
+    the oldest sample once full, so memory stays constant however long the
+    application runs.
+    """
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        :param capacity: Samples kept
+        """
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._values = np.full((len(METRICS), capacity), np.nan, dtype=np.float64)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, health: Dict[str, Any], timestamp: Optional[float] = None):
+        """
+        Add one sample, overwriting the oldest when full.
+
+        :param health: Health dictionary as returned by the health monitor
+        :param timestamp: Unix time of the sample (defaults to now)
+        """
+        row = (health.get('cpu_usage'), health.get('memory_usage'),
+               DISK_SCORES.get(str(health.get('disk_health', '')).upper()))
+        with self._lock:
+            slot = self._next
+            self._times[slot] = time.time() if timestamp is None else timestamp
+            for metric, value in enumerate(row):
+                self._values[metric, slot] = np.nan if value is None else value
+            self._next = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, times: np.ndarray, values: np.ndarray):
+        """
+        Add many samples at once, e.g. history loaded from the database.
+        Samples older than the newest held one are merged in by time, and
+        a sample in the same second as a held one is treated as a duplicate
+        (stored timestamps are whole seconds, live ones are not), so history
+        loaded while live samples arrive keeps the buffer in order.
+
+        :param times: Sorted Unix times
+        :param values: Array of shape (len(METRICS), len(times))
+        """
+        times, values = times[-self.capacity:], values[:, -self.capacity:]
+        with self._lock:
+            newest = self._times[(self._next - 1) % self.capacity]
+            if self._size and len(times) and times[0] <= newest:
+                self._merge(times, values)
+                return
+            slots = (self._next + np.arange(len(times))) % self.capacity
+            self._times[slots] = times
+            self._values[:, slots] = values
+            self._next = (self._next + len(times)) % self.capacity
+            self._size = min(self._size + len(times), self.capacity)
+
+    def _merge(self, times: np.ndarray, values: np.ndarray):
+        """Merge samples into the held ones by time, keeping the newest (caller holds the lock)."""
+        start = (self._next - self._size) % self.capacity
+        held = (start + np.arange(self._size)) % self.capacity
+        held_seconds = np.floor(self._times[held])
+        duplicate = np.isin(np.floor(times), held_seconds)
+        times, values = times[~duplicate], values[:, ~duplicate]
+
+        merged_times = np.concatenate((self._times[held], times))
+        merged_values = np.concatenate((self._values[:, held], values), axis=1)
+        order = np.argsort(merged_times, kind='stable')[-self.capacity:]
+        size = len(order)
+        self._times[:size] = merged_times[order]
+        self._values[:, :size] = merged_values[:, order]
+        self._next = size % self.capacity
+        self._size = size
+
+    def snapshot(self, since: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Samples in time order.
+
+        :param since: Only samples at or after this Unix time
+        :return: (times, values) copies; values has one row per metric in METRICS
+        """
+        with self._lock:
+            start = (self._next - self._size) % self.capacity
+            if start + self._size <= self.capacity:
+                segments = [(start, start + self._size)]
+            else:
+                segments = [(start, self.capacity), (0, self._next)]
+            if since is not None:
+                # Each segment is sorted, so the window is found without copying the rest
+                segments = [(lo + int(np.searchsorted(self._times[lo:hi], since, side='left')), hi)
+                            for lo, hi in segments]
+            times = np.concatenate([self._times[lo:hi] for lo, hi in segments])
+            values = np.concatenate([self._values[:, lo:hi] for lo, hi in segments], axis=1)
+        return times, values
+
+    def window_stats(self, seconds: float, now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Statistics per metric over the most recent ``seconds``.
+
+        :param seconds: Window length
+        :param now: End of the window (defaults to now)
+        :return: Metric -> count, mean, min, max, std and last value (NaN when empty)
+        """
+        now = time.time() if now is None else now
+        _, values = self.snapshot(since=now - seconds)
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(valid, values, 0.0).sum(axis=1) / count
+            std = np.sqrt(np.where(valid, (values - mean[:, None]) ** 2, 0.0).sum(axis=1) / count)
+        low = np.where(valid, values, np.inf).min(axis=1, initial=np.inf)
+        high = np.where(valid, values, -np.inf).max(axis=1, initial=-np.inf)
+        # Index of the newest valid sample per metric
+        last = values.shape[1] - 1 - valid[:, ::-1].argmax(axis=1) if values.shape[1] else count
+
+        stats = {}
+        for metric, name in enumerate(METRICS):
+            empty = count[metric] == 0
+            stats[name] = {
+                'count': int(count[metric]),
+                'mean': float(mean[metric]),
+                'min': float('nan') if empty else float(low[metric]),
+                'max': float('nan') if empty else float(high[metric]),
+                'std': float(std[metric]),
+                'last': float('nan') if empty else float(values[metric, last[metric]]),
+            }
+        return stats
+
+    def decimated(self, metric: str, buckets: int,
+                  since: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        One metric reduced for drawing with ``decimate``.
+
+        :param metric: Metric name from METRICS
+        :param buckets: Number of time buckets (chart width in pixels)
+        :param since: Only samples at or after this Unix time
+        :return: (times, values) of at most ``2 * buckets`` points
+        """
+        times, values = self.snapshot(since)
+        return decimate(times, values[METRICS.index(metric)], buckets)
+
+
+class HealthHistory:
+    """
+    In-memory health history of each device, one ring buffer per device, so
+    live views never query SQLite.
+    """
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        :param capacity: Samples kept per device
+        """
+        self.capacity = capacity
+        self._buffers: Dict[str, HealthRingBuffer] = {}
+        self._lock = threading.Lock()
+
+    def buffer(self, device_id: Optional[str] = None) -> HealthRingBuffer:
+        """
+        Ring buffer of a device, created on first use.
+
+        :param device_id: Device identifier (defaults to this machine)
+        :return: The device's buffer
+        """
+        if device_id is None:
+            from database import LOCAL_DEVICE_ID
+            device_id = LOCAL_DEVICE_ID
+        with self._lock:
+            buffer = self._buffers.get(device_id)
+            if buffer is None:
+                buffer = self._buffers[device_id] = HealthRingBuffer(self.capacity)
+            return buffer
+
+    def append(self, health: Dict[str, Any], device_id: Optional[str] = None,
+               timestamp: Optional[float] = None):
+        """
+        Add a sample to a device's buffer.
+
+        :param health: Health dictionary as returned by the health monitor
+        :param device_id: Device identifier (defaults to this machine)
+        :param timestamp: Unix time of the sample (defaults to now)
+        """
+        if health.get('status') == 'error':
+            return
+        self.buffer(device_id).append(health, timestamp)
+
+    def devices(self) -> List[str]:
+        """Devices with a buffer."""
+        with self._lock:
+            return sorted(self._buffers)
+
+    def load(self, db, device_id: Optional[str] = None, seconds: float = 24 * 3600) -> int:
+        """
+        Fill a device's buffer from stored samples, e.g. at startup.
+        Samples already held (appended live while loading) are not doubled,
+        and failed collections are skipped as in ``append``.
+
+        :param db: DatabaseManager to read from
+        :param device_id: Device identifier (defaults to this machine)
+        :param seconds: How far back to load
+        :return: Number of samples loaded
+        """
+        if device_id is None:
+            from database import LOCAL_DEVICE_ID
+            device_id = LOCAL_DEVICE_ID
+        db.flush()
+        try:
+            with db.read_cursor() as cursor:
+                cursor.execute('''
+                    SELECT CAST(strftime('%s', timestamp) AS INTEGER), cpu_usage, memory_usage, disk_health
+                    FROM device_health
+                    WHERE device_id = ? AND timestamp >= datetime('now', ?)
+                      AND status IS NOT 'error'
+                    ORDER BY timestamp DESC
+                    LIMIT ?
+                ''', (device_id, f'-{int(seconds)} seconds', self.capacity))
+                rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error when loading health history: {e}")
+            return 0
+        if not rows:
+            return 0
+
+        rows.reverse()
+        times = np.array([row[0] for row in rows], dtype=np.float64)
+        values = np.array([[np.nan if row[1] is None else row[1] for row in rows],
+                           [np.nan if row[2] is None else row[2] for row in rows],
+                           [DISK_SCORES.get(str(row[3] or '').upper(), np.nan) for row in rows]],
+                          dtype=np.float64)
+        self.buffer(device_id).extend(times, values)
+        return len(rows)
+
+
+# Shared health history, created on first use
+_health_history = None
+_health_history_lock = threading.Lock()
+
+
+def get_health_history() -> HealthHistory:
+    """
+    Return the process-wide health history, creating it on first use.
+
+    :return: Shared HealthHistory instance
+    """
+    global _health_history
+    with _health_history_lock:
+        if _health_history is None:
+            _health_history = HealthHistory()
+        return _health_history
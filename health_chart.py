@@ -0,0 +1,111 @@
+import time
+from typing import Sequence
+
+from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QColor, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+from health_buffer import HealthRingBuffer
+
+# Line colour per metric
+SERIES_COLORS = {
+    'cpu': QColor(33, 150, 243),
+    'memory': QColor(76, 175, 80),
+}
+
+SERIES_LABELS = {
+    'cpu': 'CPU %',
+    'memory': 'Memory %',
+}
+
+
+class HealthChart(QWidget):
+    """
+    Live line chart of percentage metrics from a ``HealthRingBuffer``.
+    Each repaint reduces the visible window to a min/max pair per pixel
+    column, so drawing cost depends on the widget width, not on how many
+    samples the window holds.
+    """
+    def __init__(self, buffer: HealthRingBuffer, metrics: Sequence[str] = ('cpu', 'memory'),
+                 window: float = 3600.0, parent=None):
+        """
+        :param buffer: Ring buffer to draw from
+        :param metrics: Metrics drawn, each on a 0-100 scale
+        :param window: Seconds of history shown
+        """
+        super().__init__(parent)
+        self.buffer = buffer
+        self.metrics = tuple(metrics)
+        self.window = window
+        self.setMinimumHeight(160)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def set_window(self, seconds: float):
+        """
+        Change how much history is shown.
+
+        :param seconds: Window length
+        """
+        self.window = seconds
+        self.update()
+
+    def set_buffer(self, buffer: HealthRingBuffer):
+        """
+        Draw another device's buffer.
+
+        :param buffer: Ring buffer to draw from
+        """
+        self.buffer = buffer
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), self.palette().base())
+
+        metrics = painter.fontMetrics()
+        plot = QRectF(metrics.horizontalAdvance('100%') + 8, metrics.height(),
+                      max(1, self.width() - metrics.horizontalAdvance('100%') - 16),
+                      max(1, self.height() - 2 * metrics.height() - 8))
+
+        # Grid and scale
+        painter.setPen(QPen(self.palette().mid().color(), 1, Qt.DotLine))
+        for percent in (0, 25, 50, 75, 100):
+            y = plot.bottom() - plot.height() * percent / 100
+            painter.drawLine(QPointF(plot.left(), y), QPointF(plot.right(), y))
+            painter.drawText(QRectF(0, y - metrics.height() / 2, plot.left() - 4, metrics.height()),
+                             Qt.AlignRight | Qt.AlignVCenter, f'{percent}%')
+
+        end = time.time()
+        start = end - self.window
+        x_scale = plot.width() / self.window
+        y_scale = plot.height() / 100.0
+        legend_x = plot.left()
+
+        for metric in self.metrics:
+            color = SERIES_COLORS.get(metric, self.palette().text().color())
+            times, values = self.buffer.decimated(metric, int(plot.width()), since=start)
+            if len(times):
+                xs = plot.left() + (times - start) * x_scale
+                ys = plot.bottom() - values.clip(0, 100) * y_scale
+                painter.setPen(QPen(color, 1.5))
+                painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs.tolist(), ys.tolist())]))
+
+            label = SERIES_LABELS.get(metric, metric)
+            painter.setPen(color)
+            painter.drawText(QPointF(legend_x, plot.bottom() + metrics.height() + 4), label)
+            legend_x += metrics.horizontalAdvance(label) + 16
+
+        painter.setPen(self.palette().text().color())
+        painter.drawText(QRectF(plot.left(), plot.bottom() + 4, plot.width(), metrics.height() + 4),
+                         Qt.AlignRight | Qt.AlignBottom, f'last {_duration(self.window)}')
+        painter.end()
+
+
+def _duration(seconds: float) -> str:
+    """Short label for a window length."""
+    if seconds >= 3600:
+        return f'{seconds / 3600:g} h'
+    if seconds >= 60:
+        return f'{seconds / 60:g} min'
+    return f'{seconds:g} s'
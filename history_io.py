@@ -0,0 +1,451 @@
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import zipfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from database import LOG_TABLE_COLUMNS, intern_updates
+
+# Supported file formats; '.gz' may be appended to csv and ndjson paths
+FORMATS = ('csv', 'ndjson', 'npz')
+
+_EXTENSIONS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.npz': 'npz',
+}
+
+# Column types used to restore values read back from text formats
+_INTEGER_COLUMNS = {'id'}
+_REAL_COLUMNS = {'cpu_usage', 'memory_usage'}
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def detect_format(path: str) -> Tuple[str, bool]:
+    """
+    Work out the file format from a path.
+
+    :param path: File path, e.g. ``health.csv.gz`` or ``logs.npz``
+    :return: Tuple of (format, gzip compressed)
+    """
+    base, extension = os.path.splitext(path.lower())
+    compressed = extension == '.gz'
+    if compressed:
+        extension = os.path.splitext(base)[1]
+    if extension not in _EXTENSIONS:
+        raise ValueError(f"Cannot tell the export format of {path}; use .csv, .ndjson or .npz "
+                         "(optionally with .gz for csv and ndjson)")
+    fmt = _EXTENSIONS[extension]
+    if fmt == 'npz' and compressed:
+        raise ValueError(".npz files are already compressed")
+    return fmt, compressed
+
+
+def detect_table(columns: List[str]) -> str:
+    """
+    Identify the history table a set of exported columns belongs to.
+
+    :param columns: Column names from a file header
+    :return: 'device_health' or 'update_logs'
+    """
+    for table, table_columns in LOG_TABLE_COLUMNS.items():
+        if set(columns) == set(table_columns) or set(columns) == set(table_columns) - {'id'}:
+            return table
+    raise ValueError(f"Columns do not match a history table: {', '.join(columns)}")
+
+
+def iter_chunks(db, table: str, filters: Optional[Dict[str, Any]] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Read a history table in id order, one chunk at a time.
+    Each chunk is a separate keyset query, so the database lock is released
+    between chunks and memory use does not depend on the table size.
+
+    :param db: DatabaseManager to read from
+    :param table: 'device_health' or 'update_logs'
+    :param filters: Column equality filters plus optional 'since'/'until'
+    :param chunk_size: Rows per chunk
+    :return: Iterator of row lists in ``LOG_TABLE_COLUMNS[table]`` order
+    """
+    after = None
+    while True:
+        rows = db.fetch_log_page(table, 'id', descending=False, after=after,
+                                 filters=filters, limit=chunk_size)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        after = db.log_row_key(table, rows[-1], 'id')
+
+
+def _open_text(path: str, mode: str, compressed: bool):
+    if compressed:
+        # Level 6 compresses nearly as well as 9 at a fraction of the cost
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='',
+                         **({'compresslevel': 6} if mode == 'w' else {}))
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def export_table(db, table: str, path: str, filters: Optional[Dict[str, Any]] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Stream a history table to a file. The format follows the extension:
+    ``.csv``, ``.ndjson`` (either with ``.gz``) or ``.npz`` (one compressed
+    NumPy array per column and chunk).
+
+    :param db: DatabaseManager to read from
+    :param table: 'device_health' or 'update_logs'
+    :param path: Output file
+    :param filters: Column equality filters plus optional 'since'/'until'
+    :param chunk_size: Rows read and written per step
+    :return: Result with status, path and number of rows written
+    """
+    if table not in LOG_TABLE_COLUMNS:
+        return {'status': 'error', 'message': f"Unknown history table: {table}"}
+    try:
+        fmt, compressed = detect_format(path)
+        chunks = iter_chunks(db, table, filters, chunk_size)
+        columns = LOG_TABLE_COLUMNS[table]
+        if fmt == 'npz':
+            rows = _write_npz(path, columns, chunks)
+        else:
+            with _open_text(path, 'w', compressed) as f:
+                rows = (_write_csv if fmt == 'csv' else _write_ndjson)(f, columns, chunks)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        return {'status': 'error', 'message': str(e)}
+
+    return {'status': 'success', 'path': path, 'rows': rows}
+
+
+def _write_csv(f, columns: Tuple[str, ...], chunks: Iterator[List[tuple]]) -> int:
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    rows = 0
+    for chunk in chunks:
+        writer.writerows(chunk)
+        rows += len(chunk)
+    return rows
+
+
+def _write_ndjson(f, columns: Tuple[str, ...], chunks: Iterator[List[tuple]]) -> int:
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    rows = 0
+    for chunk in chunks:
+        f.write(''.join(encode(dict(zip(columns, row))) + '\n' for row in chunk))
+        rows += len(chunk)
+    return rows
+
+
+def _column_array(np, column: str, values: list):
+    """Convert one column of a chunk to a typed array (NULL becomes NaN, NaT or '')."""
+    if column in _INTEGER_COLUMNS:
+        return np.array(values, dtype=np.int64)
+    if column in _REAL_COLUMNS:
+        return np.array(values, dtype=np.float64)
+    if column == 'timestamp':
+        return np.array(values, dtype='datetime64[s]')
+    return np.array(['' if value is None else value for value in values], dtype=np.str_)
+
+
+def _write_npz(path: str, columns: Tuple[str, ...], chunks: Iterator[List[tuple]]) -> int:
+    """
+    Write chunks as ``<column>/<chunk number>.npy`` members of a zip file,
+    so only one chunk is ever held in memory. ``load_npz`` joins them back up.
+    """
+    import numpy as np
+
+    rows = 0
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for number, chunk in enumerate(chunks):
+            for index, column in enumerate(columns):
+                array = _column_array(np, column, [row[index] for row in chunk])
+                with archive.open(f'{column}/{number:06d}.npy', 'w', force_zip64=True) as member:
+                    np.lib.format.write_array(member, array, allow_pickle=False)
+            rows += len(chunk)
+    return rows
+
+
+def _npz_chunks(path: str) -> Tuple[List[str], Iterator[Dict[str, Any]]]:
+    """Return the columns of an export and an iterator of per-chunk column arrays."""
+    import numpy as np
+
+    archive = zipfile.ZipFile(path)
+    members: Dict[str, List[str]] = {}
+    for name in archive.namelist():
+        column, _, member = name.partition('/')
+        members.setdefault(column, []).append(member)
+    columns = list(members)
+    counts = {len(names) for names in members.values()}
+    if len(counts) > 1:
+        archive.close()
+        raise ValueError(f"{path} has a different number of chunks per column")
+
+    def chunks():
+        with archive:
+            for member in members[columns[0]] if columns else []:
+                yield {column: np.lib.format.read_array(archive.open(f'{column}/{member}'),
+                                                        allow_pickle=False)
+                       for column in columns}
+
+    return columns, chunks()
+
+
+def load_npz(path: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Load an ``.npz`` export as one array per column for analysis.
+
+    :param path: File written by ``export_table``
+    :param columns: Columns to load, or None for all
+    :return: Column name -> array
+    """
+    import numpy as np
+
+    names, chunks = _npz_chunks(path)
+    wanted = [name for name in names if columns is None or name in columns]
+    parts: Dict[str, list] = {name: [] for name in wanted}
+    for chunk in chunks:
+        for name in wanted:
+            parts[name].append(chunk[name])
+    return {name: np.concatenate(arrays) if arrays else np.array([]) for name, arrays in parts.items()}
+
+
+def _iter_file_rows(path: str, chunk_size: int) -> Tuple[List[str], Iterator[List[tuple]]]:
+    """Open an export and return its columns and an iterator of row chunks (NULLs as None)."""
+    fmt, compressed = detect_format(path)
+
+    if fmt == 'npz':
+        columns, array_chunks = _npz_chunks(path)
+
+        def npz_rows():
+            for arrays in array_chunks:
+                values = []
+                for column in columns:
+                    array = arrays[column]
+                    if column == 'timestamp':
+                        text = array.astype(str)
+                        values.append([None if value == 'NaT' else value.replace('T', ' ') for value in text])
+                    elif column in _REAL_COLUMNS:
+                        values.append([None if value != value else value for value in array.tolist()])
+                    elif column in _INTEGER_COLUMNS:
+                        values.append(array.tolist())
+                    else:
+                        values.append([value or None for value in array.tolist()])
+                yield list(zip(*values))
+
+        return columns, npz_rows()
+
+    f = _open_text(path, 'r', compressed)
+    if fmt == 'csv':
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        converters = [_text_converter(column) for column in columns]
+        records = (tuple(convert(value) for convert, value in zip(converters, record)) for record in reader)
+    else:
+        first = f.readline()
+        columns = list(json.loads(first)) if first.strip() else []
+        lines = (line for part in ([first], f) for line in part if line.strip())
+        records = (tuple(record.get(column) for column in columns) for record in map(json.loads, lines))
+
+    def text_rows():
+        with f:
+            chunk = []
+            for record in records:
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+    return columns, text_rows()
+
+
+def _text_converter(column: str):
+    """CSV cell -> SQLite value; empty cells are NULL."""
+    if column in _INTEGER_COLUMNS:
+        return lambda value: int(value) if value else None
+    if column in _REAL_COLUMNS:
+        return lambda value: float(value) if value else None
+    return lambda value: value if value else None
+
+
+# Indexes and triggers a bulk load has dropped, kept until they are restored
+# so a load that is killed part way is finished when the database is next opened
+BULK_LOAD_TABLE = 'bulk_load_saved'
+
+
+@contextmanager
+def bulk_load(db, table: str):
+    """
+    Prepare a table for a bulk insert: drop its secondary indexes and
+    triggers, skip fsyncs, and restore everything afterwards. Indexes are
+    rebuilt in one pass and the full-text and compliance aggregates derived
+    from the table are recomputed.
+
+    The dropped definitions are saved in the database in the same
+    transaction as the drops, so if the process dies during the load they
+    are restored by ``restore_bulk_load`` when the database is next opened.
+    The writer lock is only held while dropping and restoring; the caller
+    takes it for each transaction of the load.
+
+    :param db: DatabaseManager to load into
+    :param table: Table being loaded
+    """
+    db.flush()
+    with db.lock:
+        cursor = db.conn.cursor()
+        cursor.execute('PRAGMA synchronous')
+        synchronous = cursor.fetchone()[0]
+
+        with db.conn:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {BULK_LOAD_TABLE} (
+                    name TEXT PRIMARY KEY,
+                    tbl_name TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    sql TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                SELECT name, tbl_name, type, sql FROM sqlite_master
+                WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+            ''', (table,))
+            saved = cursor.fetchall()
+            cursor.executemany(f'INSERT OR REPLACE INTO {BULK_LOAD_TABLE} VALUES (?, ?, ?, ?)', saved)
+            for name, _, kind, _ in saved:
+                cursor.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+        cursor.execute('PRAGMA synchronous=OFF')
+
+    try:
+        yield
+    finally:
+        with db.lock:
+            cursor = db.conn.cursor()
+            cursor.execute(f'PRAGMA synchronous={int(synchronous)}')
+            with db.conn:
+                cursor.execute('BEGIN IMMEDIATE')
+                restore_bulk_load(cursor, table)
+
+
+def restore_bulk_load(cursor: sqlite3.Cursor, table: Optional[str] = None):
+    """
+    Recreate indexes and triggers saved by ``bulk_load`` and recompute the
+    data they maintain. Objects that already exist (e.g. recreated by
+    DatabaseManager at startup) are left alone.
+
+    :param cursor: Cursor inside the caller's write transaction
+    :param table: Table whose load finished; None restores every saved table
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (BULK_LOAD_TABLE,))
+    if cursor.fetchone() is None:
+        saved = []
+    else:
+        # Indexes before triggers, as in the original schema
+        cursor.execute(f'''
+            SELECT name, tbl_name, sql FROM {BULK_LOAD_TABLE}
+            WHERE ? IS NULL OR tbl_name = ?
+            ORDER BY type != 'index'
+        ''', (table, table))
+        saved = cursor.fetchall()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")
+    existing = {row[0] for row in cursor.fetchall()}
+    for name, _, sql in saved:
+        if name not in existing:
+            cursor.execute(sql)
+
+    tables = {tbl_name for _, tbl_name, _ in saved}
+    if table is not None:
+        tables.add(table)
+    for name in sorted(tables):
+        _rebuild_derived(cursor, name)
+    if saved:
+        cursor.execute(f'DELETE FROM {BULK_LOAD_TABLE} WHERE ? IS NULL OR tbl_name = ?', (table, table))
+
+
+def _rebuild_derived(cursor: sqlite3.Cursor, table: str):
+    """Recompute data derived from a table by triggers that were off during a bulk load."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row[0] for row in cursor.fetchall()}
+
+    if table == 'update_logs' and 'update_logs_fts' in tables:
+        cursor.execute("INSERT INTO update_logs_fts (update_logs_fts) VALUES ('rebuild')")
+    if 'compliance_fleet' in tables:
+        from compliance import rebuild_aggregates
+        rebuild_aggregates(cursor)
+
+
+def import_table(db, path: str, table: Optional[str] = None, keep_ids: Optional[bool] = None,
+                 chunk_size: int = 50000, commit_rows: int = 100000) -> Dict[str, Any]:
+    """
+    Bulk-load an export into a history table.
+
+    :param db: DatabaseManager to load into (ideally a fresh database)
+    :param path: File written by ``export_table``
+    :param table: Target table (detected from the file's columns if None)
+    :param keep_ids: Keep the exported row ids; defaults to True when the
+                     table is empty, otherwise rows get new ids
+    :param chunk_size: Rows inserted per statement batch
+    :param commit_rows: Rows per transaction
+    :return: Result with status, table and number of rows loaded
+    """
+    try:
+        columns, chunks = _iter_file_rows(path, chunk_size)
+        table = table or detect_table(columns)
+        if table not in LOG_TABLE_COLUMNS:
+            raise ValueError(f"Unknown history table: {table}")
+        unknown = set(columns) - set(LOG_TABLE_COLUMNS[table])
+        if unknown:
+            raise ValueError(f"Columns not in {table}: {', '.join(sorted(unknown))}")
+
+        with db.lock:
+            cursor = db.conn.cursor()
+            if keep_ids is None:
+                cursor.execute(f'SELECT NOT EXISTS (SELECT 1 FROM {table})')
+                keep_ids = bool(cursor.fetchone()[0])
+
+        keep = [index for index, column in enumerate(columns) if keep_ids or column != 'id']
+        names = [columns[index] for index in keep]
+        # Update titles are stored as update_catalog references
+        title = names.index('update_name') if table == 'update_logs' and 'update_name' in names else None
+        if title is not None:
+            names[title] = 'update_id'
+        sql = f'INSERT INTO {table} ({", ".join(names)}) VALUES ({", ".join("?" * len(names))})'
+
+        loaded = 0
+        with bulk_load(db, table):
+            chunk = next(chunks, None)
+            while chunk is not None:
+                # The writer lock is taken per transaction, so buffered
+                # flushes and other writers get in between
+                with db.lock:
+                    cursor = db.conn.cursor()
+                    cursor.execute('BEGIN')
+                    try:
+                        pending = 0
+                        while chunk is not None and pending < commit_rows:
+                            if len(keep) < len(columns):
+                                chunk = [tuple(row[index] for index in keep) for row in chunk]
+                            if title is not None:
+                                ids = intern_updates(cursor, (row[title] for row in chunk))
+                                chunk = [row[:title] + (ids.get(row[title]),) + row[title + 1:]
+                                         for row in chunk]
+                            cursor.executemany(sql, chunk)
+                            loaded += len(chunk)
+                            pending += len(chunk)
+                            chunk = next(chunks, None)
+                        db.conn.commit()
+                    except BaseException:
+                        db.conn.rollback()
+                        raise
+    except (OSError, ValueError, KeyError, json.JSONDecodeError, sqlite3.Error) as e:
+        return {'status': 'error', 'message': str(e)}
+
+    return {'status': 'success', 'table': table, 'rows': loaded}
@@ -0,0 +1,620 @@
+import gzip
+import hmac
+import http.client
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from database import insert_update_logs
+from metrics import registry as metrics
+
+# Report format version accepted by the server
+REPORT_VERSION = 1
+
+REPORTS_PATH = '/v1/reports'
+DEFAULT_INGEST_PORT = 8765
+
+# Request limits: compressed body, decompressed body, rows per report
+MAX_BODY_BYTES = 4 * 1024 * 1024
+MAX_PAYLOAD_BYTES = 32 * 1024 * 1024
+MAX_REPORT_ROWS = 20000
+
+# Longest accepted text field (details can carry script output)
+MAX_TEXT_CHARS = 8192
+
+# Days batch ids are remembered for deduplicating retried reports
+BATCH_ID_RETENTION_DAYS = 7
+
+_TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$')
+
+
+class ReportError(ValueError):
+    """Raised when a pushed report is malformed; the agent must not retry it."""
+    def __init__(self, message: str, status: int = 400):
+        """
+        :param message: What is wrong with the report
+        :param status: HTTP status to answer with
+        """
+        super().__init__(message)
+        self.status = status
+
+
+def _text(record: Dict[str, Any], name: str, required: bool = False,
+          max_chars: int = 255) -> Optional[str]:
+    value = record.get(name)
+    if value is None:
+        if required:
+            raise ReportError(f"missing {name}")
+        return None
+    if not isinstance(value, str) or len(value) > max_chars:
+        raise ReportError(f"{name} must be text of at most {max_chars} characters")
+    return value
+
+
+def _number(record: Dict[str, Any], name: str) -> Optional[float]:
+    value = record.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 100:
+        raise ReportError(f"{name} must be a percentage")
+    return float(value)
+
+
+def _timestamp(record: Dict[str, Any]) -> str:
+    value = record.get('timestamp')
+    try:
+        # The pattern insists on zero padding; strptime rejects impossible dates
+        if not isinstance(value, str) or not _TIMESTAMP.match(value):
+            raise ValueError(value)
+        datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise ReportError("timestamp must be 'YYYY-MM-DD HH:MM:SS' (UTC)") from None
+    return value
+
+
+def parse_report(payload: Any) -> Tuple[str, str, List[tuple], List[tuple]]:
+    """
+    Validate a decoded report.
+
+    :param payload: Decoded JSON body
+    :return: Tuple of (batch id, device id, health rows, update rows); rows
+             are in the column order of the device_health/update_logs inserts
+    :raises ReportError: If the report is malformed
+    """
+    if not isinstance(payload, dict):
+        raise ReportError("report must be a JSON object")
+    if payload.get('v') != REPORT_VERSION:
+        raise ReportError(f"unsupported report version {payload.get('v')!r}")
+    batch_id = _text(payload, 'batch_id', required=True, max_chars=64)
+    device_id = _text(payload, 'device_id', required=True)
+    if not device_id:
+        raise ReportError("device_id must not be empty")
+
+    health, updates = payload.get('health', []), payload.get('updates', [])
+    if not isinstance(health, list) or not isinstance(updates, list):
+        raise ReportError("health and updates must be lists")
+    if len(health) + len(updates) > MAX_REPORT_ROWS:
+        raise ReportError(f"at most {MAX_REPORT_ROWS} rows per report")
+
+    health_rows, update_rows = [], []
+    for record in health:
+        if not isinstance(record, dict):
+            raise ReportError("health samples must be objects")
+        health_rows.append((_timestamp(record), _number(record, 'cpu_usage'),
+                            _number(record, 'memory_usage'), _text(record, 'disk_health'),
+                            _text(record, 'status'), device_id))
+    for record in updates:
+        if not isinstance(record, dict):
+            raise ReportError("update events must be objects")
+        update_rows.append((_timestamp(record), _text(record, 'update_name', required=True, max_chars=1024),
+                            _text(record, 'status', required=True),
+                            _text(record, 'details', max_chars=MAX_TEXT_CHARS), device_id))
+    return batch_id, device_id, health_rows, update_rows
+
+
+def _decompress(body: bytes, limit: int) -> bytes:
+    """Gunzip a request body, refusing output beyond ``limit`` bytes."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, limit + 1)
+    except zlib.error as e:
+        raise ReportError(f"invalid gzip body: {e}")
+    if len(data) > limit or decompressor.unconsumed_tail:
+        raise ReportError(f"report larger than {limit} bytes when decompressed", status=413)
+    if not decompressor.eof:
+        raise ReportError("truncated gzip body")
+    return data
+
+
+class IngestServer:
+    """
+    HTTP endpoint that accepts batched, gzip-compressed health samples and
+    update events pushed by agents. Each report is validated and written
+    in one transaction. Batch ids are recorded in the same transaction, so
+    a report retried after a lost response is acknowledged but not stored
+    twice.
+    """
+    def __init__(self, db=None, host: str = '127.0.0.1', port: int = DEFAULT_INGEST_PORT,
+                 token: Optional[str] = None):
+        """
+        :param db: DatabaseManager to write to (defaults to the shared manager)
+        :param host: Interface to bind
+        :param port: TCP port (0 picks a free port)
+        :param token: Shared secret agents must send as a bearer token, or None
+        """
+        if db is None:
+            from database import get_db_manager
+            db = get_db_manager()
+
+        self.db = db
+        self.host = host
+        self.port = port
+        self.token = token
+        self._server = None
+        self._thread = None
+
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create the table of ingested batch ids and forget old ones."""
+        with self.db.write_cursor() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS ingest_batches (
+                    batch_id TEXT PRIMARY KEY,
+                    device_id TEXT NOT NULL,
+                    rows INTEGER NOT NULL,
+                    received_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute("DELETE FROM ingest_batches WHERE received_at < datetime('now', ?)",
+                           (f'-{BATCH_ID_RETENTION_DAYS} days',))
+
+    def ingest(self, body: bytes, encoding: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Validate and store one report.
+
+        :param body: Request body
+        :param encoding: Content-Encoding header ('gzip' or None)
+        :return: Result with accepted row count and whether it was a duplicate
+        :raises ReportError: If the report is malformed
+        :raises sqlite3.Error: If it could not be stored (the agent should retry)
+        """
+        if encoding == 'gzip':
+            body = _decompress(body, MAX_PAYLOAD_BYTES)
+        elif encoding not in (None, '', 'identity'):
+            raise ReportError(f"unsupported content encoding {encoding!r}", status=415)
+        try:
+            payload = json.loads(body)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ReportError(f"invalid JSON: {e}")
+
+        batch_id, device_id, health_rows, update_rows = parse_report(payload)
+        rows = len(health_rows) + len(update_rows)
+
+        with metrics.timer('ingest', 'write_batch'), self.db.write_cursor() as cursor:
+            cursor.execute('''
+                INSERT OR IGNORE INTO ingest_batches (batch_id, device_id, rows) VALUES (?, ?, ?)
+            ''', (batch_id, device_id, rows))
+            if cursor.rowcount == 0:
+                return {'status': 'ok', 'accepted': 0, 'duplicate': True}
+            if health_rows:
+                cursor.executemany('''
+                    INSERT INTO device_health
+                    (timestamp, cpu_usage, memory_usage, disk_health, status, device_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', health_rows)
+            if update_rows:
+                insert_update_logs(cursor, update_rows)
+            cursor.execute('''
+                INSERT INTO devices (device_id, last_seen, status) VALUES (?, CURRENT_TIMESTAMP, 'success')
+                ON CONFLICT(device_id) DO UPDATE SET last_seen = excluded.last_seen, status = excluded.status
+            ''', (device_id,))
+        return {'status': 'ok', 'accepted': rows, 'duplicate': False}
+
+    def authorized(self, header: Optional[str]) -> bool:
+        """
+        Check an Authorization header against the shared token in constant time.
+
+        :param header: Authorization header value, or None if absent
+        :return: True if no token is required or the header carries it
+        """
+        if self.token is None:
+            return True
+        return hmac.compare_digest((header or '').encode(), f'Bearer {self.token}'.encode())
+
+    def start(self) -> int:
+        """
+        Start serving.
+
+        :return: Port the server is listening on
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so an agent reuses one connection for its batches
+            protocol_version = 'HTTP/1.1'
+            # Seconds an idle kept-alive connection may hold a server thread
+            timeout = 30
+
+            def _reply(self, code: int, result: Dict[str, Any]):
+                body = json.dumps(result).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path != '/health':
+                    self._reply(404, {'status': 'error', 'message': 'not found'})
+                    return
+                self._reply(200, {'status': 'ok'})
+
+            def do_POST(self):
+                if self.path != REPORTS_PATH:
+                    self._reply(404, {'status': 'error', 'message': 'not found'})
+                    return
+                if not server.authorized(self.headers.get('Authorization')):
+                    self._reply(401, {'status': 'error', 'message': 'invalid token'})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', ''))
+                except ValueError:
+                    self._reply(411, {'status': 'error', 'message': 'Content-Length required'})
+                    return
+                if length > MAX_BODY_BYTES:
+                    self.close_connection = True
+                    self._reply(413, {'status': 'error', 'message': f'body larger than {MAX_BODY_BYTES} bytes'})
+                    return
+
+                body = self.rfile.read(length)
+                try:
+                    with metrics.timer('ingest', 'report'):
+                        result = server.ingest(body, self.headers.get('Content-Encoding'))
+                except ReportError as e:
+                    metrics.record_error('ingest', 'rejected')
+                    self._reply(e.status, {'status': 'error', 'message': str(e)})
+                    return
+                except sqlite3.Error as e:
+                    print(f"Database error when ingesting report: {e}")
+                    self._reply(503, {'status': 'error', 'message': 'storage unavailable'})
+                    return
+                self._reply(200, result)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # Room for bursts of agents connecting at once
+            request_queue_size = 1024
+            daemon_threads = True
+
+        self._server = Server((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='ingest-server', daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class AgentClient:
+    """
+    Agent side of the push protocol. Samples and events are buffered and
+    sealed into compressed batches, by size or age. Sealed batches are
+    spooled (to disk when ``spool_dir`` is set, so they survive restarts)
+    and sent oldest first. While the server is unreachable, sending backs
+    off exponentially with jitter and the spool keeps filling, up to
+    ``max_spool_bytes``, after which the oldest batches are dropped.
+    Batches the server rejects as malformed are dropped; authentication
+    failures are retried, so nothing is lost while a token is fixed.
+    """
+    def __init__(self, url: str, device_id: Optional[str] = None, spool_dir: Optional[str] = None,
+                 token: Optional[str] = None, batch_size: int = 500, flush_interval: float = 10.0,
+                 timeout: float = 10.0, backoff: float = 1.0, max_backoff: float = 300.0,
+                 max_spool_bytes: int = 256 * 1024 * 1024):
+        """
+        :param url: Server base URL, e.g. ``http://127.0.0.1:8765``
+        :param device_id: Device the data belongs to (defaults to this machine)
+        :param spool_dir: Directory for unsent batches, or None to keep them in memory
+        :param token: Bearer token expected by the server
+        :param batch_size: Buffered rows that seal a batch
+        :param flush_interval: Maximum seconds a row waits before its batch is sealed
+        :param timeout: Seconds per HTTP request
+        :param backoff: Base delay after a failed send
+        :param max_backoff: Longest delay between send attempts
+        :param max_spool_bytes: Spool size beyond which the oldest batches are dropped
+        """
+        if device_id is None:
+            from database import LOCAL_DEVICE_ID
+            device_id = LOCAL_DEVICE_ID
+
+        parts = urlsplit(url)
+        self._connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                  else http.client.HTTPConnection)
+        self._netloc = parts.netloc
+        self._path = parts.path.rstrip('/') + REPORTS_PATH
+        self.device_id = device_id
+        self.spool_dir = spool_dir
+        self.token = token
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_spool_bytes = max_spool_bytes
+
+        self.sent_batches = 0
+        self.dropped_batches = 0
+        self.rejected_batches = 0
+        self.failures = 0
+
+        self._health = []
+        self._updates = []
+        self._oldest = None
+        self._buffer_lock = threading.Lock()
+        # Serializes sending and spool changes
+        self._send_lock = threading.Lock()
+        self._connection = None
+        self._retry_at = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._rng = random.Random()
+
+        # In-memory spool entries are (name, bytes); on disk they are files
+        self._memory_spool = deque()
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+
+    @staticmethod
+    def _timestamp() -> str:
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+    def add_health(self, health: Dict[str, Any], timestamp: Optional[str] = None):
+        """
+        Queue a health sample.
+
+        :param health: Health dictionary as returned by the health monitor
+        :param timestamp: UTC sample time (defaults to now)
+        """
+        self._add(self._health, {
+            'timestamp': timestamp or self._timestamp(),
+            'cpu_usage': health.get('cpu_usage'),
+            'memory_usage': health.get('memory_usage'),
+            'disk_health': health.get('disk_health'),
+            'status': health.get('status'),
+        })
+
+    def add_update(self, update_name: str, status: str, details: str = '',
+                   timestamp: Optional[str] = None):
+        """
+        Queue an update event.
+
+        :param update_name: Update title or KB id
+        :param status: Event status, e.g. 'Installed'
+        :param details: Additional details
+        :param timestamp: UTC event time (defaults to now)
+        """
+        self._add(self._updates, {
+            'timestamp': timestamp or self._timestamp(),
+            'update_name': update_name,
+            'status': status,
+            'details': details[:MAX_TEXT_CHARS] if details else details,
+        })
+
+    def _add(self, buffer: list, record: Dict[str, Any]):
+        with self._buffer_lock:
+            buffer.append(record)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._health) + len(self._updates) >= self.batch_size
+        if full:
+            self.seal()
+
+    def seal(self) -> bool:
+        """
+        Seal buffered rows into a compressed batch and spool it.
+
+        :return: True if a batch was spooled
+        """
+        with self._buffer_lock:
+            if not self._health and not self._updates:
+                return False
+            health, self._health = self._health, []
+            updates, self._updates = self._updates, []
+            self._oldest = None
+
+        batch_id = uuid.uuid4().hex
+        body = gzip.compress(json.dumps({
+            'v': REPORT_VERSION,
+            'batch_id': batch_id,
+            'device_id': self.device_id,
+            'health': health,
+            'updates': updates,
+        }, separators=(',', ':')).encode('utf-8'), compresslevel=6)
+        # Names sort in sealing order
+        name = f'{time.time_ns():020d}-{batch_id}.json.gz'
+
+        with self._send_lock:
+            if self.spool_dir:
+                temporary = os.path.join(self.spool_dir, name + '.tmp')
+                with open(temporary, 'wb') as f:
+                    f.write(body)
+                os.replace(temporary, os.path.join(self.spool_dir, name))
+            else:
+                self._memory_spool.append((name, body))
+            self._enforce_spool_limit()
+        return True
+
+    def _spooled(self) -> List[str]:
+        """Names of spooled batches, oldest first (caller holds the send lock)."""
+        if not self.spool_dir:
+            return [name for name, _ in self._memory_spool]
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith('.json.gz'))
+
+    def _read_spooled(self, name: str) -> bytes:
+        if not self.spool_dir:
+            return self._memory_spool[0][1]
+        with open(os.path.join(self.spool_dir, name), 'rb') as f:
+            return f.read()
+
+    def _remove_spooled(self, name: str):
+        if not self.spool_dir:
+            self._memory_spool.popleft()
+            return
+        try:
+            os.remove(os.path.join(self.spool_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def spool_size(self) -> Tuple[int, int]:
+        """
+        Unsent batches.
+
+        :return: Tuple of (batch count, bytes)
+        """
+        with self._send_lock:
+            if not self.spool_dir:
+                return len(self._memory_spool), sum(len(body) for _, body in self._memory_spool)
+            names = self._spooled()
+            return len(names), sum(os.path.getsize(os.path.join(self.spool_dir, name)) for name in names)
+
+    def _enforce_spool_limit(self):
+        """Drop the oldest batches while the spool is over its limit (caller holds the send lock)."""
+        names = self._spooled()
+        if not self.spool_dir:
+            sizes = [len(body) for _, body in self._memory_spool]
+        else:
+            sizes = [os.path.getsize(os.path.join(self.spool_dir, name)) for name in names]
+        total = sum(sizes)
+        for name, size in zip(names[:-1], sizes):
+            if total <= self.max_spool_bytes:
+                break
+            self._remove_spooled(name)
+            self.dropped_batches += 1
+            total -= size
+
+    def _post(self, body: bytes) -> Tuple[int, bytes]:
+        """POST one batch on the persistent connection, reconnecting once if it went stale."""
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        for attempt in (0, 1):
+            if self._connection is None:
+                self._connection = self._connection_class(self._netloc, timeout=self.timeout)
+            try:
+                self._connection.request('POST', self._path, body, headers)
+                response = self._connection.getresponse()
+                return response.status, response.read()
+            except (OSError, http.client.HTTPException):
+                self._connection.close()
+                self._connection = None
+                # A kept-alive connection the server already closed fails at once; retry on a new one
+                if attempt:
+                    raise
+
+    def send_pending(self, max_batches: Optional[int] = None) -> bool:
+        """
+        Send spooled batches, oldest first, until the spool is empty or a send fails.
+
+        :param max_batches: Stop after this many batches
+        :return: True if the spool was drained (or max_batches were sent)
+        """
+        sent = 0
+        with self._send_lock:
+            for name in self._spooled():
+                if max_batches is not None and sent >= max_batches:
+                    return True
+                try:
+                    body = self._read_spooled(name)
+                except OSError:
+                    continue
+                try:
+                    with metrics.timer('agent', 'send_batch'):
+                        status, _ = self._post(body)
+                except (OSError, http.client.HTTPException):
+                    status = None
+
+                if status == 200:
+                    self._remove_spooled(name)
+                    self.sent_batches += 1
+                    sent += 1
+                elif status is not None and 400 <= status < 500 and status not in (401, 403, 408, 429):
+                    # The server will never accept this batch; drop it rather than block the queue
+                    print(f"Ingest server rejected batch {name} with HTTP {status}")
+                    self._remove_spooled(name)
+                    self.rejected_batches += 1
+                else:
+                    metrics.record_error('agent', 'send_batch')
+                    self.failures += 1
+                    delay = min(self.max_backoff, self.backoff * 2 ** min(self.failures - 1, 30))
+                    self._retry_at = time.monotonic() + self._rng.uniform(0, delay)
+                    return False
+
+        self.failures = 0
+        with self._send_lock:
+            # Agents push every few seconds at most; don't hold a server thread in between
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        return True
+
+    def start(self):
+        """Seal and send batches from a background thread."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='agent-client', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._buffer_lock:
+                oldest = self._oldest
+            if oldest is not None and time.monotonic() - oldest >= self.flush_interval:
+                self.seal()
+            if time.monotonic() >= self._retry_at:
+                self.send_pending()
+            self._stop_event.wait(min(1.0, self.flush_interval))
+
+    def close(self, timeout: float = 5.0):
+        """
+        Stop the background thread and try to send what is left; anything
+        unsent stays in the spool for the next start.
+
+        :param timeout: Seconds to spend on the final send
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self.seal()
+        previous, self.timeout = self.timeout, min(self.timeout, timeout)
+        try:
+            self.send_pending()
+        finally:
+            self.timeout = previous
+            with self._send_lock:
+                if self._connection is not None:
+                    self._connection.close()
+                    self._connection = None
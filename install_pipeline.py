@@ -0,0 +1,386 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from protocol import extract_kb
+
+# Per-update install states, in pipeline order
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+DOWNLOADED = 'downloaded'
+INSTALLING = 'installing'
+DONE = 'done'
+FAILED = 'failed'
+
+# Run states; running and interrupted runs can be resumed
+RUN_RUNNING = 'running'
+RUN_INTERRUPTED = 'interrupted'
+RUN_COMPLETED = 'completed'
+RUN_FAILED = 'failed'
+RUN_ABANDONED = 'abandoned'
+
+# Install order by update kind. Servicing stack updates must be installed
+# before the cumulative updates that depend on them; feature updates last.
+_INSTALL_PRIORITIES = (
+    ('servicing stack', 0),
+    ('cumulative update', 2),
+    ('feature update', 3),
+)
+
+# Update log status recorded for each state change
+_LOG_STATUS = {
+    INSTALLING: 'Installing',
+    DONE: 'Installed',
+    FAILED: 'Failed',
+}
+
+
+def install_priority(title: str) -> int:
+    """
+    Rank an update for dependency-safe installation (lower installs first).
+
+    :param title: Update title
+    :return: Priority
+    """
+    lowered = title.lower()
+    for marker, priority in _INSTALL_PRIORITIES:
+        if marker in lowered:
+            return priority
+    return 1
+
+
+def order_updates(updates: Iterable[str]) -> List[str]:
+    """
+    Remove duplicates and sort updates into install order, keeping the
+    given order within each priority.
+
+    :param updates: Update titles
+    :return: Updates in install order
+    """
+    return sorted(dict.fromkeys(updates), key=install_priority)
+
+
+def _with_output_ref(message: str, result: Dict[str, Any]) -> str:
+    """Append a reference to the stored full output of an action."""
+    if result.get('output_id') is None:
+        return message
+    return f"{message}\n[full output: #{result['output_id']}]".lstrip()
+
+
+class InstallPipeline:
+    """
+    Installs updates as a pipeline: downloads run concurrently while
+    installs run one at a time in dependency-safe order. Every state change
+    is persisted, so a run interrupted by a crash, reboot or cancellation
+    resumes where it stopped.
+    """
+    def __init__(self, tracker=None, db=None, download_concurrency: int = 3,
+                 device_id: Optional[str] = None):
+        """
+        Initialize the install pipeline and create its tables.
+
+        :param tracker: WindowsUpdateTracker (defaults to the shared tracker)
+        :param db: DatabaseManager for run state (defaults to the shared manager)
+        :param download_concurrency: Maximum concurrent downloads
+        :param device_id: Device the runs belong to (defaults to this machine)
+        """
+        if tracker is None:
+            from update_tracker import get_update_tracker
+            tracker = get_update_tracker()
+        if db is None:
+            from database import get_db_manager
+            db = get_db_manager()
+        if device_id is None:
+            from database import LOCAL_DEVICE_ID
+            device_id = LOCAL_DEVICE_ID
+
+        self.tracker = tracker
+        self.db = db
+        self.download_concurrency = max(1, download_concurrency)
+        self.device_id = device_id
+        self._event_lock = threading.Lock()
+
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create the install run and per-update state tables."""
+        with self.db.lock, self.db.conn:
+            cursor = self.db.conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS install_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    device_id TEXT,
+                    status TEXT NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    finished_at DATETIME
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS install_items (
+                    run_id INTEGER NOT NULL REFERENCES install_runs (id),
+                    position INTEGER NOT NULL,
+                    update_name TEXT NOT NULL,
+                    kb TEXT,
+                    state TEXT NOT NULL,
+                    message TEXT,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (run_id, update_name)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_install_runs_device_status
+                ON install_runs (device_id, status)
+            ''')
+
+    def create_run(self, updates: Iterable[str]) -> int:
+        """
+        Persist a new run with every update queued in install order.
+
+        :param updates: Update titles to install
+        :return: Run id
+        """
+        ordered = order_updates(updates)
+        if not ordered:
+            raise ValueError("No updates to install")
+
+        with self.db.lock, self.db.conn:
+            cursor = self.db.conn.cursor()
+            cursor.execute('INSERT INTO install_runs (device_id, status) VALUES (?, ?)',
+                           (self.device_id, RUN_RUNNING))
+            run_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT INTO install_items (run_id, position, update_name, kb, state)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(run_id, position, update, extract_kb(update), QUEUED)
+                  for position, update in enumerate(ordered)])
+        return run_id
+
+    def resumable_run(self) -> Optional[int]:
+        """
+        Find the most recent unfinished run for this device.
+
+        :return: Run id, or None
+        """
+        with self.db.read_cursor() as cursor:
+            cursor.execute('''
+                SELECT id FROM install_runs
+                WHERE device_id = ? AND status IN (?, ?)
+                ORDER BY id DESC LIMIT 1
+            ''', (self.device_id, RUN_RUNNING, RUN_INTERRUPTED))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def abandon_run(self, run_id: int):
+        """Mark an unfinished run as abandoned so it is not offered for resume."""
+        self._finish_run(run_id, RUN_ABANDONED)
+
+    def run_items(self, run_id: int) -> List[Dict[str, Any]]:
+        """
+        Return the per-update state of a run.
+
+        :param run_id: Run id
+        :return: Items in install order
+        """
+        columns = ('position', 'update_name', 'kb', 'state', 'message', 'updated_at')
+        with self.db.read_cursor() as cursor:
+            cursor.execute(f'''
+                SELECT {', '.join(columns)} FROM install_items
+                WHERE run_id = ? ORDER BY position
+            ''', (run_id,))
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def run(self, updates: Optional[Iterable[str]] = None, run_id: Optional[int] = None,
+            on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+            should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        """
+        Run (or resume) an install run.
+
+        :param updates: Updates for a new run (ignored when run_id is given)
+        :param run_id: Existing run to resume
+        :param on_event: Called from worker threads with state and output events:
+                         ``{'type': 'state', 'update', 'state', 'message', 'completed', 'total'}``
+                         or ``{'type': 'output', 'update', 'stage', 'line'}``
+        :param should_stop: Polled between steps; when it returns True no new
+                            downloads or installs start and the run is left resumable
+        :return: Summary with status, run_id, installed updates and failures
+        """
+        try:
+            if run_id is None:
+                run_id = self.create_run(updates or [])
+            items = self._prepare_resume(run_id)
+        except (sqlite3.Error, ValueError) as e:
+            return {'status': 'error', 'message': str(e)}
+
+        should_stop = should_stop or (lambda: False)
+        progress = {'completed': sum(item['state'] in (DONE, FAILED) for item in items),
+                    'total': len(items)}
+
+        def emit(event):
+            if on_event:
+                with self._event_lock:
+                    on_event(dict(event, run_id=run_id))
+
+        stopped = False
+        with ThreadPoolExecutor(max_workers=self.download_concurrency,
+                                thread_name_prefix='update-download') as pool:
+            downloads = {
+                item['update_name']: pool.submit(self._download, run_id, item['update_name'],
+                                                  progress, emit, should_stop)
+                for item in items if item['state'] == QUEUED
+            }
+
+            # Install serially in order, each as soon as its download is done.
+            # Once a servicing stack update fails, the cumulative and feature
+            # updates that depend on it are failed instead of installed.
+            failed_prerequisite = None
+            for item in items:
+                update = item['update_name']
+                priority = install_priority(update)
+                if item['state'] == FAILED and priority == 0:
+                    failed_prerequisite = failed_prerequisite or update
+                if item['state'] in (DONE, FAILED):
+                    continue
+                if should_stop():
+                    stopped = True
+                    break
+
+                download = downloads.get(update)
+                if failed_prerequisite is not None and priority > 1:
+                    # A download still running finishes first so its state isn't overwritten
+                    if download is None or download.cancel() or download.result():
+                        self._set_state(run_id, update, FAILED,
+                                        f"Prerequisite failed: {failed_prerequisite}", progress, emit)
+                    continue
+
+                if download is not None and not download.result():
+                    if priority == 0 and not should_stop():
+                        failed_prerequisite = failed_prerequisite or update
+                    continue
+                if should_stop():
+                    stopped = True
+                    break
+
+                if not self._install(run_id, update, progress, emit) and priority == 0:
+                    failed_prerequisite = failed_prerequisite or update
+
+            if stopped:
+                for future in downloads.values():
+                    future.cancel()
+
+        items = self.run_items(run_id)
+        failed = {item['update_name']: item['message'] or '' for item in items if item['state'] == FAILED}
+        installed = [item['update_name'] for item in items if item['state'] == DONE]
+
+        if stopped:
+            status = RUN_INTERRUPTED
+        else:
+            status = RUN_FAILED if failed else RUN_COMPLETED
+        self._finish_run(run_id, status)
+
+        return {
+            'status': {RUN_COMPLETED: 'success', RUN_INTERRUPTED: 'interrupted'}.get(status, 'error'),
+            'run_id': run_id,
+            'installed': installed,
+            'failed': failed,
+            'remaining': [item['update_name'] for item in items
+                          if item['state'] not in (DONE, FAILED)],
+        }
+
+    def _prepare_resume(self, run_id: int) -> List[Dict[str, Any]]:
+        """
+        Reset steps that were cut off mid-way: an interrupted download is
+        queued again and an interrupted install is retried.
+        """
+        with self.db.lock, self.db.conn:
+            cursor = self.db.conn.cursor()
+            cursor.execute('SELECT status FROM install_runs WHERE id = ?', (run_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Unknown install run {run_id}")
+            cursor.execute('''
+                UPDATE install_items SET state = CASE state
+                    WHEN ? THEN ?
+                    WHEN ? THEN ?
+                END
+                WHERE run_id = ? AND state IN (?, ?)
+            ''', (DOWNLOADING, QUEUED, INSTALLING, DOWNLOADED, run_id, DOWNLOADING, INSTALLING))
+            cursor.execute('UPDATE install_runs SET status = ?, finished_at = NULL WHERE id = ?',
+                           (RUN_RUNNING, run_id))
+        return self.run_items(run_id)
+
+    def _download(self, run_id: int, update: str, progress: Dict[str, int],
+                  emit: Callable, should_stop: Callable[[], bool]) -> bool:
+        """Download one update on a pool thread. Returns True if it can be installed."""
+        if should_stop():
+            return False
+
+        self._set_state(run_id, update, DOWNLOADING, '', progress, emit)
+        result = self.tracker.download_update(
+            self._identifier(update),
+            on_output=lambda line: emit({'type': 'output', 'update': update,
+                                         'stage': DOWNLOADING, 'line': line})
+        )
+        if result['status'] != 'success':
+            self._set_state(run_id, update, FAILED,
+                            _with_output_ref(f"Download failed: {result.get('message', '')}", result),
+                            progress, emit)
+            return False
+
+        self._set_state(run_id, update, DOWNLOADED, '', progress, emit)
+        return True
+
+    def _install(self, run_id: int, update: str, progress: Dict[str, int], emit: Callable) -> bool:
+        """Install one downloaded update. Returns True if it was installed."""
+        self._set_state(run_id, update, INSTALLING, '', progress, emit)
+        result = self.tracker.install_update(
+            self._identifier(update),
+            on_output=lambda line: emit({'type': 'output', 'update': update,
+                                         'stage': INSTALLING, 'line': line})
+        )
+        if result['status'] == 'success':
+            message = result.get('output', '')
+        else:
+            message = f"Install failed: {result.get('message', '')}"
+        self._set_state(run_id, update, DONE if result['status'] == 'success' else FAILED,
+                        _with_output_ref(message, result), progress, emit)
+        return result['status'] == 'success'
+
+    @staticmethod
+    def _identifier(update: str) -> str:
+        """Address updates by KB id when the title has one."""
+        return extract_kb(update) or update
+
+    def _set_state(self, run_id: int, update: str, state: str, message: str,
+                   progress: Dict[str, int], emit: Callable):
+        """Persist an update's state, log it and emit a state event."""
+        try:
+            with self.db.lock, self.db.conn:
+                self.db.conn.execute('''
+                    UPDATE install_items
+                    SET state = ?, message = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE run_id = ? AND update_name = ?
+                ''', (state, message, run_id, update))
+        except sqlite3.Error as e:
+            print(f"Database error when saving install state: {e}")
+
+        if state in _LOG_STATUS:
+            self.db.log_update(update, _LOG_STATUS[state], message, device_id=self.device_id)
+
+        with self._event_lock:
+            if state in (DONE, FAILED):
+                progress['completed'] += 1
+            completed, total = progress['completed'], progress['total']
+        emit({'type': 'state', 'update': update, 'state': state, 'message': message,
+              'completed': completed, 'total': total})
+
+    def _finish_run(self, run_id: int, status: str):
+        try:
+            with self.db.lock, self.db.conn:
+                self.db.conn.execute('''
+                    UPDATE install_runs
+                    SET status = ?, finished_at = CASE WHEN ? IN (?, ?) THEN NULL ELSE CURRENT_TIMESTAMP END
+                    WHERE id = ?
+                ''', (status, status, RUN_RUNNING, RUN_INTERRUPTED, run_id))
+        except sqlite3.Error as e:
+            print(f"Database error when finishing install run: {e}")
@@ -0,0 +1,204 @@
+import threading
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function to abort after a cancellation request."""
+
+
+class JobSignals(QObject):
+    """
+    Signals emitted by a background job.
+    Created on the GUI thread, so connected slots always run on the GUI thread.
+    """
+    progress = pyqtSignal(str, int, str)    # job name, percent, message
+    finished = pyqtSignal(str, object)      # job name, result
+    failed = pyqtSignal(str, str)           # job name, error message
+    cancelled = pyqtSignal(str)             # job name
+    event = pyqtSignal(str, object)         # job name, job-specific event payload
+
+
+class Job(QRunnable):
+    """
+    A unit of background work run on the engine's thread pool.
+    The job function receives the job as its first argument so it can
+    report progress and check for cancellation.
+    """
+    def __init__(self, name: str, fn: Callable[..., Any], *args, **kwargs):
+        """
+        Initialize a background job.
+
+        :param name: Unique job name (one in-flight job per name)
+        :param fn: Callable run on a worker thread as ``fn(job, *args, **kwargs)``
+        """
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        # Deliver the result of a job that returns after a cancellation
+        # request (e.g. a partial summary) instead of discarding it
+        self.finish_on_cancel = False
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """
+        Request cancellation. The result of a cancelled job is discarded
+        unless ``finish_on_cancel`` is set.
+        """
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        """Whether cancellation has been requested."""
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation has been requested."""
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.name)
+
+    def report_progress(self, percent: int, message: str = ''):
+        """
+        Report job progress to the GUI thread.
+
+        :param percent: Completion percentage (0-100)
+        :param message: Short progress description
+        """
+        self.signals.progress.emit(self.name, int(percent), message)
+
+    def report_event(self, payload: Any):
+        """
+        Send a structured event (e.g. per-item state) to the GUI thread.
+
+        :param payload: Event data passed to the ``on_event`` callback
+        """
+        self.signals.event.emit(self.name, payload)
+
+    def run(self):
+        """Execute the job function on a pool thread. Never touches widgets."""
+        if self.is_cancelled():
+            self.signals.cancelled.emit(self.name)
+            return
+
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            self.signals.cancelled.emit(self.name)
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(self.name, str(e))
+        else:
+            if self.is_cancelled() and not self.finish_on_cancel:
+                self.signals.cancelled.emit(self.name)
+            else:
+                self.signals.finished.emit(self.name, result)
+
+
+class JobEngine(QObject):
+    """
+    Runs independent jobs concurrently on a QThreadPool.
+    Jobs are keyed by name: submitting a job whose name is already running
+    returns the in-flight job instead of starting duplicate work.
+    """
+    def __init__(self, parent: QObject = None, max_threads: int = 4):
+        """
+        Initialize the job engine.
+
+        :param parent: Owning QObject
+        :param max_threads: Maximum number of concurrently running jobs
+        """
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._jobs: Dict[str, Job] = {}
+
+    def submit(self, name: str, fn: Callable[..., Any], *args,
+               on_finished: Optional[Callable[[str, Any], None]] = None,
+               on_failed: Optional[Callable[[str, str], None]] = None,
+               on_progress: Optional[Callable[[str, int, str], None]] = None,
+               on_cancelled: Optional[Callable[[str], None]] = None,
+               on_event: Optional[Callable[[str, Any], None]] = None,
+               finish_on_cancel: bool = False,
+               **kwargs) -> Job:
+        """
+        Submit a job to the thread pool.
+
+        :param name: Unique job name
+        :param fn: Callable run as ``fn(job, *args, **kwargs)`` on a worker thread
+        :param on_finished: GUI-thread callback receiving (name, result)
+        :param on_failed: GUI-thread callback receiving (name, error message)
+        :param on_progress: GUI-thread callback receiving (name, percent, message)
+        :param on_cancelled: GUI-thread callback receiving (name)
+        :param on_event: GUI-thread callback receiving (name, event payload)
+        :param finish_on_cancel: Pass the result to on_finished even if the job
+                                 returns after cancellation was requested
+        :return: The submitted job, or the already running job with this name
+        """
+        if name in self._jobs:
+            return self._jobs[name]
+
+        job = Job(name, fn, *args, **kwargs)
+        job.finish_on_cancel = finish_on_cancel
+
+        # Forget the job first so callbacks can resubmit under the same name
+        job.signals.finished.connect(self._forget)
+        job.signals.failed.connect(self._forget)
+        job.signals.cancelled.connect(self._forget)
+
+        if on_finished:
+            job.signals.finished.connect(on_finished)
+        if on_failed:
+            job.signals.failed.connect(on_failed)
+        if on_progress:
+            job.signals.progress.connect(on_progress)
+        if on_cancelled:
+            job.signals.cancelled.connect(on_cancelled)
+        if on_event:
+            job.signals.event.connect(on_event)
+
+        self._jobs[name] = job
+        self.pool.start(job)
+        return job
+
+    def _forget(self, name: str, *args):
+        """Drop a completed job from the in-flight registry."""
+        self._jobs.pop(name, None)
+
+    def is_running(self, name: str) -> bool:
+        """Whether a job with this name is queued or running."""
+        return name in self._jobs
+
+    def cancel(self, name: str) -> bool:
+        """
+        Request cancellation of a job.
+
+        :param name: Job name
+        :return: True if a matching job was found
+        """
+        job = self._jobs.get(name)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def cancel_all(self):
+        """Request cancellation of every queued or running job."""
+        for job in list(self._jobs.values()):
+            job.cancel()
+
+    def shutdown(self, timeout_ms: int = 5000) -> bool:
+        """
+        Cancel all jobs and wait for running ones to return.
+
+        :param timeout_ms: Maximum time to wait in milliseconds
+        :return: True if all jobs finished within the timeout
+        """
+        self.cancel_all()
+        self.pool.clear()
+        return self.pool.waitForDone(timeout_ms)
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from database import LOG_TABLE_COLUMNS
+
+
+class PagedLogModel(QAbstractTableModel):
+    """
+    Table model over update_logs or device_health that loads rows lazily.
+    Rows are fetched page by page with keyset queries as the view scrolls
+    (canFetchMore/fetchMore). Only a bounded number of pages is kept in
+    memory; evicted pages are re-fetched from their stored keyset.
+    Sorting and filtering are done in SQL.
+    """
+    def __init__(self, db, table: str, headers: Optional[Sequence[str]] = None,
+                 page_size: int = 200, max_cached_pages: int = 50, parent=None):
+        """
+        Initialize the paged log model.
+
+        :param db: DatabaseManager providing ``fetch_log_page``
+        :param table: 'update_logs' or 'device_health'
+        :param headers: Column headers (defaults to column names)
+        :param page_size: Rows fetched per query
+        :param max_cached_pages: Pages kept in memory before the least
+                                 recently used one is dropped
+        """
+        super().__init__(parent)
+        self.db = db
+        self.table = table
+        self.columns = LOG_TABLE_COLUMNS[table]
+        self.headers = list(headers) if headers else [
+            column.replace('_', ' ').title() for column in self.columns
+        ]
+        self.page_size = page_size
+        self.max_cached_pages = max(2, max_cached_pages)
+
+        self.sort_column = 'timestamp'
+        self.descending = True
+        self.filters: Dict[str, Any] = {}
+
+        self._reset_state()
+
+    def _reset_state(self):
+        """Forget all loaded rows and page keys."""
+        self._pages = OrderedDict()     # page index -> rows (LRU order)
+        self._page_keys = []            # keyset preceding each page
+        self._next_key = None           # keyset after the last loaded row
+        self._row_count = 0
+        self._has_more = True
+
+    def refresh(self):
+        """
+        Reload from the first page (e.g. after new rows were logged). Pages
+        are read without flushing the database's write buffer, so rows still
+        buffered appear once the caller (or the background writer) flushes.
+        """
+        self.beginResetModel()
+        self._reset_state()
+        self.endResetModel()
+
+    def set_filters(self, filters: Dict[str, Any]):
+        """
+        Apply column filters and reload.
+
+        :param filters: Column equality filters plus optional 'since'/'until'
+        """
+        self.filters = {name: value for name, value in filters.items() if value not in (None, '')}
+        self.refresh()
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal and 0 <= section < len(self.headers):
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        row = self._row(index.row())
+        if row is None:
+            return None
+        value = row[index.column()]
+        return '' if value is None else str(value)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self._has_more:
+            return
+
+        rows = self._fetch(self._next_key)
+        self._has_more = len(rows) == self.page_size
+        if not rows:
+            return
+
+        page_index = len(self._page_keys)
+        self._page_keys.append(self._next_key)
+        self._next_key = self.db.log_row_key(self.table, rows[-1], self.sort_column)
+
+        self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + len(rows) - 1)
+        self._store_page(page_index, rows)
+        self._row_count += len(rows)
+        self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not 0 <= column < len(self.columns):
+            return
+        self.sort_column = self.columns[column]
+        self.descending = order == Qt.DescendingOrder
+        self.refresh()
+
+    # Paging
+
+    def _fetch(self, after) -> List[tuple]:
+        return self.db.fetch_log_page(
+            self.table,
+            sort_column=self.sort_column,
+            descending=self.descending,
+            after=after,
+            filters=self.filters,
+            limit=self.page_size,
+            # Called from data()/fetchMore() on the GUI thread
+            flush=False
+        )
+
+    def _store_page(self, page_index: int, rows: List[tuple]):
+        """Cache a page, evicting the least recently used page if needed."""
+        self._pages[page_index] = rows
+        self._pages.move_to_end(page_index)
+        while len(self._pages) > self.max_cached_pages:
+            self._pages.popitem(last=False)
+
+    def _row(self, row: int) -> Optional[tuple]:
+        """Return a row, re-fetching its page by keyset if it was evicted."""
+        page_index, offset = divmod(row, self.page_size)
+        if page_index >= len(self._page_keys):
+            return None
+
+        page = self._pages.get(page_index)
+        if page is None:
+            page = self._fetch(self._page_keys[page_index])
+            self._store_page(page_index, page)
+        else:
+            self._pages.move_to_end(page_index)
+
+        # Rows removed by retention since the page was first loaded shorten it
+        return page[offset] if offset < len(page) else None
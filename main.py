@@ -2,7 +2,8 @@ import sys
 import os
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget, 
                              QVBoxLayout, QLabel, QPushButton, QTableWidget, 
-                             QTableWidgetItem, QMessageBox, QHBoxLayout, QTextEdit)
+                             QTableWidgetItem, QMessageBox, QHBoxLayout, QTextEdit,
+                             QTableView, QComboBox, QLineEdit, QFileDialog)
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont
 
@@ -10,6 +11,17 @@ from PyQt5.QtGui import QFont
 from database import db_manager
 from update_tracker import update_tracker
 from device_health import device_health_monitor
+from job_engine import JobEngine
+from timeseries import TimeSeriesStore
+from update_cache import PendingUpdatesCache
+from install_pipeline import InstallPipeline, DONE, FAILED
+from health_analysis import HealthRegressionDetector, RollbackPolicy
+from compliance import ComplianceEngine
+from refresh_scheduler import RefreshScheduler
+from log_model import PagedLogModel
+from health_buffer import get_health_history
+from health_chart import HealthChart
+from metrics import registry as metrics, MetricsServer, MetricsSnapshotter, DEFAULT_METRICS_PORT
 
 class AutoPatchGuardianApp(QMainWindow):
     """
@@ -21,6 +33,20 @@ class AutoPatchGuardianApp(QMainWindow):
         self.setWindowTitle("AutoPatch Guardian - Windows Update Management")
         self.setGeometry(100, 100, 1000, 700)
         
+        # Background job engine (keeps blocking work off the GUI thread)
+        self.jobs = JobEngine(self)
+        
+        # Cached pending-update scans; the table only applies scan diffs
+        self.updates_cache = PendingUpdatesCache(update_tracker, db=db_manager)
+        self.shown_updates_generation = 0
+        
+        # Resumable download/install pipeline for update installation
+        self.install_pipeline = InstallPipeline(update_tracker, db_manager)
+        
+        # Post-install health regression checks ('auto' also rolls back)
+        self.rollback_policy = RollbackPolicy(HealthRegressionDetector(db_manager), update_tracker,
+                                              mode=os.environ.get('AUTOPATCH_ROLLBACK_POLICY', 'flag'))
+        
         # Create main tab widget
         self.main_tabs = QTabWidget()
         self.setCentralWidget(self.main_tabs)
@@ -30,8 +56,47 @@ class AutoPatchGuardianApp(QMainWindow):
         self.create_device_health_tab()
         self.create_logs_tab()
         
+        # Compliance aggregates are kept current by database triggers
+        self.compliance = ComplianceEngine(db_manager)
+        self.create_compliance_tab()
+        
         # Setup periodic refresh
         self.setup_periodic_refresh()
+        
+        # Background rollups and retention for device health history
+        self.timeseries = TimeSeriesStore(db_manager)
+        self.timeseries.start()
+        
+        # Metrics export (enabled with AUTOPATCH_METRICS=1)
+        self.metrics_server = None
+        self.metrics_snapshotter = None
+        if metrics.enabled:
+            self.start_metrics_export()
+        
+        # Offer to finish an install run cut off by a crash or reboot
+        QTimer.singleShot(0, self.offer_install_resume)
+    
+    def start_metrics_export(self):
+        """Serve Prometheus metrics locally and snapshot them into the database."""
+        port = int(os.environ.get('AUTOPATCH_METRICS_PORT', DEFAULT_METRICS_PORT))
+        try:
+            self.metrics_server = MetricsServer(port=port)
+            self.metrics_server.start()
+        except OSError as e:
+            print(f"Metrics endpoint unavailable on port {port}: {e}")
+            self.metrics_server = None
+        self.metrics_snapshotter = MetricsSnapshotter(db_manager)
+        self.metrics_snapshotter.start()
+    
+    def closeEvent(self, event):
+        """Cancel background jobs before the window closes."""
+        self.jobs.shutdown()
+        self.timeseries.stop()
+        if self.metrics_snapshotter is not None:
+            self.metrics_snapshotter.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        super().closeEvent(event)
     
     def create_update_tab(self):
         """Create tab for update management and tracking."""
@@ -49,15 +114,24 @@ class AutoPatchGuardianApp(QMainWindow):
         # Update Actions
         update_actions_layout = QHBoxLayout()
         check_updates_btn = QPushButton("Check for Updates")
-        check_updates_btn.clicked.connect(self.refresh_pending_updates)
+        check_updates_btn.clicked.connect(lambda: self.refresh_pending_updates(force=True))
         install_updates_btn = QPushButton("Install Selected Updates")
         install_updates_btn.clicked.connect(self.install_selected_updates)
         rollback_updates_btn = QPushButton("Rollback Last Update")
         rollback_updates_btn.clicked.connect(self.rollback_updates)
+        check_regressions_btn = QPushButton("Check Install Regressions")
+        check_regressions_btn.clicked.connect(self.check_install_regressions)
+        cancel_check_btn = QPushButton("Cancel Check")
+        cancel_check_btn.clicked.connect(self.cancel_pending_updates_check)
+        stop_install_btn = QPushButton("Stop Install")
+        stop_install_btn.clicked.connect(self.stop_install)
         
         update_actions_layout.addWidget(check_updates_btn)
         update_actions_layout.addWidget(install_updates_btn)
+        update_actions_layout.addWidget(stop_install_btn)
         update_actions_layout.addWidget(rollback_updates_btn)
+        update_actions_layout.addWidget(check_regressions_btn)
+        update_actions_layout.addWidget(cancel_check_btn)
         
         # Add widgets to layout
         update_layout.addWidget(pending_updates_label)
@@ -78,6 +152,20 @@ class AutoPatchGuardianApp(QMainWindow):
         
         self.system_health_text = QTextEdit()
         self.system_health_text.setReadOnly(True)
+        self.system_health_text.setMaximumHeight(120)
+        
+        # Live chart of recent samples, kept in memory
+        self.health_history = get_health_history()
+        self.health_chart = HealthChart(self.health_history.buffer())
+        self.health_window_combo = QComboBox()
+        for label, seconds in (("Last 5 minutes", 300), ("Last hour", 3600), ("Last 24 hours", 86400)):
+            self.health_window_combo.addItem(label, seconds)
+        self.health_window_combo.setCurrentIndex(1)
+        self.health_window_combo.currentIndexChanged.connect(self.on_health_window_changed)
+        self.health_stats_label = QLabel()
+        health_chart_controls = QHBoxLayout()
+        health_chart_controls.addWidget(self.health_window_combo)
+        health_chart_controls.addWidget(self.health_stats_label, 1)
         
         # Device Configuration Section
         device_config_label = QLabel("Device Configuration:")
@@ -86,6 +174,11 @@ class AutoPatchGuardianApp(QMainWindow):
         self.device_config_text = QTextEdit()
         self.device_config_text.setReadOnly(True)
         
+        # Show the last known configuration until the first refresh completes
+        cached_config = device_health_monitor.cached_device_configuration()
+        if cached_config:
+            self.on_device_config_ready('device_config', cached_config)
+        
         # Refresh Button
         refresh_health_btn = QPushButton("Refresh Device Health")
         refresh_health_btn.clicked.connect(self.refresh_device_health)
@@ -93,12 +186,18 @@ class AutoPatchGuardianApp(QMainWindow):
         # Add widgets to layout
         device_health_layout.addWidget(system_health_label)
         device_health_layout.addWidget(self.system_health_text)
+        device_health_layout.addLayout(health_chart_controls)
+        device_health_layout.addWidget(self.health_chart)
         device_health_layout.addWidget(device_config_label)
         device_health_layout.addWidget(self.device_config_text)
         device_health_layout.addWidget(refresh_health_btn)
         
         device_health_tab.setLayout(device_health_layout)
         self.main_tabs.addTab(device_health_tab, "Device Health")
+        
+        # Seed the chart with the last day of stored samples
+        self.submit_job('load_health_history', lambda job: self.health_history.load(db_manager),
+                        lambda name, loaded: self.update_health_chart())
     
     def create_logs_tab(self):
         """Create tab for displaying system logs."""
@@ -109,115 +208,548 @@ class AutoPatchGuardianApp(QMainWindow):
         update_logs_label = QLabel("Update Logs:")
         update_logs_label.setFont(QFont('Arial', 12, QFont.Bold))
         
-        self.update_logs_table = QTableWidget()
-        self.update_logs_table.setColumnCount(4)
-        self.update_logs_table.setHorizontalHeaderLabels(["Timestamp", "Update Name", "Status", "Details"])
+        # Log source and filters (applied in SQL)
+        log_filter_layout = QHBoxLayout()
+        self.log_source_combo = QComboBox()
+        self.log_source_combo.addItem("Update Logs", 'update_logs')
+        self.log_source_combo.addItem("Device Health", 'device_health')
+        self.log_source_combo.currentIndexChanged.connect(self.change_log_source)
+        self.log_device_filter = QLineEdit()
+        self.log_device_filter.setPlaceholderText("Device")
+        self.log_status_filter = QLineEdit()
+        self.log_status_filter.setPlaceholderText("Status")
+        self.log_search_filter = QLineEdit()
+        self.log_search_filter.setPlaceholderText("Search update names and details")
+        apply_filter_btn = QPushButton("Apply Filter")
+        apply_filter_btn.clicked.connect(self.apply_log_filters)
+        self.log_device_filter.returnPressed.connect(self.apply_log_filters)
+        self.log_status_filter.returnPressed.connect(self.apply_log_filters)
+        self.log_search_filter.returnPressed.connect(self.apply_log_filters)
+        
+        log_filter_layout.addWidget(self.log_source_combo)
+        log_filter_layout.addWidget(self.log_device_filter)
+        log_filter_layout.addWidget(self.log_status_filter)
+        log_filter_layout.addWidget(self.log_search_filter)
+        log_filter_layout.addWidget(apply_filter_btn)
+        
+        # Lazily paged views over the log tables
+        self.log_models = {
+            'update_logs': PagedLogModel(db_manager, 'update_logs', parent=self),
+            'device_health': PagedLogModel(db_manager, 'device_health', parent=self),
+        }
+        self.update_logs_table = QTableView()
+        self.update_logs_table.setModel(self.log_models['update_logs'])
+        self.update_logs_table.setSortingEnabled(True)
+        self.update_logs_table.sortByColumn(1, Qt.DescendingOrder)
         
         # Add widgets to layout
         logs_layout.addWidget(update_logs_label)
+        logs_layout.addLayout(log_filter_layout)
         logs_layout.addWidget(self.update_logs_table)
         
         logs_tab.setLayout(logs_layout)
         self.main_tabs.addTab(logs_tab, "System Logs")
     
+    def create_compliance_tab(self):
+        """Create tab for fleet and per-device compliance reporting."""
+        compliance_tab = QWidget()
+        compliance_layout = QVBoxLayout()
+        
+        compliance_label = QLabel("Compliance Overview:")
+        compliance_label.setFont(QFont('Arial', 12, QFont.Bold))
+        self.compliance_summary = QLabel()
+        
+        # Per-device compliance
+        self.compliance_devices_table = QTableWidget()
+        self.compliance_devices_table.setColumnCount(6)
+        self.compliance_devices_table.setHorizontalHeaderLabels(
+            ["Device", "Compliant", "Pending", "Failed Installs", "Last Scan", "Last Install"])
+        
+        # Pending updates across the fleet
+        pending_kb_label = QLabel("Pending Updates by KB:")
+        pending_kb_label.setFont(QFont('Arial', 12, QFont.Bold))
+        self.compliance_kb_table = QTableWidget()
+        self.compliance_kb_table.setColumnCount(3)
+        self.compliance_kb_table.setHorizontalHeaderLabels(["KB", "Title", "Pending On"])
+        
+        compliance_actions_layout = QHBoxLayout()
+        refresh_compliance_btn = QPushButton("Refresh")
+        refresh_compliance_btn.clicked.connect(self.refresh_compliance)
+        export_compliance_btn = QPushButton("Export Report")
+        export_compliance_btn.clicked.connect(self.export_compliance_report)
+        compliance_actions_layout.addWidget(refresh_compliance_btn)
+        compliance_actions_layout.addWidget(export_compliance_btn)
+        
+        compliance_layout.addWidget(compliance_label)
+        compliance_layout.addWidget(self.compliance_summary)
+        compliance_layout.addWidget(self.compliance_devices_table)
+        compliance_layout.addWidget(pending_kb_label)
+        compliance_layout.addWidget(self.compliance_kb_table)
+        compliance_layout.addLayout(compliance_actions_layout)
+        
+        compliance_tab.setLayout(compliance_layout)
+        self.main_tabs.addTab(compliance_tab, "Compliance")
+    
+    def refresh_compliance(self):
+        """Reload the compliance report (reads the maintained aggregates only)."""
+        self.submit_scheduled('compliance_report', lambda job: self.compliance.snapshot(),
+                              self.on_compliance_report,
+                              fingerprint=lambda report: (tuple(report['fleet'].items()),
+                                                          len(report['devices']),
+                                                          tuple(kb['pending_count'] for kb in report['pending_by_kb'])))
+    
+    def on_compliance_report(self, name, report):
+        """Show a compliance snapshot."""
+        fleet = report['fleet']
+        self.compliance_summary.setText(
+            f"{fleet['patched_devices']} of {fleet['scanned_devices']} scanned devices fully patched "
+            f"({fleet['patched_percent']:.1f}%) | {fleet['pending_total']} pending updates | "
+            f"{fleet['failed_installs']} failed installs"
+        )
+        
+        self.compliance_devices_table.setRowCount(len(report['devices']))
+        for row, device in enumerate(report['devices']):
+            values = (device['device_id'], "Yes" if device['compliant'] else "No",
+                      device['pending_count'], device['failed_installs'],
+                      device['last_scan_at'] or "Never", device['last_install_at'] or "")
+            for column, value in enumerate(values):
+                self.compliance_devices_table.setItem(row, column, QTableWidgetItem(str(value)))
+        
+        self.compliance_kb_table.setRowCount(len(report['pending_by_kb']))
+        for row, kb in enumerate(report['pending_by_kb']):
+            for column, key in enumerate(('kb', 'title', 'pending_count')):
+                self.compliance_kb_table.setItem(row, column, QTableWidgetItem(str(kb[key])))
+    
+    def export_compliance_report(self):
+        """Export the compliance report to CSV (per device) or JSON (full snapshot)."""
+        path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Export Compliance Report", "compliance_report.csv",
+            "CSV files (*.csv);;JSON files (*.json)")
+        if not path:
+            return
+        
+        fmt = 'json' if selected_filter.startswith('JSON') else 'csv'
+        result = self.compliance.export(path, fmt)
+        if result['status'] == 'success':
+            self.statusBar().showMessage(f"Exported compliance report to {path}", 5000)
+        else:
+            QMessageBox.warning(self, "Export Error", f"Failed to export report: {result['message']}")
+    
+    def current_log_model(self):
+        """Return the model for the selected log source."""
+        return self.log_models[self.log_source_combo.currentData()]
+    
+    def change_log_source(self, index):
+        """Switch the logs view between update logs and device health."""
+        model = self.current_log_model()
+        self.update_logs_table.setModel(model)
+        # Full-text search only covers update logs
+        self.log_search_filter.setEnabled(self.log_source_combo.currentData() == 'update_logs')
+        self.apply_log_filters()
+    
+    def apply_log_filters(self):
+        """Apply the device, status and search filters to the current log view."""
+        filters = {
+            'device_id': self.log_device_filter.text().strip(),
+            'status': self.log_status_filter.text().strip(),
+        }
+        if self.log_source_combo.currentData() == 'update_logs':
+            filters['search'] = self.log_search_filter.text().strip()
+        self.current_log_model().set_filters(filters)
+    
     def setup_periodic_refresh(self):
         """Setup periodic refresh for various system components."""
+        # Each source has its own interval (seconds), with jitter and backoff
+        # on failure. Adaptive sources poll less often while nothing changes.
+        self.scheduler = RefreshScheduler()
+        self.scheduler.add_source('system_health', 60)
+        self.scheduler.add_source('device_config', 900, max_interval=6 * 3600, adaptive=True)
+        self.scheduler.add_source('pending_updates', 1800, max_interval=4 * 3600, adaptive=True)
+        self.scheduler.add_source('update_logs', 30, min_interval=10, max_interval=300, adaptive=True)
+        self.scheduler.add_source('compliance_report', 120, max_interval=900, adaptive=True)
+        self.shown_log_key = None
+        
         self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
         self.refresh_timer.timeout.connect(self.periodic_refresh)
-        self.refresh_timer.start(300000)  # Refresh every 5 minutes
+        self.schedule_next_refresh()
+    
+    def schedule_next_refresh(self):
+        """Arm the refresh timer for the next due source."""
+        delay = self.scheduler.seconds_until_next()
+        # With every source running, the timer is re-armed when one finishes
+        if delay is not None:
+            self.refresh_timer.start(int(delay * 1000))
     
     def periodic_refresh(self):
-        """Perform periodic refresh of system components."""
-        self.refresh_pending_updates()
-        self.refresh_device_health()
-        self.refresh_update_logs()
+        """Start every refresh source that is due."""
+        refreshers = {
+            'system_health': self.refresh_system_health,
+            'device_config': self.refresh_device_config,
+            'pending_updates': self.refresh_pending_updates,
+            'update_logs': self.refresh_update_logs,
+            'compliance_report': self.refresh_compliance,
+        }
+        for name in self.scheduler.due():
+            refreshers[name]()
+        self.schedule_next_refresh()
     
-    def refresh_pending_updates(self):
-        """Refresh pending Windows updates."""
-        try:
-            # Clear existing table
-            self.pending_updates_table.setRowCount(0)
+    def submit_scheduled(self, source, fn, on_finished, fingerprint=None):
+        """
+        Run a refresh source as a background job. A trigger while the source
+        is already running (e.g. a click during a periodic refresh) joins the
+        run in flight instead of starting duplicate work.
+        
+        :param source: Scheduler source name, also used as the job name
+        :param fn: Callable run as ``fn(job)`` on a worker thread
+        :param on_finished: GUI-thread callback receiving (name, result)
+        :param fingerprint: Maps a result to a comparable summary, so adaptive
+                            sources can tell whether anything changed
+        :return: True if a new run was started
+        """
+        if not self.scheduler.begin(source):
+            return False
+        
+        def finished(name, result):
+            failed = isinstance(result, dict) and result.get('status') == 'error'
+            if failed or fingerprint is None:
+                self.scheduler.finish(name, success=not failed)
+            else:
+                self.scheduler.finish(name, fingerprint=fingerprint(result))
+            self.schedule_next_refresh()
+            on_finished(name, result)
+        
+        def failed(name, error):
+            self.scheduler.finish(name, success=False)
+            self.schedule_next_refresh()
+            self.show_job_error(name, error)
+        
+        def cancelled(name):
+            self.scheduler.finish(name)
+            self.schedule_next_refresh()
+            self.statusBar().showMessage(f"{name} cancelled", 5000)
+        
+        self.jobs.submit(source, fn,
+                         on_finished=finished,
+                         on_failed=failed,
+                         on_progress=self.show_job_progress,
+                         on_cancelled=cancelled)
+        return True
+    
+    def show_job_progress(self, name, percent, message):
+        """Show background job progress in the status bar."""
+        self.statusBar().showMessage(f"{message} ({percent}%)" if message else f"{name}: {percent}%")
+    
+    def show_job_error(self, name, error):
+        """Report an unexpected background job failure."""
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Error", f"An unexpected error occurred in {name}: {error}")
+    
+    def submit_job(self, name, fn, on_finished, *args, on_event=None, finish_on_cancel=False):
+        """
+        Submit a background job with the window's standard progress and error handling.
+        
+        :param name: Unique job name
+        :param fn: Callable run as ``fn(job, *args)`` on a worker thread
+        :param on_finished: GUI-thread callback receiving (name, result)
+        :param on_event: Optional GUI-thread callback receiving (name, event)
+        :param finish_on_cancel: Report the job's result even if it was cancelled
+        """
+        return self.jobs.submit(name, fn, *args,
+                                on_finished=on_finished,
+                                on_failed=self.show_job_error,
+                                on_progress=self.show_job_progress,
+                                on_cancelled=lambda job_name: self.statusBar().showMessage(
+                                    f"{job_name} cancelled", 5000),
+                                on_event=on_event,
+                                finish_on_cancel=finish_on_cancel)
+    
+    def refresh_pending_updates(self, force=False):
+        """
+        Refresh pending Windows updates.
+        
+        :param force: Scan even if the cached scan is still fresh
+        """
+        def check_updates(job):
+            job.report_progress(0, "Checking for updates")
+            found = 0
             
-            # Check for updates
-            updates_info = update_tracker.check_pending_updates()
+            def on_record(record):
+                # Raising JobCancelled here stops the running scan
+                nonlocal found
+                job.check_cancelled()
+                found += 1
+                job.report_progress(0, f"Checking for updates: {found} found")
             
+            return self.updates_cache.get(force=force, on_record=on_record)
+        
+        if not self.submit_scheduled('pending_updates', check_updates, self.on_pending_updates_ready,
+                                     fingerprint=lambda result: tuple(result['pending_updates'])):
+            self.statusBar().showMessage("An update check is already running", 5000)
+    
+    def cancel_pending_updates_check(self):
+        """Cancel a running pending updates check and discard its result."""
+        if self.jobs.cancel('pending_updates'):
+            self.statusBar().showMessage("Cancelling update check...")
+    
+    def on_pending_updates_ready(self, name, updates_info):
+        """Populate the pending updates table from a completed check."""
+        self.statusBar().clearMessage()
+        try:
             if updates_info['status'] == 'success':
-                pending_updates = updates_info.get('pending_updates', [])
+                generation = updates_info['generation']
+                if updates_info.get('cached'):
+                    self.statusBar().showMessage("Showing cached update scan", 5000)
                 
-                # Populate table
-                self.pending_updates_table.setRowCount(len(pending_updates))
-                for row, update in enumerate(pending_updates):
-                    self.pending_updates_table.setItem(row, 0, QTableWidgetItem(str(update)))
-                    self.pending_updates_table.setItem(row, 1, QTableWidgetItem("Pending"))
+                if generation == self.shown_updates_generation + 1:
+                    # Next scan in sequence: apply only its changes
+                    self.apply_pending_updates_diff(updates_info['added'], updates_info['removed'])
+                elif generation != self.shown_updates_generation:
+                    # Missed a scan: rebuild the table
+                    self.pending_updates_table.setRowCount(0)
+                    self.apply_pending_updates_diff(updates_info['pending_updates'], [])
+                self.shown_updates_generation = generation
             else:
                 QMessageBox.warning(self, "Update Check Error", 
                                     f"Failed to check updates: {updates_info.get('message', 'Unknown error')}")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An unexpected error occurred: {str(e)}")
     
+    def apply_pending_updates_diff(self, added, removed):
+        """
+        Update the pending updates table in place.
+        
+        :param added: Update titles to append
+        :param removed: Update titles to remove
+        """
+        removed = set(removed)
+        if removed:
+            for row in range(self.pending_updates_table.rowCount() - 1, -1, -1):
+                item = self.pending_updates_table.item(row, 0)
+                if item is not None and item.text() in removed:
+                    self.pending_updates_table.removeRow(row)
+        
+        for update in added:
+            row = self.pending_updates_table.rowCount()
+            self.pending_updates_table.insertRow(row)
+            self.pending_updates_table.setItem(row, 0, QTableWidgetItem(str(update)))
+            self.pending_updates_table.setItem(row, 1, QTableWidgetItem("Pending"))
+    
     def install_selected_updates(self):
-        """Install selected Windows updates."""
+        """Install selected Windows updates (all listed updates if none are selected)."""
         try:
-            # Get selected updates
+            # Get selected updates (read on the GUI thread before starting the job)
             selected_rows = self.pending_updates_table.selectionModel().selectedRows()
-            updates_to_install = []
-            
-            for row in selected_rows:
-                update_name = self.pending_updates_table.item(row.row(), 0).text()
-                updates_to_install.append(update_name)
+            rows = [index.row() for index in selected_rows] or range(self.pending_updates_table.rowCount())
+            updates_to_install = [self.pending_updates_table.item(row, 0).text() for row in rows]
             
-            # Install updates
-            result = update_tracker.install_updates(updates_to_install)
-            
-            if result['status'] == 'success':
-                QMessageBox.information(self, "Update Installation", 
-                                        f"Updates installed successfully: {result.get('output', '')}")
-            else:
-                QMessageBox.warning(self, "Update Installation Error", 
-                                    f"Failed to install updates: {result.get('error', 'Unknown error')}")
+            if not updates_to_install:
+                QMessageBox.information(self, "Update Installation", "There are no updates to install.")
+                return
             
-            # Refresh updates list
-            self.refresh_pending_updates()
+            self.start_install_run(updates=updates_to_install)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An unexpected error occurred: {str(e)}")
     
+    def start_install_run(self, updates=None, run_id=None):
+        """
+        Run a new install run, or resume an unfinished one, in the background.
+        
+        :param updates: Updates for a new run
+        :param run_id: Unfinished run to resume
+        """
+        def install(job):
+            job.report_progress(0, "Installing updates")
+            return self.install_pipeline.run(updates, run_id,
+                                             on_event=job.report_event,
+                                             should_stop=job.is_cancelled)
+        
+        # A stopped run returns an 'interrupted' summary that is worth showing
+        self.submit_job('install_updates', install, self.on_install_finished,
+                        on_event=self.on_install_event, finish_on_cancel=True)
+    
+    def offer_install_resume(self):
+        """Ask whether to finish an install run that did not complete."""
+        run_id = self.install_pipeline.resumable_run()
+        if run_id is None:
+            return
+        
+        remaining = [item['update_name'] for item in self.install_pipeline.run_items(run_id)
+                     if item['state'] not in (DONE, FAILED)]
+        answer = QMessageBox.question(
+            self, "Resume Update Installation",
+            f"A previous update installation did not finish ({len(remaining)} update(s) remaining). "
+            "Resume it now?"
+        )
+        if answer == QMessageBox.Yes:
+            self.start_install_run(run_id=run_id)
+        else:
+            self.install_pipeline.abandon_run(run_id)
+    
+    def stop_install(self):
+        """Stop a running installation once the current update finishes; it can be resumed later."""
+        if self.jobs.cancel('install_updates'):
+            self.statusBar().showMessage("Stopping update installation after the current update...")
+    
+    def on_install_event(self, name, event):
+        """Show per-update install progress in the pending updates table and status bar."""
+        if event['type'] == 'output':
+            self.statusBar().showMessage(f"{event['update']}: {event['line']}")
+            return
+        
+        for row in range(self.pending_updates_table.rowCount()):
+            if self.pending_updates_table.item(row, 0).text() == event['update']:
+                self.pending_updates_table.setItem(row, 1, QTableWidgetItem(event['state'].capitalize()))
+                break
+        
+        total = event['total'] or 1
+        self.show_job_progress(name, int(event['completed'] * 100 / total),
+                               f"{event['update']}: {event['state']}")
+    
+    def on_install_finished(self, name, result):
+        """Report the outcome of an update installation."""
+        self.statusBar().clearMessage()
+        if result['status'] == 'success':
+            QMessageBox.information(self, "Update Installation", 
+                                    f"{len(result['installed'])} update(s) installed successfully.")
+        elif result['status'] == 'interrupted':
+            failures = ''.join(f"\n{update}: {message}"
+                               for update, message in result.get('failed', {}).items())
+            QMessageBox.information(
+                self, "Update Installation Stopped",
+                f"{len(result['installed'])} update(s) installed, {len(result['failed'])} failed, "
+                f"{len(result['remaining'])} remaining.{failures}\n\n"
+                "The remaining updates will be offered for installation the next time the "
+                "application starts."
+            )
+        else:
+            failures = '\n'.join(f"{update}: {message}"
+                                  for update, message in result.get('failed', {}).items())
+            QMessageBox.warning(self, "Update Installation Error", 
+                                f"Failed to install updates:\n{failures or result.get('message', 'Unknown error')}")
+        
+        # Refresh updates list (the cached scan is now out of date)
+        self.updates_cache.invalidate()
+        self.refresh_pending_updates()
+    
     def rollback_updates(self):
         """Rollback recent Windows updates."""
-        try:
-            result = update_tracker.rollback_updates()
-            
-            if result['status'] == 'success':
-                QMessageBox.information(self, "Update Rollback", 
-                                        f"Updates rolled back successfully: {result.get('output', '')}")
-            else:
-                QMessageBox.warning(self, "Update Rollback Error", 
-                                    f"Failed to rollback updates: {result.get('error', 'Unknown error')}")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An unexpected error occurred: {str(e)}")
+        def rollback(job):
+            job.report_progress(0, "Rolling back last update")
+            return update_tracker.rollback_updates()
+        
+        self.submit_job('rollback_updates', rollback, self.on_rollback_finished)
+    
+    def on_rollback_finished(self, name, result):
+        """Report the outcome of an update rollback."""
+        self.statusBar().clearMessage()
+        self.updates_cache.invalidate()
+        # Only the end of the output is shown; the rest stays in the database
+        output_note = ''
+        if result.get('output_id') is not None:
+            output_note = (f"\n\nFull output saved as #{result['output_id']} "
+                           f"(python -m collector output {result['output_id']})")
+        if result['status'] == 'success':
+            QMessageBox.information(self, "Update Rollback", 
+                                    f"Updates rolled back successfully: {result.get('output', '')}{output_note}")
+        else:
+            error = result.get('error') or result.get('message', 'Unknown error')
+            QMessageBox.warning(self, "Update Rollback Error", 
+                                f"Failed to rollback updates: {error}{output_note}")
+    
+    def check_install_regressions(self):
+        """Compare device health before and after recent installs."""
+        def check(job):
+            job.report_progress(0, "Checking health after recent installs")
+            return self.rollback_policy.run()
+        
+        self.submit_job('check_install_regressions', check, self.on_regression_check_finished)
+    
+    def on_regression_check_finished(self, name, result):
+        """Report installs that degraded device health."""
+        self.statusBar().clearMessage()
+        if result['status'] == 'error':
+            QMessageBox.warning(self, "Regression Check Error",
+                                f"Failed to check installs: {result.get('message', 'Unknown error')}")
+            return
+        
+        if not result['regressions']:
+            self.statusBar().showMessage(f"{result['checked']} install(s) checked, no regressions", 5000)
+            return
+        
+        lines = [f"{finding['update_name']}: {', '.join(finding['regressed'])} "
+                 f"({(finding['action'] or 'flagged').replace('_', ' ')})"
+                 for finding in result['regressions']]
+        QMessageBox.warning(self, "Install Regressions",
+                            "Device health degraded after these updates:\n" + '\n'.join(lines))
+        if any(finding['action'] == 'rolled_back' for finding in result['regressions']):
+            self.updates_cache.invalidate()
+            self.refresh_pending_updates()
     
     def refresh_device_health(self):
         """Refresh device health and configuration information."""
-        try:
-            # Get system health
+        # Health and configuration are independent and run concurrently.
+        # A manual refresh bypasses the configuration cache.
+        self.refresh_system_health()
+        self.refresh_device_config(force=True)
+    
+    def refresh_system_health(self):
+        """Sample system health and log it."""
+        def collect_health(job):
+            job.report_progress(0, "Collecting system health")
             health_info = device_health_monitor.get_system_health()
+            job.check_cancelled()
             
-            # Display system health
-            health_text = f"""
+            # Log device health to database and the in-memory history
+            db_manager.log_device_health(health_info)
+            self.health_history.append(health_info)
+            return health_info
+        
+        self.submit_scheduled('system_health', collect_health, self.on_system_health_ready)
+    
+    def refresh_device_config(self, force=False):
+        """Collect the device configuration (served from its cache unless stale or forced)."""
+        def collect_config(job):
+            job.report_progress(0, "Collecting device configuration")
+            return device_health_monitor.get_device_configuration(force=force)
+        
+        self.submit_scheduled('device_config', collect_config, self.on_device_config_ready,
+                              fingerprint=lambda config: tuple(sorted((key, str(value))
+                                                                      for key, value in config.items())))
+    
+    def on_system_health_ready(self, name, health_info):
+        """Display collected system health."""
+        self.statusBar().clearMessage()
+        health_text = f"""
             CPU Usage: {health_info.get('cpu_usage', 'N/A')}%
             Memory Usage: {health_info.get('memory_usage', 'N/A')}%
             Disk Health: {health_info.get('disk_health', 'N/A')}
             Overall Status: {health_info.get('status', 'Unknown')}
             """
-            self.system_health_text.setText(health_text)
-            
-            # Log device health to database
-            db_manager.log_device_health(health_info)
-            
-            # Get device configuration
-            config_info = device_health_monitor.get_device_configuration()
-            
-            # Display device configuration
-            config_text = f"""
+        self.system_health_text.setText(health_text)
+        self.update_health_chart()
+    
+    def on_health_window_changed(self, index):
+        """Show another window of health history."""
+        self.health_chart.set_window(self.health_window_combo.itemData(index))
+        self.update_health_chart()
+    
+    def update_health_chart(self):
+        """Redraw the health chart and its window statistics."""
+        stats = self.health_history.buffer().window_stats(self.health_chart.window)
+        if stats['cpu']['count']:
+            self.health_stats_label.setText(
+                f"{stats['cpu']['count']} samples — CPU avg {stats['cpu']['mean']:.1f}% "
+                f"(max {stats['cpu']['max']:.1f}%), memory avg {stats['memory']['mean']:.1f}% "
+                f"(max {stats['memory']['max']:.1f}%)")
+        else:
+            self.health_stats_label.setText("No samples in this window")
+        self.health_chart.update()
+    
+    def on_device_config_ready(self, name, config_info):
+        """Display collected device configuration."""
+        self.statusBar().clearMessage()
+        config_text = f"""
             OS Version: {config_info.get('os_version', 'N/A')}
             OS Name: {config_info.get('os_name', 'N/A')}
             Hostname: {config_info.get('hostname', 'N/A')}
@@ -225,33 +757,26 @@ class AutoPatchGuardianApp(QMainWindow):
             Total Memory: {config_info.get('total_memory', 'N/A')}
             Storage Info: {config_info.get('storage_info', 'N/A')}
             """
-            self.device_config_text.setText(config_text)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to refresh device health: {str(e)}")
+        self.device_config_text.setText(config_text)
     
     def refresh_update_logs(self):
-        """Refresh update logs from the database."""
-        try:
-            # Fetch recent device health logs
-            health_logs = db_manager.get_recent_device_health(10)
-            
-            # Clear existing table
-            self.update_logs_table.setRowCount(0)
-            
-            # Populate logs table
-            for row, log in enumerate(health_logs):
-                self.update_logs_table.insertRow(row)
-                self.update_logs_table.setItem(row, 0, QTableWidgetItem(str(log.get('timestamp', 'N/A'))))
-                self.update_logs_table.setItem(row, 1, QTableWidgetItem('System Health Check'))
-                self.update_logs_table.setItem(row, 2, QTableWidgetItem(str(log.get('status', 'N/A'))))
-                
-                # Combine health details
-                details = (f"CPU: {log.get('cpu_usage', 'N/A')}%, "
-                           f"Memory: {log.get('memory_usage', 'N/A')}%, "
-                           f"Disk: {log.get('disk_health', 'N/A')}")
-                self.update_logs_table.setItem(row, 3, QTableWidgetItem(details))
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to refresh update logs: {str(e)}")
+        """Refresh the log view if new rows were logged."""
+        table = self.current_log_model().table
+        
+        def newest_row(job):
+            # Flushes buffered rows here, off the GUI thread; the model reads without flushing
+            rows = db_manager.fetch_log_page(table, 'id', limit=1)
+            return (table, rows[0][0] if rows else None)
+        
+        self.submit_scheduled('update_logs', newest_row, self.on_newest_log_row,
+                              fingerprint=lambda key: key)
+    
+    def on_newest_log_row(self, name, key):
+        """Reload the log view when its table has new rows."""
+        if key != self.shown_log_key and key[0] == self.current_log_model().table:
+            # The model pages rows in lazily; a reset only reloads the first page
+            self.current_log_model().refresh()
+            self.shown_log_key = key
 
 def main():
     """
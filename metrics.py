@@ -0,0 +1,408 @@
+import bisect
+import functools
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds; spans SQLite calls to update installs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+DEFAULT_METRICS_PORT = 9464
+
+
+class OperationStats:
+    """Latency histogram, counts, errors and in-flight gauge for one operation."""
+    __slots__ = ('buckets', 'bucket_counts', 'count', 'errors', 'total', 'in_flight')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.in_flight = 0
+
+    def observe(self, seconds: float, failed: bool):
+        self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if failed:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a latency quantile by interpolating within its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.bucket_counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index >= len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def copy(self) -> 'OperationStats':
+        stats = OperationStats(self.buckets)
+        stats.bucket_counts = list(self.bucket_counts)
+        stats.count = self.count
+        stats.errors = self.errors
+        stats.total = self.total
+        stats.in_flight = self.in_flight
+        return stats
+
+
+class _Timer:
+    """Context manager that records one operation into its stats."""
+    __slots__ = ('registry', 'stats', 'started')
+
+    def __init__(self, registry: 'MetricsRegistry', stats: OperationStats):
+        self.registry = registry
+        self.stats = stats
+
+    def __enter__(self):
+        with self.registry.lock:
+            self.stats.in_flight += 1
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        with self.registry.lock:
+            self.stats.in_flight -= 1
+            # A closed stream (GeneratorExit) was abandoned, not failed
+            self.stats.observe(elapsed, exc_type is not None and exc_type is not GeneratorExit)
+        return False
+
+
+class _NullTimer:
+    """Shared no-op timer used while metrics are disabled."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """
+    Process-wide operation metrics keyed by (component, operation).
+    Disabled by default; while disabled every hook is a flag check.
+    """
+    def __init__(self, enabled: bool = False, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Initialize the registry.
+
+        :param enabled: Start recording immediately
+        :param buckets: Histogram bucket upper bounds in seconds
+        """
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], OperationStats] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Drop all recorded metrics."""
+        with self.lock:
+            self._stats.clear()
+
+    def _get(self, component: str, operation: str) -> OperationStats:
+        key = (component, operation)
+        stats = self._stats.get(key)
+        if stats is None:
+            with self.lock:
+                stats = self._stats.setdefault(key, OperationStats(self.buckets))
+        return stats
+
+    def timer(self, component: str, operation: str):
+        """
+        Time a block: ``with registry.timer('db', 'flush'): ...``.
+        Exceptions escaping the block are counted as errors.
+
+        :param component: Subsystem, e.g. 'db' or 'powershell'
+        :param operation: Operation within the component
+        :return: Context manager
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, self._get(component, operation))
+
+    def record_error(self, component: str, operation: str):
+        """Count an error that was handled without raising (e.g. a logged sqlite3.Error)."""
+        if not self.enabled:
+            return
+        stats = self._get(component, operation)
+        with self.lock:
+            stats.errors += 1
+
+    def timed_iterator(self, component: str, operation: str, iterator: Iterator) -> Iterator:
+        """
+        Time a streaming operation from the first ``next()`` until the
+        iterator is exhausted, fails or is closed.
+
+        :return: The iterator itself while disabled, otherwise a timing wrapper
+        """
+        if not self.enabled:
+            return iterator
+        return self._timed_iterator(component, operation, iterator)
+
+    def _timed_iterator(self, component, operation, iterator):
+        with self.timer(component, operation):
+            try:
+                yield from iterator
+            finally:
+                close = getattr(iterator, 'close', None)
+                if close:
+                    close()
+
+    def snapshot(self) -> Dict[Tuple[str, str], OperationStats]:
+        """
+        Return a consistent copy of all operation stats.
+
+        :return: (component, operation) -> stats copy
+        """
+        with self.lock:
+            return {key: stats.copy() for key, stats in self._stats.items()}
+
+    def to_prometheus(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        :return: Exposition text
+        """
+        snapshot = sorted(self.snapshot().items())
+        lines = [
+            '# HELP autopatch_operation_duration_seconds Latency of instrumented operations.',
+            '# TYPE autopatch_operation_duration_seconds histogram',
+        ]
+        for (component, operation), stats in snapshot:
+            labels = f'component="{_escape(component)}",operation="{_escape(operation)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(stats.buckets, stats.bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'autopatch_operation_duration_seconds_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'autopatch_operation_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f'autopatch_operation_duration_seconds_sum{{{labels}}} {stats.total!r}')
+            lines.append(f'autopatch_operation_duration_seconds_count{{{labels}}} {stats.count}')
+
+        lines.append('# HELP autopatch_operation_errors_total Failed instrumented operations.')
+        lines.append('# TYPE autopatch_operation_errors_total counter')
+        for (component, operation), stats in snapshot:
+            lines.append(f'autopatch_operation_errors_total{{component="{_escape(component)}",'
+                         f'operation="{_escape(operation)}"}} {stats.errors}')
+
+        lines.append('# HELP autopatch_operation_in_flight Instrumented operations currently running.')
+        lines.append('# TYPE autopatch_operation_in_flight gauge')
+        for (component, operation), stats in snapshot:
+            lines.append(f'autopatch_operation_in_flight{{component="{_escape(component)}",'
+                         f'operation="{_escape(operation)}"}} {stats.in_flight}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Shared registry; set AUTOPATCH_METRICS=1 to record from start-up
+registry = MetricsRegistry(enabled=os.environ.get('AUTOPATCH_METRICS', '') not in ('', '0'))
+
+
+def instrumented(component: str, operation: Optional[str] = None) -> Callable:
+    """
+    Decorator that times every call of a function with the shared registry.
+    Calls that raise, or return an ``{'status': 'error'}`` dictionary, count as errors.
+
+    :param component: Subsystem name
+    :param operation: Operation name (defaults to the function name)
+    """
+    def decorate(fn):
+        name = operation or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            with registry.timer(component, name):
+                result = fn(*args, **kwargs)
+            if isinstance(result, dict) and result.get('status') == 'error':
+                registry.record_error(component, name)
+            return result
+        return wrapper
+    return decorate
+
+
+class MetricsServer:
+    """
+    Serves the registry as Prometheus text on ``/metrics`` from a
+    background thread, bound to localhost by default.
+    """
+    def __init__(self, metrics: MetricsRegistry = None, host: str = '127.0.0.1',
+                 port: int = DEFAULT_METRICS_PORT):
+        """
+        :param metrics: Registry to export (defaults to the shared registry)
+        :param host: Interface to bind
+        :param port: TCP port (0 picks a free port)
+        """
+        self.metrics = metrics or registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self) -> int:
+        """
+        Start serving.
+
+        :return: Port the server is listening on
+        """
+        # Imported here so instrumented modules don't pay for it at import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='metrics-server', daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class MetricsSnapshotter:
+    """
+    Periodically writes registry snapshots (cumulative counts and
+    estimated latency percentiles) to a ``metrics`` table.
+    """
+    def __init__(self, db=None, metrics: MetricsRegistry = None):
+        """
+        :param db: DatabaseManager to write to (defaults to the shared manager)
+        :param metrics: Registry to snapshot (defaults to the shared registry)
+        """
+        if db is None:
+            from database import get_db_manager
+            db = get_db_manager()
+
+        self.db = db
+        self.metrics = metrics or registry
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._create_table()
+
+    def _create_table(self):
+        with self.db.lock, self.db.conn:
+            cursor = self.db.conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS metrics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME NOT NULL,
+                    component TEXT NOT NULL,
+                    operation TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    errors INTEGER NOT NULL,
+                    in_flight INTEGER NOT NULL,
+                    total_seconds REAL NOT NULL,
+                    p50_seconds REAL,
+                    p95_seconds REAL,
+                    p99_seconds REAL
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_metrics_operation_timestamp
+                ON metrics (component, operation, timestamp)
+            ''')
+
+    def write_snapshot(self) -> int:
+        """
+        Store the current value of every operation.
+
+        :return: Number of rows written
+        """
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        rows = [
+            (timestamp, component, operation, stats.count, stats.errors, stats.in_flight,
+             stats.total, stats.quantile(0.50), stats.quantile(0.95), stats.quantile(0.99))
+            for (component, operation), stats in sorted(self.metrics.snapshot().items())
+        ]
+        if not rows:
+            return 0
+        try:
+            with self.db.lock, self.db.conn:
+                self.db.conn.executemany('''
+                    INSERT INTO metrics
+                        (timestamp, component, operation, count, errors, in_flight,
+                         total_seconds, p50_seconds, p95_seconds, p99_seconds)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+        except sqlite3.Error as e:
+            print(f"Database error when storing metrics snapshot: {e}")
+            return 0
+        return len(rows)
+
+    def start(self, interval: float = 60.0):
+        """
+        Write snapshots periodically on a background thread.
+
+        :param interval: Seconds between snapshots
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+
+        def loop():
+            while not self._stop_event.wait(interval):
+                self.write_snapshot()
+
+        self._thread = threading.Thread(target=loop, name='metrics-snapshots', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop periodic snapshots, writing a final one."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+            self.write_snapshot()
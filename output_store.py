@@ -0,0 +1,333 @@
+import collections
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Output streams stored per operation
+STDOUT = 'out'
+STDERR = 'err'
+
+# Characters of output written per database chunk
+DEFAULT_CHUNK_CHARS = 64 * 1024
+
+
+class OutputStore:
+    """
+    Stores the full output of long-running script actions (installs,
+    rollbacks) in the database, split into fixed-size chunks so neither
+    writing nor reading it back needs the whole output in memory.
+    """
+    def __init__(self, db=None):
+        """
+        Initialize the output store and create its tables.
+
+        :param db: DatabaseManager to store output in (defaults to the shared manager)
+        """
+        if db is None:
+            from database import get_db_manager
+            db = get_db_manager()
+
+        self.db = db
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create the operation and output chunk tables."""
+        with self.db.write_cursor() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS operation_outputs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    operation TEXT NOT NULL,
+                    subject TEXT,
+                    device_id TEXT,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    chars INTEGER NOT NULL DEFAULT 0,
+                    lines INTEGER NOT NULL DEFAULT 0,
+                    started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    finished_at DATETIME
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS operation_output_chunks (
+                    output_id INTEGER NOT NULL REFERENCES operation_outputs (id),
+                    seq INTEGER NOT NULL,
+                    stream TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (output_id, seq)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_operation_outputs_started
+                ON operation_outputs (started_at)
+            ''')
+
+    def begin(self, operation: str, subject: Optional[str] = None,
+              device_id: Optional[str] = None) -> Optional[int]:
+        """
+        Register a new operation.
+
+        :param operation: Action name, e.g. 'update_manager.InstallUpdate'
+        :param subject: What the action ran on, e.g. a KB id
+        :param device_id: Device the action ran on (defaults to this machine)
+        :return: Output id, or None if it could not be stored
+        """
+        if device_id is None:
+            from database import LOCAL_DEVICE_ID
+            device_id = LOCAL_DEVICE_ID
+        try:
+            with self.db.write_cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO operation_outputs (operation, subject, device_id) VALUES (?, ?, ?)
+                ''', (operation, subject, device_id))
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Database error when registering output of {operation}: {e}")
+            return None
+
+    def append(self, output_id: int, seq: int, stream: str, data: str, lines: int):
+        """
+        Store one chunk of output.
+
+        :param output_id: Output id from ``begin``
+        :param seq: Chunk sequence number
+        :param stream: STDOUT or STDERR
+        :param data: Chunk text
+        :param lines: Number of lines in the chunk
+        """
+        try:
+            with self.db.write_cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO operation_output_chunks (output_id, seq, stream, data)
+                    VALUES (?, ?, ?, ?)
+                ''', (output_id, seq, stream, data))
+                cursor.execute('''
+                    UPDATE operation_outputs SET chars = chars + ?, lines = lines + ? WHERE id = ?
+                ''', (len(data), lines, output_id))
+        except sqlite3.Error as e:
+            print(f"Database error when storing output chunk: {e}")
+
+    def finish(self, output_id: int, status: str):
+        """
+        Record how an operation ended.
+
+        :param output_id: Output id from ``begin``
+        :param status: Final status ('success', 'error', 'timeout')
+        """
+        try:
+            with self.db.write_cursor() as cursor:
+                cursor.execute('''
+                    UPDATE operation_outputs SET status = ?, finished_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (status, output_id))
+        except sqlite3.Error as e:
+            print(f"Database error when finishing output: {e}")
+
+    def get(self, output_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Describe a stored operation.
+
+        :param output_id: Output id
+        :return: Operation details, or None if unknown
+        """
+        columns = ('id', 'operation', 'subject', 'device_id', 'status', 'chars', 'lines',
+                   'started_at', 'finished_at')
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT {', '.join(columns)} FROM operation_outputs WHERE id = ?
+                ''', (output_id,))
+                row = cursor.fetchone()
+        except sqlite3.Error as e:
+            print(f"Database error when reading output details: {e}")
+            return None
+        return dict(zip(columns, row)) if row else None
+
+    def iter_chunks(self, output_id: int, stream: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Read stored output back one chunk at a time, in the order it was produced.
+
+        :param output_id: Output id
+        :param stream: Only this stream, or None for both
+        :return: Iterator of (stream, text) chunks
+        """
+        seq = -1
+        while True:
+            conditions, params = ['output_id = ?', 'seq > ?'], [output_id, seq]
+            if stream is not None:
+                conditions.append('stream = ?')
+                params.append(stream)
+            try:
+                with self.db.read_cursor() as cursor:
+                    cursor.execute(f'''
+                        SELECT seq, stream, data FROM operation_output_chunks
+                        WHERE {' AND '.join(conditions)}
+                        ORDER BY seq LIMIT 16
+                    ''', params)
+                    rows = cursor.fetchall()
+            except sqlite3.Error as e:
+                print(f"Database error when reading output: {e}")
+                return
+            if not rows:
+                return
+            for seq, chunk_stream, data in rows:
+                yield chunk_stream, data
+
+    def read(self, output_id: int, stream: Optional[str] = STDOUT,
+             max_chars: Optional[int] = None) -> str:
+        """
+        Read stored output as text.
+
+        :param output_id: Output id
+        :param stream: Only this stream, or None for both
+        :param max_chars: Stop after this many characters
+        :return: Output text
+        """
+        parts, total = [], 0
+        for _, data in self.iter_chunks(output_id, stream):
+            if max_chars is not None and total + len(data) >= max_chars:
+                parts.append(data[:max_chars - total])
+                break
+            parts.append(data)
+            total += len(data)
+        return ''.join(parts)
+
+    def prune(self, max_age_days: float = 90) -> int:
+        """
+        Delete output of operations that started more than ``max_age_days`` ago.
+
+        :param max_age_days: Age in days
+        :return: Number of operations deleted
+        """
+        try:
+            with self.db.write_cursor() as cursor:
+                cursor.execute('''
+                    SELECT id FROM operation_outputs
+                    WHERE started_at < datetime('now', ?)
+                ''', (f'-{float(max_age_days)} days',))
+                ids = [(row[0],) for row in cursor.fetchall()]
+                cursor.executemany('DELETE FROM operation_output_chunks WHERE output_id = ?', ids)
+                cursor.executemany('DELETE FROM operation_outputs WHERE id = ?', ids)
+            return len(ids)
+        except sqlite3.Error as e:
+            print(f"Database error when pruning stored output: {e}")
+            return 0
+
+
+class OutputCapture:
+    """
+    Collects an operation's output line by line. Memory stays bounded:
+    only the last lines of each stream are kept, and the full output is
+    written to the ``OutputStore`` a chunk at a time.
+    """
+    def __init__(self, store: Optional[OutputStore], operation: str, subject: Optional[str] = None,
+                 device_id: Optional[str] = None, chunk_chars: int = DEFAULT_CHUNK_CHARS,
+                 tail_lines: int = 100, tail_chars: int = 16 * 1024):
+        """
+        :param store: Store for the full output, or None to keep only the tail
+        :param operation: Action name
+        :param subject: What the action ran on
+        :param device_id: Device the action ran on
+        :param chunk_chars: Characters buffered before a chunk is written
+        :param tail_lines: Lines kept in memory per stream
+        :param tail_chars: Characters kept in memory per stream
+        """
+        self.store = store
+        self.output_id = store.begin(operation, subject, device_id) if store is not None else None
+        self.chunk_chars = chunk_chars
+        self.tail_chars = tail_chars
+        self.lines = 0
+        self.truncated = False
+
+        self._tails = {STDOUT: collections.deque(maxlen=tail_lines),
+                       STDERR: collections.deque(maxlen=tail_lines)}
+        self._tail_sizes = {STDOUT: 0, STDERR: 0}
+        self._chunk = []
+        self._chunk_size = 0
+        self._chunk_stream = STDOUT
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def add(self, line: str, stream: str = STDOUT):
+        """
+        Record one line of output.
+
+        :param line: Line without its line ending
+        :param stream: STDOUT or STDERR
+        """
+        with self._lock:
+            self.lines += 1
+            tail = self._tails[stream]
+            if len(tail) == tail.maxlen:
+                self._tail_sizes[stream] -= len(tail[0])
+                self.truncated = True
+            tail.append(line)
+            self._tail_sizes[stream] += len(line)
+            while self._tail_sizes[stream] > self.tail_chars and len(tail) > 1:
+                self._tail_sizes[stream] -= len(tail.popleft())
+                self.truncated = True
+
+            if self.output_id is None:
+                return
+            if stream != self._chunk_stream:
+                self._write_chunk()
+                self._chunk_stream = stream
+            self._chunk.append(line)
+            self._chunk_size += len(line) + 1
+            if self._chunk_size >= self.chunk_chars:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        """Store the buffered lines (caller holds the lock)."""
+        if not self._chunk:
+            return
+        self.store.append(self.output_id, self._seq, self._chunk_stream,
+                          '\n'.join(self._chunk) + '\n', len(self._chunk))
+        self._seq += 1
+        self._chunk = []
+        self._chunk_size = 0
+
+    def tail(self, stream: str = STDOUT) -> str:
+        """
+        Last lines of a stream.
+
+        :param stream: STDOUT or STDERR
+        :return: Text of the kept lines
+        """
+        with self._lock:
+            return '\n'.join(self._tails[stream])
+
+    def finish(self, status: str) -> Dict[str, Any]:
+        """
+        Write the remaining output and record the final status.
+
+        :param status: Final status ('success', 'error', 'timeout')
+        :return: Result fields: 'output' and 'error' tails, 'output_id' and
+                 whether the tails are 'truncated'
+        """
+        with self._lock:
+            if self.output_id is not None:
+                self._write_chunk()
+                self.store.finish(self.output_id, status)
+        return {
+            'output': self.tail(STDOUT),
+            'error': self.tail(STDERR),
+            'output_id': self.output_id,
+            'truncated': self.truncated,
+        }
+
+
+# Shared output store, created on first use
+_output_store = None
+_output_store_lock = threading.Lock()
+
+
+def get_output_store() -> OutputStore:
+    """
+    Return the output store on the shared database, creating it on first use.
+
+    :return: Process-wide OutputStore instance
+    """
+    global _output_store
+    with _output_store_lock:
+        if _output_store is None:
+            _output_store = OutputStore()
+        return _output_store
@@ -5,16 +5,30 @@ AutoPatch Guardian Device Information Script
 .DESCRIPTION
 Retrieves system health metrics and device configuration details
 for the AutoPatch Guardian toolkit.
+
+With -Format Json, each result is written as one NDJSON record
+(protocol version 1), e.g.
+    {"v":1,"type":"health","cpu_usage":12,"memory_usage":40.5,"disk_health":"GOOD"}
+The default Pipe format keeps the original pipe-separated output.
 #>
 
 param(
     [Parameter(Mandatory=$false)]
     [ValidateSet('GetSystemHealth', 'GetDeviceConfig')]
-    [string]$Action = 'GetSystemHealth'
+    [string]$Action = 'GetSystemHealth',
+
+    [Parameter(Mandatory=$false)]
+    [ValidateSet('Pipe', 'Json')]
+    [string]$Format = 'Pipe'
 )
 
+# Protocol version of NDJSON records
+$RecordProtocolVersion = 1
+
 # Get System Health Metrics
 function Get-SystemHealth {
+    param([string]$Format = 'Pipe')
+
     try {
         # CPU Usage
         $cpuUsage = (Get-WmiObject Win32_Processor).LoadPercentage
@@ -41,6 +55,19 @@ function Get-SystemHealth {
                 }
             }
 
+        if ($Format -eq 'Json') {
+            # Average across processors on multi-socket machines
+            $cpuAverage = ($cpuUsage | Measure-Object -Average).Average
+            [ordered]@{
+                v = $RecordProtocolVersion
+                type = 'health'
+                cpu_usage = [double]$cpuAverage
+                memory_usage = [double]$memoryUsagePercent
+                disk_health = "$($diskCheck.DiskHealth)"
+            } | ConvertTo-Json -Compress
+            return
+        }
+
         # Output as pipe-separated values
         Write-Output "$cpuUsage|$memoryUsagePercent|$($diskCheck.DiskHealth)"
     }
@@ -52,6 +79,8 @@ function Get-SystemHealth {
 
 # Get Comprehensive Device Configuration
 function Get-DeviceConfiguration {
+    param([string]$Format = 'Pipe')
+
     try {
         # Total Physical Memory
         $memoryInfo = (Get-WmiObject Win32_ComputerSystem).TotalPhysicalMemory / 1GB
@@ -67,6 +96,16 @@ function Get-DeviceConfiguration {
                 }
             }
 
+        if ($Format -eq 'Json') {
+            [ordered]@{
+                v = $RecordProtocolVersion
+                type = 'config'
+                total_memory = "$([math]::Round($memoryInfo, 2)) GB"
+                storage_info = "$($storageInfo.StorageInfo)"
+            } | ConvertTo-Json -Compress
+            return
+        }
+
         # Output as pipe-separated values
         Write-Output "$([math]::Round($memoryInfo, 2)) GB|$($storageInfo.StorageInfo)"
     }
@@ -76,16 +115,33 @@ function Get-DeviceConfiguration {
     }
 }
 
-# Main Script Execution
-switch ($Action) {
-    'GetSystemHealth' {
-        Get-SystemHealth
+# Dispatch a single action (also called by the shell host)
+function Invoke-DeviceInfoAction {
+    param(
+        [string]$Action = 'GetSystemHealth',
+        [string]$Format = 'Pipe'
+    )
+
+    switch ($Action) {
+        'GetSystemHealth' {
+            Get-SystemHealth -Format $Format
+        }
+        'GetDeviceConfig' {
+            Get-DeviceConfiguration -Format $Format
+        }
+        default {
+            throw "Invalid action specified."
+        }
     }
-    'GetDeviceConfig' {
-        Get-DeviceConfiguration
+}
+
+# Main Script Execution (skipped when dot-sourced by the shell host)
+if ($MyInvocation.InvocationName -ne '.') {
+    try {
+        Invoke-DeviceInfoAction -Action $Action -Format $Format
     }
-    default {
-        Write-Error "Invalid action specified."
+    catch {
+        Write-Error $_
         exit 1
     }
 }
\ No newline at end of file
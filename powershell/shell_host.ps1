@@ -0,0 +1,96 @@
+<#
+.SYNOPSIS
+AutoPatch Guardian Shell Host
+
+.DESCRIPTION
+Long-lived worker process for the AutoPatch Guardian toolkit. Loads the
+device information and update management scripts once, then serves
+framed requests read from stdin until the input stream is closed.
+
+Each request is a single JSON line:
+    {"id": 1, "script": "device_info", "action": "GetSystemHealth", "args": {}}
+
+Requests with a "computer" field run the script on that computer through
+PowerShell remoting (Invoke-Command) instead of the local session.
+
+Each response line starts with the frame marker and carries the request id:
+    @@APG@@{"id": 1, "kind": "out", "data": "..."}
+    @@APG@@{"id": 1, "kind": "err", "data": "..."}
+    @@APG@@{"id": 1, "kind": "end", "returncode": 0}
+#>
+
+$FrameMarker = '@@APG@@'
+
+# Load the action scripts once (their main blocks are skipped when dot-sourced)
+. (Join-Path $PSScriptRoot 'device_info.ps1')
+. (Join-Path $PSScriptRoot 'update_manager.ps1')
+
+# Write one framed response line and flush it immediately
+function Write-Frame {
+    param([hashtable]$Frame)
+
+    [Console]::Out.WriteLine($FrameMarker + ($Frame | ConvertTo-Json -Compress))
+    [Console]::Out.Flush()
+}
+
+# Signal that the scripts are loaded and the worker is ready
+Write-Frame @{ id = 0; kind = 'ready' }
+
+# Request loop
+while ($null -ne ($line = [Console]::In.ReadLine())) {
+    if (-not $line.Trim()) {
+        continue
+    }
+
+    $requestId = 0
+    $returnCode = 0
+
+    try {
+        $request = $line | ConvertFrom-Json
+        $requestId = $request.id
+
+        # Build splatted parameters from the request arguments
+        $params = @{ Action = $request.action }
+        if ($request.args) {
+            foreach ($property in $request.args.PSObject.Properties) {
+                $params[$property.Name] = $property.Value
+            }
+        }
+
+        $command = switch ($request.script) {
+            'device_info'    { 'Invoke-DeviceInfoAction' }
+            'update_manager' { 'Invoke-UpdateManagerAction' }
+            default          { throw "Unknown script: $($request.script)" }
+        }
+
+        if ($request.computer) {
+            # Run the script file on the remote computer with the same parameters
+            $scriptText = Get-Content -Raw -Path (Join-Path $PSScriptRoot "$($request.script).ps1")
+            $remoteParams = $params
+            $command = {
+                Invoke-Command -ComputerName $request.computer -ErrorAction Stop -ScriptBlock {
+                    param($Text, $Parameters)
+                    & ([scriptblock]::Create($Text)) @Parameters
+                } -ArgumentList $scriptText, $remoteParams
+            }
+            $params = @{}
+        }
+
+        # Stream output and error records back as they are produced
+        & $command @params 2>&1 | ForEach-Object {
+            if ($_ -is [System.Management.Automation.ErrorRecord]) {
+                $returnCode = 1
+                Write-Frame @{ id = $requestId; kind = 'err'; data = "$_" }
+            }
+            else {
+                Write-Frame @{ id = $requestId; kind = 'out'; data = "$_" }
+            }
+        }
+    }
+    catch {
+        $returnCode = 1
+        Write-Frame @{ id = $requestId; kind = 'err'; data = "$_" }
+    }
+
+    Write-Frame @{ id = $requestId; kind = 'end'; returncode = $returnCode }
+}
@@ -5,20 +5,34 @@ AutoPatch Guardian Update Management Script
 .DESCRIPTION
 Manages Windows Update operations including checking, installing, 
 and rolling back updates for the AutoPatch Guardian toolkit.
+
+With -Format Json, CheckUpdates streams one NDJSON record (protocol
+version 1) per pending update as the scan produces it, e.g.
+    {"v":1,"type":"update","kb":"KB5034441","title":"...","size":"..."}
+
+DownloadUpdate and InstallUpdate handle the single update given by
+-UpdateID (a KB id or a title) and are used by the install pipeline.
 #>
 
 param(
     [Parameter(Mandatory=$false)]
-    [ValidateSet('CheckUpdates', 'InstallUpdates', 'RollbackUpdates')]
+    [ValidateSet('CheckUpdates', 'InstallUpdates', 'RollbackUpdates', 'DownloadUpdate', 'InstallUpdate')]
     [string]$Action = 'CheckUpdates',
 
     [Parameter(Mandatory=$false)]
     [string[]]$Updates = @(),
 
     [Parameter(Mandatory=$false)]
-    [string]$UpdateID = $null
+    [string]$UpdateID = $null,
+
+    [Parameter(Mandatory=$false)]
+    [ValidateSet('Pipe', 'Json')]
+    [string]$Format = 'Pipe'
 )
 
+# Protocol version of NDJSON records
+$RecordProtocolVersion = 1
+
 # Ensure script runs with administrative privileges
 function Verify-AdminRights {
     $currentUser = New-Object Security.Principal.WindowsPrincipal([Security.Principal.WindowsIdentity]::GetCurrent())
@@ -27,10 +41,26 @@ function Verify-AdminRights {
 
 # Check for Pending Windows Updates
 function Get-PendingUpdates {
+    param([string]$Format = 'Pipe')
+
     try {
         # Use Windows Update PowerShell module
         Import-Module PSWindowsUpdate -ErrorAction Stop
 
+        if ($Format -eq 'Json') {
+            # Stream one NDJSON record per update as the scan yields it
+            Get-WindowsUpdate -NotInstalled -ErrorAction Stop | ForEach-Object {
+                [ordered]@{
+                    v = $RecordProtocolVersion
+                    type = 'update'
+                    kb = "$($_.KB)"
+                    title = "$($_.Title)"
+                    size = "$($_.Size)"
+                } | ConvertTo-Json -Compress
+            }
+            return
+        }
+
         # Get list of pending updates
         $pendingUpdates = Get-WindowsUpdate -NotInstalled -ErrorAction Stop
 
@@ -93,25 +123,86 @@ function Rollback-Update {
     }
 }
 
-# Main Script Execution
-if (-not (Verify-AdminRights)) {
-    Write-Error "This script requires administrative privileges."
-    exit 1
+# Select one update by KB article id or by title
+function Get-UpdateSelector {
+    param([string]$Update)
+
+    if ($Update -match '^KB\d+$') {
+        return @{ KBArticleID = $Update }
+    }
+    return @{ Title = [regex]::Escape($Update) }
+}
+
+# Download a single update without installing it (errors terminate the action)
+function Save-SingleUpdate {
+    param([string]$UpdateToDownload)
+
+    Import-Module PSWindowsUpdate -ErrorAction Stop
+    $selector = Get-UpdateSelector -Update $UpdateToDownload
+
+    Get-WindowsUpdate @selector -Download -AcceptAll -ErrorAction Stop | ForEach-Object {
+        Write-Output "Downloaded Update: $($_.KB) - Status: $($_.Result)"
+    }
+}
+
+# Install a single (already downloaded) update; reboots are left to the caller
+function Install-SingleUpdate {
+    param([string]$UpdateToInstall)
+
+    Import-Module PSWindowsUpdate -ErrorAction Stop
+    $selector = Get-UpdateSelector -Update $UpdateToInstall
+
+    $installResults = Install-WindowsUpdate @selector -AcceptAll -IgnoreReboot -ErrorAction Stop
+    $installResults | ForEach-Object {
+        Write-Output "Installed Update: $($_.KB) - Status: $($_.Result)"
+        if ($_.Result -eq 'Failed') {
+            throw "Installation of $UpdateToInstall failed"
+        }
+    }
 }
 
-# Execute requested action
-switch ($Action) {
-    'CheckUpdates' {
-        Get-PendingUpdates
+# Dispatch a single action (also called by the shell host)
+function Invoke-UpdateManagerAction {
+    param(
+        [string]$Action = 'CheckUpdates',
+        [string[]]$Updates = @(),
+        [string]$UpdateID = $null,
+        [string]$Format = 'Pipe'
+    )
+
+    if (-not (Verify-AdminRights)) {
+        throw "This script requires administrative privileges."
     }
-    'InstallUpdates' {
-        Install-SpecificUpdates -UpdatesToInstall $Updates
+
+    switch ($Action) {
+        'CheckUpdates' {
+            Get-PendingUpdates -Format $Format
+        }
+        'InstallUpdates' {
+            Install-SpecificUpdates -UpdatesToInstall $Updates
+        }
+        'RollbackUpdates' {
+            Rollback-Update -UpdateToRollback $UpdateID
+        }
+        'DownloadUpdate' {
+            Save-SingleUpdate -UpdateToDownload $UpdateID
+        }
+        'InstallUpdate' {
+            Install-SingleUpdate -UpdateToInstall $UpdateID
+        }
+        default {
+            throw "Invalid action specified."
+        }
     }
-    'RollbackUpdates' {
-        Rollback-Update -UpdateToRollback $UpdateID
+}
+
+# Main Script Execution (skipped when dot-sourced by the shell host)
+if ($MyInvocation.InvocationName -ne '.') {
+    try {
+        Invoke-UpdateManagerAction -Action $Action -Updates $Updates -UpdateID $UpdateID -Format $Format
     }
-    default {
-        Write-Error "Invalid action specified."
+    catch {
+        Write-Error $_
         exit 1
     }
 }
\ No newline at end of file
@@ -0,0 +1,234 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, Union
+
+# Version of the NDJSON record protocol emitted by the PowerShell scripts
+PROTOCOL_VERSION = 1
+
+_KB_PATTERN = re.compile(r'\bKB\d+\b', re.IGNORECASE)
+
+# Update classifications recognised in titles, checked in order
+_CLASSIFICATIONS = (
+    ('Definition Update', re.compile(r'\b(security intelligence|definition) update\b', re.IGNORECASE)),
+    ('Servicing Stack Update', re.compile(r'\bservicing stack update\b', re.IGNORECASE)),
+    ('Feature Update', re.compile(r'\bfeature update\b', re.IGNORECASE)),
+    ('Cumulative Update', re.compile(r'\bcumulative update\b', re.IGNORECASE)),
+    ('Security Update', re.compile(r'\bsecurity (only )?update\b', re.IGNORECASE)),
+    ('Tool', re.compile(r'\bmalicious software removal tool\b', re.IGNORECASE)),
+    ('Driver', re.compile(r'\bdriver\b|^[^-]+ - [^-]+ - \S+', re.IGNORECASE)),
+    ('Update', re.compile(r'\bupdate\b', re.IGNORECASE)),
+)
+
+
+class ProtocolError(ValueError):
+    """Raised for a script output line that is not a valid record."""
+    def __init__(self, message: str, line_number: int = 0, line: str = ''):
+        location = f"line {line_number}: " if line_number else ''
+        super().__init__(f"{location}{message}: {line[:200]!r}")
+        self.line_number = line_number
+        self.line = line
+
+
+@dataclass(frozen=True)
+class HealthRecord:
+    """System health sample."""
+    __slots__ = ('cpu_usage', 'memory_usage', 'disk_health')
+    cpu_usage: float
+    memory_usage: float
+    disk_health: str
+
+    @property
+    def status(self) -> str:
+        return 'OK' if self.cpu_usage < 80 else 'WARNING'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'cpu_usage': self.cpu_usage,
+            'memory_usage': self.memory_usage,
+            'disk_health': self.disk_health,
+            'status': self.status
+        }
+
+
+@dataclass(frozen=True)
+class ConfigRecord:
+    """Device hardware configuration."""
+    __slots__ = ('total_memory', 'storage_info')
+    total_memory: str
+    storage_info: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_memory': self.total_memory,
+            'storage_info': self.storage_info
+        }
+
+
+@dataclass(frozen=True)
+class UpdateRecord:
+    """Pending Windows update."""
+    __slots__ = ('kb', 'title', 'size')
+    kb: str
+    title: str
+    size: str
+
+
+Record = Union[HealthRecord, ConfigRecord, UpdateRecord]
+
+
+def extract_kb(text: str) -> str:
+    """
+    Find the KB article id in an update title.
+
+    :param text: Update title or identifier
+    :return: Upper-case ``KB...`` id, or '' if there is none
+    """
+    match = _KB_PATTERN.search(text)
+    return match.group(0).upper() if match else ''
+
+
+def classify_update(title: str) -> str:
+    """
+    Classify an update by its title.
+
+    :param title: Update title
+    :return: Classification, e.g. 'Cumulative Update' or 'Driver'; 'Other' if unrecognised
+    """
+    for classification, pattern in _CLASSIFICATIONS:
+        if pattern.search(title):
+            return classification
+    return 'Other'
+
+
+def _build_health(data: Dict[str, Any]) -> HealthRecord:
+    return HealthRecord(
+        float(data.get('cpu_usage') or 0),
+        float(data.get('memory_usage') or 0),
+        str(data.get('disk_health') or 'Unknown')
+    )
+
+
+def _build_config(data: Dict[str, Any]) -> ConfigRecord:
+    return ConfigRecord(
+        str(data.get('total_memory') or 'Unknown'),
+        str(data.get('storage_info') or 'Unknown')
+    )
+
+
+def _build_update(data: Dict[str, Any]) -> UpdateRecord:
+    title = str(data['title'])
+    kb = data.get('kb') or ''
+    if kb and not str(kb).upper().startswith('KB'):
+        kb = f"KB{kb}"
+    return UpdateRecord(str(kb).upper(), title, str(data.get('size') or ''))
+
+
+_BUILDERS = {
+    'health': _build_health,
+    'config': _build_config,
+    'update': _build_update,
+}
+
+_RECORD_CLASSES = {
+    'health': HealthRecord,
+    'config': ConfigRecord,
+    'update': UpdateRecord,
+}
+
+
+def parse_json_record(line: str, line_number: int = 0) -> Record:
+    """
+    Parse one NDJSON record line.
+
+    :param line: Line starting with '{'
+    :param line_number: Line number for error messages
+    :return: Typed record
+    """
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise ProtocolError(f"malformed JSON ({e.args[0]})", line_number, line) from None
+
+    if not isinstance(data, dict):
+        raise ProtocolError("record is not an object", line_number, line)
+
+    version = data.get('v')
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"unsupported protocol version {version!r}", line_number, line)
+
+    builder = _BUILDERS.get(data.get('type'))
+    if builder is None:
+        raise ProtocolError(f"unknown record type {data.get('type')!r}", line_number, line)
+
+    try:
+        return builder(data)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ProtocolError(f"invalid {data['type']} record ({e})", line_number, line) from None
+
+
+def parse_pipe_record(line: str, record_type: str, line_number: int = 0) -> Record:
+    """
+    Parse one line of the legacy pipe-separated output.
+
+    :param line: ``cpu|mem|disk``, ``memory|storage`` or an update title
+    :param record_type: Expected record type ('health', 'config' or 'update')
+    :param line_number: Line number for error messages
+    :return: Typed record
+    """
+    if record_type == 'update':
+        return UpdateRecord(extract_kb(line), line, '')
+
+    fields = line.split('|')
+    try:
+        if record_type == 'health':
+            return HealthRecord(
+                float(fields[0] or 0),
+                float(fields[1] or 0) if len(fields) > 1 else 0.0,
+                (fields[2] if len(fields) > 2 else '') or 'Unknown'
+            )
+        if record_type == 'config':
+            return ConfigRecord(
+                fields[0] or 'Unknown',
+                fields[1] if len(fields) > 1 else 'Unknown'
+            )
+    except ValueError as e:
+        raise ProtocolError(f"invalid pipe-separated {record_type} record ({e})",
+                            line_number, line) from None
+
+    raise ProtocolError(f"unknown record type {record_type!r}", line_number, line)
+
+
+def iter_records(lines: Iterable[str], fallback_type: str) -> Iterator[Record]:
+    """
+    Incrementally parse script output, yielding each record as its line arrives.
+    NDJSON lines are parsed as versioned records; any other non-empty line is
+    parsed with the legacy pipe format for ``fallback_type``.
+
+    :param lines: Output lines (may be a live stream)
+    :param fallback_type: Record type assumed for legacy lines
+    :return: Iterator of typed records
+    """
+    for line_number, raw_line in enumerate(lines, 1):
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            yield parse_json_record(line, line_number)
+        else:
+            yield parse_pipe_record(line, fallback_type, line_number)
+
+
+def parse_single_record(output: str, record_type: str) -> Record:
+    """
+    Parse the first record from the output of a single-record action.
+
+    :param output: Complete script output
+    :param record_type: Expected record type
+    :return: Typed record
+    """
+    for record in iter_records(output.splitlines(), record_type):
+        if type(record) is not _RECORD_CLASSES[record_type]:
+            raise ProtocolError(f"expected a {record_type} record", 0, repr(record))
+        return record
+    raise ProtocolError(f"no {record_type} record in output", 0, output)
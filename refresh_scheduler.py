@@ -0,0 +1,200 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Marks a finish() call that carries no fingerprint
+_NO_FINGERPRINT = object()
+
+
+class RefreshSource:
+    """
+    Schedule state for one refresh source.
+    After a successful run the next one is due after ``current_interval``;
+    after a failure the delay grows exponentially up to ``max_backoff``.
+    Adaptive sources stretch their interval towards ``max_interval`` while
+    results stay unchanged, drop back to ``interval`` when they change, and
+    shorten it towards ``min_interval`` while changes keep coming.
+    """
+    def __init__(self, name: str, interval: float, min_interval: Optional[float] = None,
+                 max_interval: Optional[float] = None, jitter: float = 0.1,
+                 backoff: float = 2.0, max_backoff: Optional[float] = None,
+                 adaptive: bool = False, growth: float = 1.5):
+        """
+        :param name: Source name
+        :param interval: Base seconds between runs
+        :param min_interval: Shortest interval (defaults to ``interval``)
+        :param max_interval: Longest interval for adaptive sources (defaults to 8x ``interval``)
+        :param jitter: Random spread applied to every delay, as a fraction (0.1 = +/-10%)
+        :param backoff: Delay multiplier per consecutive failure
+        :param max_backoff: Longest delay after failures (defaults to ``max_interval``)
+        :param adaptive: Adapt the interval to how often results change
+        :param growth: Interval multiplier per unchanged result
+        """
+        self.name = name
+        self.interval = interval
+        self.min_interval = min_interval if min_interval is not None else interval
+        self.max_interval = max_interval if max_interval is not None else interval * 8
+        self.jitter = jitter
+        self.backoff = backoff
+        self.max_backoff = max_backoff if max_backoff is not None else self.max_interval
+        self.adaptive = adaptive
+        self.growth = growth
+
+        self.current_interval = interval
+        self.failures = 0
+        self.next_due = 0.0
+        self.in_flight = False
+        self.fingerprint = _NO_FINGERPRINT
+
+        self.runs = 0
+        self.coalesced = 0
+        self.changes = 0
+
+    def next_delay(self, rng: random.Random) -> float:
+        """Seconds until the next run, with backoff and jitter applied."""
+        delay = self.current_interval
+        if self.failures:
+            delay = min(self.max_backoff, self.interval * self.backoff ** self.failures)
+        if self.jitter:
+            delay *= 1 + rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, delay)
+
+
+class RefreshScheduler:
+    """
+    Decides when each refresh source runs. Callers ask which sources are
+    ``due()``, call ``begin()`` before starting a run and ``finish()`` when
+    it completes. A trigger for a source that is already running is
+    coalesced into the running one instead of starting duplicate work.
+    The scheduler runs nothing itself, so it can drive GUI jobs as well as
+    a synchronous loop.
+    """
+    def __init__(self, clock: Callable[[], float] = time.monotonic, seed: Optional[int] = None):
+        """
+        :param clock: Monotonic time source
+        :param seed: Seed for the jitter random generator
+        """
+        self.clock = clock
+        self.sources: Dict[str, RefreshSource] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def add_source(self, name: str, interval: float, **options) -> RefreshSource:
+        """
+        Register a refresh source, due immediately.
+
+        :param name: Source name
+        :param interval: Base seconds between runs
+        :param options: Further ``RefreshSource`` settings
+        :return: The source
+        """
+        source = RefreshSource(name, interval, **options)
+        source.next_due = self.clock()
+        with self._lock:
+            self.sources[name] = source
+        return source
+
+    def begin(self, name: str) -> bool:
+        """
+        Mark a source as running, unless it already is.
+
+        :param name: Source name
+        :return: True if the caller should start a run; False if the
+                 trigger was coalesced into the run in flight
+        """
+        with self._lock:
+            source = self.sources[name]
+            if source.in_flight:
+                source.coalesced += 1
+                return False
+            source.in_flight = True
+            return True
+
+    def finish(self, name: str, success: bool = True, fingerprint: Any = _NO_FINGERPRINT) -> bool:
+        """
+        Record the outcome of a run and schedule the next one.
+
+        :param name: Source name
+        :param success: Whether the run succeeded (failures back off)
+        :param fingerprint: Comparable summary of the result, used by adaptive
+                            sources to tell whether anything changed
+        :return: True if the result differs from the previous run's
+        """
+        with self._lock:
+            source = self.sources[name]
+            source.in_flight = False
+            source.runs += 1
+            changed = False
+
+            if not success:
+                source.failures += 1
+            else:
+                source.failures = 0
+                if fingerprint is not _NO_FINGERPRINT:
+                    first = source.fingerprint is _NO_FINGERPRINT
+                    changed = fingerprint != source.fingerprint
+                    if changed and not first:
+                        source.changes += 1
+                    # The first result has nothing to compare against
+                    if source.adaptive and not first:
+                        if changed:
+                            # Back to the base interval; faster still while changes keep coming
+                            if source.current_interval > source.interval:
+                                source.current_interval = source.interval
+                            else:
+                                source.current_interval = max(source.min_interval,
+                                                              source.current_interval / source.growth)
+                        else:
+                            source.current_interval = min(source.max_interval,
+                                                          source.current_interval * source.growth)
+                    source.fingerprint = fingerprint
+
+            source.next_due = self.clock() + source.next_delay(self._rng)
+            return changed
+
+    def due(self) -> List[str]:
+        """
+        Sources whose next run is due and that are not running.
+
+        :return: Source names, most overdue first
+        """
+        now = self.clock()
+        with self._lock:
+            ready = [source for source in self.sources.values()
+                     if not source.in_flight and source.next_due <= now]
+        return [source.name for source in sorted(ready, key=lambda source: source.next_due)]
+
+    def seconds_until_next(self) -> Optional[float]:
+        """
+        Time until the next idle source is due.
+
+        :return: Seconds (0 if one is due now), or None if every source is running
+        """
+        now = self.clock()
+        with self._lock:
+            pending = [source.next_due for source in self.sources.values() if not source.in_flight]
+        if not pending:
+            return None
+        return max(0.0, min(pending) - now)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-source schedule state.
+
+        :return: Source name -> interval, failures, runs, coalesced triggers and changes
+        """
+        now = self.clock()
+        with self._lock:
+            return {
+                name: {
+                    'interval': source.current_interval,
+                    'failures': source.failures,
+                    'in_flight': source.in_flight,
+                    'due_in': max(0.0, source.next_due - now),
+                    'runs': source.runs,
+                    'coalesced': source.coalesced,
+                    'changes': source.changes,
+                }
+                for name, source in self.sources.items()
+            }
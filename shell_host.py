@@ -0,0 +1,526 @@
+import atexit
+import collections
+import itertools
+import json
+import os
+import queue
+import shlex
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional
+
+from metrics import registry as metrics
+
+# Prefix that marks protocol lines on the worker's stdout
+FRAME_MARKER = '@@APG@@'
+
+# Default per-request timeout in seconds
+DEFAULT_REQUEST_TIMEOUT = 600.0
+
+# Longest output line passed on in one piece; longer lines are split
+MAX_LINE_CHARS = 64 * 1024
+
+# Trailing stderr characters kept for error messages
+MAX_STDERR_CHARS = 16 * 1024
+
+DEFAULT_HOST_SCRIPT = os.path.join(
+    os.path.dirname(__file__),
+    'powershell',
+    'shell_host.ps1'
+)
+
+
+def default_command() -> List[str]:
+    """
+    Build the interpreter command used to start shell host workers.
+
+    The ``AUTOPATCH_SHELL_COMMAND`` environment variable overrides the
+    default PowerShell command, e.g. to run a local stand-in script.
+
+    :return: Command line as a list of arguments
+    """
+    override = os.environ.get('AUTOPATCH_SHELL_COMMAND')
+    if override:
+        return shlex.split(override)
+
+    return ['powershell.exe', '-NoLogo', '-NoProfile', '-NonInteractive',
+            '-ExecutionPolicy', 'Bypass', '-File', DEFAULT_HOST_SCRIPT]
+
+
+class ShellHostError(Exception):
+    """Raised when a shell host worker cannot serve a request."""
+
+
+class ShellHostTimeout(ShellHostError):
+    """Raised when a shell host request exceeds its timeout."""
+
+
+class ShellActionError(ShellHostError):
+    """Raised when a streamed action finishes with a non-zero return code."""
+    def __init__(self, returncode: int, stderr: str):
+        super().__init__(stderr or f"Action failed with exit code {returncode}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+def process_group_options() -> Dict[str, Any]:
+    """
+    Popen options that start a process in its own process group (and without
+    a console window on Windows), so ``kill_process_tree`` can reach its children.
+    """
+    if os.name == 'nt':
+        return {'creationflags': getattr(subprocess, 'CREATE_NO_WINDOW', 0)}
+    return {'start_new_session': True}
+
+
+def kill_process_tree(process: subprocess.Popen):
+    """
+    Kill a process and every process it started, e.g. an installer spawned
+    by a script that timed out.
+
+    :param process: Process started with ``process_group_options()``
+    """
+    if os.name == 'nt':
+        if process.poll() is None:
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+    else:
+        # The group outlives its leader, so children are killed even after it exited
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    if process.poll() is None:
+        process.kill()
+
+
+def _read_tail(file, max_chars: int) -> str:
+    """Decode the last ``max_chars`` bytes of a binary file."""
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(max(0, size - max_chars))
+    return file.read().decode('utf-8', errors='replace')
+
+
+def iter_process_lines(command: List[str], timeout: float = None) -> Iterator[str]:
+    """
+    Spawn a process and yield its stdout lines as they are produced.
+    Output is read a line at a time (long lines in ``MAX_LINE_CHARS``
+    pieces) and stderr is spooled to a temporary file, so memory use does
+    not depend on how much the process prints. The timeout is enforced
+    even while the process is silent: on expiry the whole process tree is
+    killed.
+
+    :param command: Command line
+    :param timeout: Overall timeout in seconds
+    :return: Iterator of output lines (without line endings)
+    :raises ShellHostTimeout: If the process is killed on timeout
+    :raises ShellActionError: If the process exits with a non-zero code
+                              (with the end of its stderr)
+    """
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=stderr_file,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            **process_group_options()
+        )
+        timed_out = threading.Event()
+        
+        def expire():
+            timed_out.set()
+            kill_process_tree(process)
+        
+        watchdog = None
+        if timeout:
+            watchdog = threading.Timer(timeout, expire)
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            while True:
+                line = process.stdout.readline(MAX_LINE_CHARS)
+                if not line:
+                    break
+                yield line.rstrip('\r\n')
+            process.wait()
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            if process.poll() is None:
+                # The caller stopped reading early
+                kill_process_tree(process)
+                process.wait()
+            process.stdout.close()
+
+        if timed_out.is_set():
+            raise ShellHostTimeout(f"Process timed out after {timeout:.1f}s")
+        if process.returncode != 0:
+            raise ShellActionError(process.returncode, _read_tail(stderr_file, MAX_STDERR_CHARS))
+
+
+def run_process(command: List[str], timeout: float = None) -> subprocess.CompletedProcess:
+    """
+    Run a process with small output to completion, with the hard timeout
+    and process tree kill of ``iter_process_lines``.
+
+    :param command: Command line
+    :param timeout: Overall timeout in seconds
+    :return: Completed process with returncode, stdout and (the end of) stderr
+    :raises ShellHostTimeout: If the process is killed on timeout
+    """
+    try:
+        stdout = '\n'.join(iter_process_lines(command, timeout))
+    except ShellActionError as e:
+        return subprocess.CompletedProcess(command, e.returncode, '', e.stderr)
+    return subprocess.CompletedProcess(command, 0, stdout, '')
+
+
+class ShellWorker:
+    """
+    A single warm interpreter process.
+    Loads the action scripts once and serves framed requests over stdin/stdout.
+    """
+    def __init__(self, command: List[str], startup_timeout: float = 60.0):
+        """
+        Initialize a shell worker (the process is started by ``start``).
+
+        :param command: Interpreter command line
+        :param startup_timeout: Seconds to wait for the ready frame
+        """
+        self.command = list(command)
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self._frames = queue.Queue()
+        self._request_ids = itertools.count(1)
+
+    @property
+    def alive(self) -> bool:
+        """Whether the worker process is running."""
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start the worker process and wait until it reports ready."""
+        self._frames = queue.Queue()
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                bufsize=1,
+                **process_group_options()
+            )
+        except OSError as e:
+            raise ShellHostError(f"Failed to start shell host worker: {e}") from e
+
+        reader = threading.Thread(
+            target=self._read_frames,
+            args=(self.process, self._frames),
+            daemon=True
+        )
+        reader.start()
+
+        try:
+            frame = self._next_frame(self.startup_timeout)
+        except ShellHostError:
+            self.stop()
+            raise
+
+        if frame.get('kind') != 'ready':
+            self.stop()
+            raise ShellHostError(f"Unexpected startup frame from shell host: {frame}")
+
+    @staticmethod
+    def _read_frames(process: subprocess.Popen, frames: queue.Queue):
+        """Reader thread: parse framed lines from stdout into the frame queue."""
+        try:
+            for line in process.stdout:
+                if not line.startswith(FRAME_MARKER):
+                    continue
+                try:
+                    frames.put(json.loads(line[len(FRAME_MARKER):]))
+                except ValueError:
+                    continue
+        except (OSError, ValueError):
+            pass
+        finally:
+            # End-of-stream sentinel
+            frames.put(None)
+
+    def _next_frame(self, timeout: Optional[float]) -> Dict[str, Any]:
+        """
+        Wait for the next frame from the worker.
+
+        :param timeout: Seconds to wait, or None to wait indefinitely
+        :return: Decoded frame
+        """
+        try:
+            frame = self._frames.get(timeout=timeout)
+        except queue.Empty:
+            raise ShellHostTimeout(f"Shell host request timed out after {timeout:.1f}s")
+
+        if frame is None:
+            raise ShellHostError("Shell host worker exited unexpectedly")
+        return frame
+
+    def request(self, script: str, action: str, args: Dict[str, Any] = None,
+                timeout: float = None, computer: str = None) -> Iterator[Dict[str, Any]]:
+        """
+        Send one request and yield its frames up to and including the end frame.
+
+        :param script: Script name known to the host (e.g. 'device_info')
+        :param action: Action to invoke
+        :param args: Additional named arguments for the action
+        :param timeout: Overall request timeout in seconds
+        :param computer: Remote computer to run the action on via PowerShell
+                         remoting, or None for the local machine
+        :return: Iterator of response frames
+        """
+        request_id = next(self._request_ids)
+        request = {
+            'id': request_id,
+            'script': script,
+            'action': action,
+            'args': args or {}
+        }
+        if computer:
+            request['computer'] = computer
+        payload = json.dumps(request)
+
+        try:
+            self.process.stdin.write(payload + '\n')
+            self.process.stdin.flush()
+        except (OSError, ValueError, AttributeError) as e:
+            raise ShellHostError(f"Failed to send request to shell host: {e}") from e
+
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            frame = self._next_frame(remaining)
+
+            # Ignore frames left over from an earlier request
+            if frame.get('id') != request_id:
+                continue
+
+            yield frame
+            if frame.get('kind') == 'end':
+                return
+
+    def stop(self):
+        """Stop the worker process, killing it if it does not exit promptly."""
+        process, self.process = self.process, None
+        if process is None:
+            return
+
+        try:
+            process.stdin.close()
+        except (OSError, ValueError):
+            pass
+
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            # Still busy, e.g. after a request timed out: stop whatever it started too
+            kill_process_tree(process)
+            process.wait()
+
+
+class ShellHost:
+    """
+    Pool of warm shell workers.
+    Replaces one interpreter spawn per call with framed requests to long-lived
+    processes, restarting workers that crash or time out.
+    """
+    def __init__(self, command: List[str] = None, pool_size: int = None,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+                 startup_timeout: float = 60.0):
+        """
+        Initialize the shell host. Workers are started lazily on first use.
+
+        :param command: Interpreter command line (defaults to ``default_command()``)
+        :param pool_size: Maximum number of concurrent workers
+                          (defaults to ``AUTOPATCH_SHELL_POOL_SIZE`` or 3)
+        :param request_timeout: Default per-request timeout in seconds
+        :param startup_timeout: Seconds to wait for a new worker to become ready
+        """
+        if pool_size is None:
+            pool_size = int(os.environ.get('AUTOPATCH_SHELL_POOL_SIZE', '3'))
+
+        self.command = list(command) if command else default_command()
+        self.pool_size = max(1, pool_size)
+        self.request_timeout = request_timeout
+        self.startup_timeout = startup_timeout
+        self.restarts = 0
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _acquire(self) -> ShellWorker:
+        """Take an idle worker, replacing it if it has died, or start a new one."""
+        self._slots.acquire()
+        try:
+            if self._closed:
+                raise ShellHostError("Shell host is closed")
+
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = None
+
+            if worker is not None and not worker.alive:
+                worker.stop()
+                worker = None
+                with self._lock:
+                    self.restarts += 1
+
+            if worker is None:
+                worker = ShellWorker(self.command, self.startup_timeout)
+                with metrics.timer('shell_host', 'worker_start'):
+                    worker.start()
+            return worker
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, worker: ShellWorker, healthy: bool):
+        """Return a worker to the pool, or discard it if it is no longer usable."""
+        try:
+            if healthy and worker.alive and not self._closed:
+                self._idle.put(worker)
+            else:
+                worker.stop()
+                if not self._closed:
+                    with self._lock:
+                        self.restarts += 1
+        finally:
+            self._slots.release()
+
+    def stream(self, script: str, action: str, args: Dict[str, Any] = None,
+               timeout: float = None, computer: str = None) -> Iterator[Dict[str, Any]]:
+        """
+        Run an action and yield response frames as they arrive.
+
+        :param script: Script name known to the host
+        :param action: Action to invoke
+        :param args: Additional named arguments for the action
+        :param timeout: Request timeout in seconds (defaults to ``request_timeout``)
+        :param computer: Remote computer to run the action on, or None for local
+        :return: Iterator of response frames
+        """
+        operation = f'{script}.{action}'
+        with metrics.timer('shell_host', 'acquire'):
+            worker = self._acquire()
+        healthy = False
+        try:
+            with metrics.timer('shell_host', operation):
+                for frame in worker.request(script, action, args,
+                                            timeout or self.request_timeout, computer):
+                    if frame.get('kind') == 'end' and frame.get('returncode', 1) != 0:
+                        metrics.record_error('shell_host', operation)
+                    yield frame
+            healthy = True
+        finally:
+            # A worker abandoned mid-request still has output pending,
+            # so it is discarded rather than reused.
+            self._release(worker, healthy)
+
+    def iter_lines(self, script: str, action: str, args: Dict[str, Any] = None,
+                   timeout: float = None, computer: str = None) -> Iterator[str]:
+        """
+        Run an action and yield its output lines while it is still running.
+
+        :param script: Script name known to the host
+        :param action: Action to invoke
+        :param args: Additional named arguments for the action
+        :param timeout: Request timeout in seconds (defaults to ``request_timeout``)
+        :param computer: Remote computer to run the action on, or None for local
+        :return: Iterator of output lines
+        :raises ShellActionError: If the action finishes with a non-zero return code
+        """
+        # Only the end of stderr is kept for the error message
+        stderr = collections.deque()
+        stderr_chars = 0
+        for frame in self.stream(script, action, args, timeout, computer):
+            kind = frame.get('kind')
+            if kind == 'out':
+                yield str(frame.get('data', ''))
+            elif kind == 'err':
+                line = str(frame.get('data', ''))
+                stderr.append(line)
+                stderr_chars += len(line) + 1
+                while stderr_chars > MAX_STDERR_CHARS and len(stderr) > 1:
+                    stderr_chars -= len(stderr.popleft()) + 1
+            elif kind == 'end':
+                returncode = int(frame.get('returncode', 1))
+                if returncode != 0:
+                    raise ShellActionError(returncode, '\n'.join(stderr))
+
+    def run(self, script: str, action: str, args: Dict[str, Any] = None,
+            timeout: float = None, computer: str = None) -> subprocess.CompletedProcess:
+        """
+        Run an action and collect its output.
+
+        :param script: Script name known to the host
+        :param action: Action to invoke
+        :param args: Additional named arguments for the action
+        :param timeout: Request timeout in seconds (defaults to ``request_timeout``)
+        :param computer: Remote computer to run the action on, or None for local
+        :return: Completed process with returncode, stdout and stderr
+        """
+        stdout, stderr = [], []
+        returncode = 1
+
+        for frame in self.stream(script, action, args, timeout, computer):
+            kind = frame.get('kind')
+            if kind == 'out':
+                stdout.append(str(frame.get('data', '')))
+            elif kind == 'err':
+                stderr.append(str(frame.get('data', '')))
+            elif kind == 'end':
+                returncode = int(frame.get('returncode', 1))
+
+        return subprocess.CompletedProcess(
+            [script, action], returncode, '\n'.join(stdout), '\n'.join(stderr)
+        )
+
+    def close(self):
+        """Stop all idle workers and refuse further requests."""
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+
+_shell_host = None
+_shell_host_lock = threading.Lock()
+
+
+def get_shell_host() -> ShellHost:
+    """
+    Return the shared shell host, creating it on first use.
+
+    :return: Process-wide ShellHost instance
+    """
+    global _shell_host
+    with _shell_host_lock:
+        if _shell_host is None:
+            _shell_host = ShellHost()
+            atexit.register(_shell_host.close)
+        return _shell_host
@@ -0,0 +1,91 @@
+"""
+Tests for DatabaseManager's write-behind buffers: a batch that fails to
+write is retried rather than lost, and rows logged while the manager is
+closing are written directly instead of stranded in the buffer.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database
+from database import DatabaseManager
+
+SAMPLE = {'cpu_usage': 10, 'memory_usage': 20, 'disk_health': 'GOOD', 'status': 'OK'}
+
+
+class WriteBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # A long interval keeps the background writer out of the way
+        self.db = DatabaseManager(os.path.join(self.tmp.name, 'buffer.db'),
+                                  buffered=True, batch_size=1000, flush_interval=3600)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def stored(self, table: str) -> int:
+        with self.db.read_cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+            return cursor.fetchone()[0]
+
+    def reject_health_inserts(self, reject: bool):
+        with self.db.write_cursor() as cursor:
+            if reject:
+                cursor.execute('''
+                    CREATE TRIGGER reject_health BEFORE INSERT ON device_health
+                    BEGIN SELECT RAISE(ABORT, 'disk full'); END
+                ''')
+            else:
+                cursor.execute('DROP TRIGGER reject_health')
+
+    def test_failed_flush_is_retried(self):
+        self.db.log_device_health(SAMPLE)
+        self.db.log_update('KB5034441 Security Update', 'Installed')
+        self.reject_health_inserts(True)
+        self.db.flush()
+        self.assertEqual(self.stored('device_health'), 0)
+        self.assertEqual(self.stored('update_logs'), 0)
+
+        # Rows logged after the failure queue behind the failed batch
+        self.db.log_device_health(SAMPLE)
+        self.reject_health_inserts(False)
+        self.db.flush()
+        self.assertEqual(self.stored('device_health'), 2)
+        self.assertEqual(self.stored('update_logs'), 1)
+
+    def test_batch_is_dropped_after_repeated_failures(self):
+        self.db.log_device_health(SAMPLE)
+        self.reject_health_inserts(True)
+        for _ in range(database._FLUSH_ATTEMPTS):
+            self.db.flush()
+        self.reject_health_inserts(False)
+        self.db.flush()
+        self.assertEqual(self.stored('device_health'), 0)
+
+    def test_page_read_without_flush_leaves_buffer(self):
+        self.db.log_update('KB5034441 Security Update', 'Installed')
+        self.assertEqual(self.db.fetch_log_page('update_logs', flush=False), [])
+        self.assertEqual(len(self.db.fetch_log_page('update_logs')), 1)
+
+    def test_rows_logged_while_closing_are_written(self):
+        # close() has marked the manager closed but not yet closed the connection
+        with self.db._buffer_cond:
+            self.db._closed = True
+        try:
+            self.db.log_device_health(SAMPLE)
+            self.db.log_update('KB5034441 Security Update', 'Installed')
+            self.assertEqual(self.stored('device_health'), 1)
+            self.assertEqual(self.stored('update_logs'), 1)
+        finally:
+            with self.db._buffer_cond:
+                self.db._closed = False
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Stress test for DatabaseManager's connection handling: many reader threads
+on the read-only pool alongside writer threads on the writer connection and
+on a second manager over the same file (as the GUI and the headless
+collector would be). Every committed row must be found afterwards, and no
+statement may fail with "database is locked".
+
+    python -m unittest discover -s tests
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import DatabaseManager
+
+READER_THREADS = 8
+WRITER_THREADS = 3
+WRITES_PER_WRITER = 60
+WRITE_BATCH = 200
+
+
+class ConnectionStressTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'stress.db')
+        self.db = DatabaseManager(self.path, buffered=False, readers=4)
+        # Another process's connection, e.g. the headless collector
+        self.other = DatabaseManager(self.path, buffered=False, readers=0)
+
+    def tearDown(self):
+        self.other.close()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_concurrent_readers_and_writers(self):
+        errors = []
+        committed = [0]
+        counts_lock = threading.Lock()
+        writers_done = threading.Event()
+
+        def record(e: BaseException):
+            with counts_lock:
+                errors.append(f'{type(e).__name__}: {e}')
+
+        def writer(index: int):
+            db = self.other if index % 2 else self.db
+            rng = random.Random(index)
+            try:
+                for _ in range(WRITES_PER_WRITER):
+                    rows = [('2024-01-01 00:00:00', f'device-{index}', rng.uniform(1, 99),
+                             rng.uniform(20, 90), 'GOOD', 'OK') for _ in range(WRITE_BATCH)]
+                    with db.write_cursor() as cursor:
+                        cursor.executemany('''
+                            INSERT INTO device_health
+                                (timestamp, device_id, cpu_usage, memory_usage, disk_health, status)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                        ''', rows)
+                    with counts_lock:
+                        committed[0] += len(rows)
+            except Exception as e:
+                record(e)
+
+        def reader(index: int):
+            previous = 0
+            try:
+                while not writers_done.is_set():
+                    with self.db.read_cursor() as cursor:
+                        cursor.execute('SELECT COUNT(*) FROM device_health')
+                        count = cursor.fetchone()[0]
+                        cursor.execute('''
+                            SELECT id, cpu_usage FROM device_health
+                            WHERE device_id = ? ORDER BY timestamp DESC, id DESC LIMIT 50
+                        ''', (f'device-{index % WRITER_THREADS}',))
+                        cursor.fetchall()
+                    # Committed rows never disappear from a later snapshot
+                    if count < previous:
+                        raise AssertionError(f'row count went back from {previous} to {count}')
+                    previous = count
+            except Exception as e:
+                record(e)
+
+        readers = [threading.Thread(target=reader, args=(index,)) for index in range(READER_THREADS)]
+        writers = [threading.Thread(target=writer, args=(index,)) for index in range(WRITER_THREADS)]
+        for thread in readers + writers:
+            thread.start()
+        deadline = time.monotonic() + 120
+        for thread in writers:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        writers_done.set()
+        for thread in readers:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        self.assertFalse(any(thread.is_alive() for thread in readers + writers), 'stress test timed out')
+        self.assertEqual(errors, [])
+        self.assertEqual(committed[0], WRITER_THREADS * WRITES_PER_WRITER * WRITE_BATCH)
+        with self.db.read_cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM device_health')
+            self.assertEqual(cursor.fetchone()[0], committed[0])
+
+    def test_closed_pool_rejects_readers(self):
+        self.db.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            with self.db.read_cursor():
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
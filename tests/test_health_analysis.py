@@ -0,0 +1,118 @@
+"""
+Tests for the vectorized window statistics and the install regression
+verdicts built on them.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import DatabaseManager, insert_update_logs
+from health_analysis import HealthRegressionDetector, _sqlite_time, window_stats
+
+INSTALLED_AT = 1700000000
+UPDATE = '2024-01 Security Update (KB5034441)'
+
+
+class WindowStatsTest(unittest.TestCase):
+    def test_windows_match_direct_computation(self):
+        rng = np.random.default_rng(7)
+        keys = np.sort(rng.integers(0, 1000, 500))
+        values = rng.uniform(0, 100, 500)
+        starts = np.array([0, 100, 250, 990])
+        ends = np.array([50, 400, 260, 1000])
+
+        counts, means, stds = window_stats(keys, values, starts, ends)
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            window = values[(keys >= start) & (keys < end)]
+            self.assertEqual(counts[i], len(window))
+            self.assertAlmostEqual(means[i], window.mean())
+            self.assertAlmostEqual(stds[i], window.std())
+
+    def test_nan_values_are_ignored(self):
+        keys = np.array([0, 1, 2, 3])
+        values = np.array([10.0, np.nan, 30.0, np.nan])
+        counts, means, stds = window_stats(keys, values, np.array([0]), np.array([4]))
+        self.assertEqual(counts[0], 2)
+        self.assertAlmostEqual(means[0], 20.0)
+        self.assertAlmostEqual(stds[0], 10.0)
+
+    def test_empty_window_is_nan(self):
+        counts, means, _ = window_stats(np.array([0, 10]), np.array([1.0, 2.0]),
+                                        np.array([3]), np.array([7]))
+        self.assertEqual(counts[0], 0)
+        self.assertTrue(np.isnan(means[0]))
+
+
+class RegressionVerdictTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp.name, 'analysis.db'), buffered=False)
+        self.detector = HealthRegressionDetector(self.db)
+        with self.db.write_cursor() as cursor:
+            insert_update_logs(cursor, [(_sqlite_time(INSTALLED_AT), UPDATE, 'Installed', '', 'pc-1')])
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def add_samples(self, start: float, end: float, cpu: float, status: str = 'OK', step: int = 300):
+        rows = [(_sqlite_time(t), cpu + (t // step) % 3, 40.0, 'GOOD', status, 'pc-1')
+                for t in range(int(start), int(end), step)]
+        with self.db.write_cursor() as cursor:
+            cursor.executemany('''
+                INSERT INTO device_health
+                (timestamp, cpu_usage, memory_usage, disk_health, status, device_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+
+    def verdict(self) -> dict:
+        now = INSTALLED_AT + self.detector.span + 1
+        findings = self.detector.analyze(self.detector.due_installs(now))
+        self.assertEqual(len(findings), 1)
+        return findings[0]
+
+    def add_baseline(self):
+        self.add_samples(INSTALLED_AT - self.detector.baseline_window, INSTALLED_AT, cpu=20)
+
+    def add_after(self, cpu: float):
+        self.add_samples(INSTALLED_AT + self.detector.settle, INSTALLED_AT + self.detector.span, cpu=cpu)
+
+    def test_cpu_rise_is_a_regression(self):
+        self.add_baseline()
+        self.add_after(cpu=60)
+        finding = self.verdict()
+        self.assertEqual(finding['verdict'], 'regression')
+        self.assertEqual(finding['regressed'], ['cpu'])
+        self.assertEqual(finding['candidates'], [UPDATE])
+
+    def test_steady_health_is_ok(self):
+        self.add_baseline()
+        self.add_after(cpu=21)
+        self.assertEqual(self.verdict()['verdict'], 'ok')
+
+    def test_too_few_samples(self):
+        self.add_samples(INSTALLED_AT - 1500, INSTALLED_AT, cpu=20)
+        self.add_after(cpu=60)
+        self.assertEqual(self.verdict()['verdict'], 'insufficient_data')
+
+    def test_failed_collections_are_ignored(self):
+        # Failed samples are logged with zero readings; counted, they would
+        # drag the baseline down and make a steady device look regressed
+        self.add_baseline()
+        self.add_samples(INSTALLED_AT - self.detector.baseline_window + 150, INSTALLED_AT,
+                         cpu=0, status='error')
+        self.add_after(cpu=21)
+        finding = self.verdict()
+        self.assertEqual(finding['verdict'], 'ok')
+        self.assertAlmostEqual(finding['metrics']['cpu']['baseline'], 21.0, delta=0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
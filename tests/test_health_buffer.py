@@ -0,0 +1,110 @@
+"""
+Tests for the in-memory health ring buffers and chart decimation.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import DatabaseManager
+from health_buffer import HealthHistory, HealthRingBuffer, decimate
+
+SAMPLE = {'cpu_usage': 10, 'memory_usage': 20, 'disk_health': 'GOOD', 'status': 'OK'}
+
+
+def columns(cpu) -> np.ndarray:
+    cpu = np.asarray(cpu, dtype=np.float64)
+    return np.vstack((cpu, np.full_like(cpu, 50.0), np.zeros_like(cpu)))
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_wraparound_keeps_newest_in_order(self):
+        buffer = HealthRingBuffer(capacity=8)
+        for t in range(20):
+            buffer.append(dict(SAMPLE, cpu_usage=t), timestamp=float(t))
+        times, values = buffer.snapshot()
+        np.testing.assert_array_equal(times, np.arange(12, 20))
+        np.testing.assert_array_equal(values[0], np.arange(12, 20))
+        np.testing.assert_array_equal(buffer.snapshot(since=17)[0], [17, 18, 19])
+
+    def test_older_history_is_merged_by_time(self):
+        buffer = HealthRingBuffer(capacity=8)
+        for t in (100.5, 101.5):
+            buffer.append(SAMPLE, timestamp=t)
+        # Loaded history overlaps the live samples in the same seconds
+        buffer.extend(np.array([97.0, 98.0, 99.0, 100.0, 101.0]), columns([1, 2, 3, 4, 5]))
+        times, values = buffer.snapshot()
+        np.testing.assert_array_equal(times, [97, 98, 99, 100.5, 101.5])
+        np.testing.assert_array_equal(values[0], [1, 2, 3, 10, 10])
+
+    def test_merge_keeps_capacity_newest(self):
+        buffer = HealthRingBuffer(capacity=4)
+        for t in range(10, 16):
+            buffer.append(SAMPLE, timestamp=float(t))
+        buffer.extend(np.arange(0.0, 10.0), columns(np.arange(10)))
+        np.testing.assert_array_equal(buffer.snapshot()[0], [12, 13, 14, 15])
+        buffer.append(SAMPLE, timestamp=16.0)
+        np.testing.assert_array_equal(buffer.snapshot()[0], [13, 14, 15, 16])
+
+    def test_newer_history_is_appended(self):
+        buffer = HealthRingBuffer(capacity=4)
+        buffer.append(SAMPLE, timestamp=1.0)
+        buffer.extend(np.array([2.0, 3.0, 4.0, 5.0]), columns([2, 3, 4, 5]))
+        np.testing.assert_array_equal(buffer.snapshot()[0], [2, 3, 4, 5])
+
+
+class DecimateTest(unittest.TestCase):
+    def test_spikes_survive(self):
+        times = np.arange(1000.0)
+        values = np.zeros(1000)
+        values[437] = 99.0
+        out_times, out_values = decimate(times, values, buckets=10)
+        self.assertLessEqual(len(out_times), 20)
+        self.assertIn(437.0, out_times)
+        self.assertEqual(out_values.max(), 99.0)
+
+    def test_samples_at_one_instant(self):
+        times = np.full(50, 1700000000.0)
+        values = np.arange(50.0)
+        with np.errstate(all='raise'):
+            out_times, out_values = decimate(times, values, buckets=10)
+        np.testing.assert_array_equal(out_values, [0.0, 49.0])
+        np.testing.assert_array_equal(out_times, [1700000000.0] * 2)
+
+
+class HistoryLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp.name, 'history.db'), buffered=False)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_load_skips_failed_collections(self):
+        now = int(time.time())
+        rows = [(time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now - 60 + t)),
+                 0 if t % 2 else 30, 0 if t % 2 else 40, 'GOOD', 'error' if t % 2 else 'OK', 'pc-1')
+                for t in range(10)]
+        with self.db.write_cursor() as cursor:
+            cursor.executemany('''
+                INSERT INTO device_health
+                (timestamp, cpu_usage, memory_usage, disk_health, status, device_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+
+        history = HealthHistory(capacity=64)
+        self.assertEqual(history.load(self.db, 'pc-1'), 5)
+        _, values = history.buffer('pc-1').snapshot()
+        np.testing.assert_array_equal(values[0], [30] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
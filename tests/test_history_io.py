@@ -0,0 +1,86 @@
+"""
+Tests for bulk imports: indexes, triggers and the data they maintain are
+restored when an import finishes, and when the database is reopened after
+an import was killed part way.
+
+    python -m unittest discover -s tests
+"""
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from database import DatabaseManager
+from history_io import import_table
+
+ROWS = 300
+
+
+class BulkImportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'history.db')
+        self.db = DatabaseManager(self.path, buffered=False)
+        self.schema = self.objects()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def objects(self) -> set:
+        with self.db.read_cursor() as cursor:
+            cursor.execute('''
+                SELECT type, name FROM sqlite_master
+                WHERE tbl_name = 'update_logs' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+            ''')
+            return set(cursor.fetchall())
+
+    def search(self, query: str) -> int:
+        return len(self.db.search_update_logs(query, limit=ROWS * 2)['results'])
+
+    def write_export(self) -> str:
+        path = os.path.join(self.tmp.name, 'update_logs.csv')
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['timestamp', 'device_id', 'update_name', 'status', 'details'])
+            for i in range(ROWS):
+                writer.writerow([f'2024-01-01 00:{i // 60:02d}:{i % 60:02d}', 'pc-1',
+                                 f'Cumulative Update (KB50{i:05d})', 'Installed', 'imported'])
+        return path
+
+    def test_import_restores_indexes_and_search(self):
+        result = import_table(self.db, self.write_export(), chunk_size=64, commit_rows=100)
+        self.assertEqual(result, {'status': 'success', 'table': 'update_logs', 'rows': ROWS})
+        self.assertEqual(self.objects(), self.schema)
+        self.assertEqual(self.search('imported'), ROWS)
+
+    def test_killed_import_is_restored_on_open(self):
+        script = textwrap.dedent(f'''
+            import os, sys
+            sys.path.insert(0, {ROOT!r})
+            from database import DatabaseManager
+            from history_io import bulk_load
+            db = DatabaseManager({self.path!r}, buffered=False)
+            with bulk_load(db, 'update_logs'):
+                db.log_update('Cumulative Update (KB5000001)', 'Installed', 'imported')
+                os._exit(0)
+        ''')
+        subprocess.run([sys.executable, '-c', script], check=True, timeout=60)
+        self.db.close()
+
+        self.db = DatabaseManager(self.path, buffered=False)
+        self.assertEqual(self.objects(), self.schema)
+        self.assertEqual(self.search('imported'), 1)
+        with self.db.read_cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM bulk_load_saved')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Tests for the push ingestion server's report validation.
+
+    python -m unittest discover -s tests
+"""
+import gzip
+import http.client
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import DatabaseManager
+from ingest import REPORT_VERSION, REPORTS_PATH, IngestServer
+
+
+class IngestValidationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp.name, 'ingest.db'), buffered=False)
+        self.server = IngestServer(self.db, port=0)
+        self.port = self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def post(self, batch_id: str, timestamp: str) -> int:
+        report = {
+            'v': REPORT_VERSION, 'batch_id': batch_id, 'device_id': 'agent-1',
+            'health': [{'timestamp': timestamp, 'cpu_usage': 10, 'memory_usage': 20,
+                        'disk_health': 'GOOD', 'status': 'OK'}],
+        }
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            conn.request('POST', REPORTS_PATH, gzip.compress(json.dumps(report).encode()),
+                         {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    def stored_samples(self) -> int:
+        with self.db.read_cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM device_health')
+            return cursor.fetchone()[0]
+
+    def test_valid_timestamp_is_stored(self):
+        self.assertEqual(self.post('good', '2024-02-29 23:59:59'), 200)
+        self.assertEqual(self.stored_samples(), 1)
+
+    def test_impossible_date_is_rejected(self):
+        for batch_id, timestamp in (('month', '2024-13-45 99:99:99'), ('leap', '2023-02-29 00:00:00'),
+                                    ('unpadded', '2024-1-05 00:00:00')):
+            with self.subTest(timestamp=timestamp):
+                self.assertEqual(self.post(batch_id, timestamp), 400)
+        self.assertEqual(self.stored_samples(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
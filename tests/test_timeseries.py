@@ -0,0 +1,48 @@
+"""
+Tests for the health rollups.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import DatabaseManager
+from timeseries import TimeSeriesStore
+
+
+class RollupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp.name, 'timeseries.db'), buffered=False)
+        self.store = TimeSeriesStore(self.db, retention={'raw': None, '1m': None, '1h': None})
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def insert(self, timestamps):
+        with self.db.write_cursor() as cursor:
+            cursor.executemany('''
+                INSERT INTO device_health (timestamp, device_id, cpu_usage, memory_usage)
+                VALUES (?, 'device-1', 40, 60)
+            ''', [(timestamp,) for timestamp in timestamps])
+
+    def test_unparseable_timestamp_does_not_block_rollup(self):
+        self.insert(['2024-01-01 00:00:10', '2024-13-45 99:99:99', '2024-01-01 00:00:50'])
+        self.assertEqual(self.store.run_maintenance()['rolled_up'], 3)
+
+        self.insert(['2024-01-01 00:01:10'])
+        self.assertEqual(self.store.run_maintenance()['rolled_up'], 1)
+
+        with self.db.read_cursor() as cursor:
+            cursor.execute('SELECT bucket, samples, cpu_sum FROM device_health_1m ORDER BY bucket')
+            self.assertEqual(cursor.fetchall(), [('2024-01-01 00:00:00', 2, 80.0),
+                                                 ('2024-01-01 00:01:00', 1, 40.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,307 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Union
+
+# Rollup resolutions: name -> (bucket seconds, strftime bucket format)
+ROLLUPS = {
+    '1m': (60, '%Y-%m-%d %H:%M:00'),
+    '1h': (3600, '%Y-%m-%d %H:00:00'),
+    '1d': (86400, '%Y-%m-%d 00:00:00'),
+}
+
+# Default retention in days (None keeps data forever)
+DEFAULT_RETENTION = {
+    'raw': 7,
+    '1m': 30,
+    '1h': 365,
+    '1d': None,
+}
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+Timestamp = Union[str, datetime]
+
+
+def _format_timestamp(value: Timestamp) -> str:
+    """Normalize a datetime or timestamp string to SQLite's UTC text format."""
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return str(value)
+
+
+class TimeSeriesStore:
+    """
+    Time-series layer over the device_health table.
+    Maintains 1-minute, 1-hour and 1-day rollups with min/max/avg CPU and
+    memory, enforces raw-data retention with incremental compaction, and
+    answers range queries from the coarsest table that fits the resolution.
+    """
+    def __init__(self, db=None, retention: Dict[str, Optional[int]] = None,
+                 rollup_batch: int = 50000, delete_batch: int = 10000):
+        """
+        Initialize the time-series store and create rollup tables.
+
+        :param db: DatabaseManager to operate on (defaults to the shared manager)
+        :param retention: Retention in days per table ('raw', '1m', '1h', '1d')
+        :param rollup_batch: Maximum raw rows folded into rollups per step
+        :param delete_batch: Maximum rows deleted per compaction step
+        """
+        if db is None:
+            from database import get_db_manager
+            db = get_db_manager()
+
+        self.db = db
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.rollup_batch = rollup_batch
+        self.delete_batch = delete_batch
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create rollup tables and the rollup watermark table."""
+        with self.db.lock, self.db.conn:
+            cursor = self.db.conn.cursor()
+            for name in ROLLUPS:
+                cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS device_health_{name} (
+                        device_id TEXT NOT NULL,
+                        bucket DATETIME NOT NULL,
+                        samples INTEGER NOT NULL,
+                        cpu_min REAL, cpu_max REAL, cpu_sum REAL,
+                        memory_min REAL, memory_max REAL, memory_sum REAL,
+                        PRIMARY KEY (device_id, bucket)
+                    )
+                ''')
+                cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS idx_device_health_{name}_bucket
+                    ON device_health_{name} (bucket)
+                ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS timeseries_state (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER
+                )
+            ''')
+
+    def _get_state(self, cursor: sqlite3.Cursor, key: str) -> int:
+        cursor.execute('SELECT value FROM timeseries_state WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _set_state(self, cursor: sqlite3.Cursor, key: str, value: int):
+        cursor.execute('''
+            INSERT INTO timeseries_state (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (key, value))
+
+    def rollup(self) -> int:
+        """
+        Fold raw samples added since the last run into every rollup table.
+        Each step handles at most ``rollup_batch`` rows in one transaction.
+
+        :return: Number of raw rows processed
+        """
+        self.db.flush()
+        processed = 0
+
+        while True:
+            with self.db.lock, self.db.conn:
+                cursor = self.db.conn.cursor()
+                # The GUI and the headless collector may share the database: take
+                # the write lock before reading the watermark so two processes
+                # never fold the same rows
+                cursor.execute('BEGIN IMMEDIATE')
+                watermark = self._get_state(cursor, 'rollup_watermark')
+                cursor.execute('SELECT MAX(id) FROM device_health')
+                max_id = cursor.fetchone()[0] or 0
+                if max_id <= watermark:
+                    break
+
+                upper = min(max_id, watermark + self.rollup_batch)
+                for name, (_, bucket_format) in ROLLUPS.items():
+                    # Merge new samples into existing buckets; sums keep averages exact.
+                    # Rows whose timestamp SQLite cannot parse have no bucket and are
+                    # left out, so one bad row cannot stop the watermark advancing.
+                    cursor.execute(f'''
+                        INSERT INTO device_health_{name} AS r
+                            (device_id, bucket, samples, cpu_min, cpu_max, cpu_sum,
+                             memory_min, memory_max, memory_sum)
+                        SELECT COALESCE(device_id, ''), strftime('{bucket_format}', timestamp),
+                               COUNT(*), MIN(cpu_usage), MAX(cpu_usage), SUM(cpu_usage),
+                               MIN(memory_usage), MAX(memory_usage), SUM(memory_usage)
+                        FROM device_health
+                        WHERE id > ? AND id <= ? AND strftime('{bucket_format}', timestamp) IS NOT NULL
+                        GROUP BY 1, 2
+                        ON CONFLICT(device_id, bucket) DO UPDATE SET
+                            samples = r.samples + excluded.samples,
+                            cpu_min = MIN(r.cpu_min, excluded.cpu_min),
+                            cpu_max = MAX(r.cpu_max, excluded.cpu_max),
+                            cpu_sum = r.cpu_sum + excluded.cpu_sum,
+                            memory_min = MIN(r.memory_min, excluded.memory_min),
+                            memory_max = MAX(r.memory_max, excluded.memory_max),
+                            memory_sum = r.memory_sum + excluded.memory_sum
+                    ''', (watermark, upper))
+
+                self._set_state(cursor, 'rollup_watermark', upper)
+                processed += upper - watermark
+
+        return processed
+
+    def enforce_retention(self) -> int:
+        """
+        Delete expired rows in small batches. Raw samples are only deleted
+        once they have been folded into the rollups.
+
+        :return: Number of rows deleted
+        """
+        deleted = 0
+        now = datetime.now(timezone.utc)
+
+        for name, days in self.retention.items():
+            if days is None:
+                continue
+            table = 'device_health' if name == 'raw' else f'device_health_{name}'
+            column = 'timestamp' if name == 'raw' else 'bucket'
+            cutoff = _format_timestamp(now - timedelta(days=days))
+
+            while True:
+                with self.db.lock, self.db.conn:
+                    cursor = self.db.conn.cursor()
+                    cursor.execute('BEGIN IMMEDIATE')
+                    if name == 'raw':
+                        watermark = self._get_state(cursor, 'rollup_watermark')
+                        cursor.execute('''
+                            DELETE FROM device_health WHERE id IN (
+                                SELECT id FROM device_health
+                                WHERE timestamp < ? AND id <= ?
+                                LIMIT ?
+                            )
+                        ''', (cutoff, watermark, self.delete_batch))
+                    else:
+                        cursor.execute(f'''
+                            DELETE FROM {table} WHERE rowid IN (
+                                SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?
+                            )
+                        ''', (cutoff, self.delete_batch))
+                    count = cursor.rowcount
+                deleted += count
+                if count < self.delete_batch:
+                    break
+
+        if deleted:
+            self._compact()
+        return deleted
+
+    def _compact(self, pages: int = 1000):
+        """Return free pages to the file system a chunk at a time."""
+        with self.db.lock:
+            cursor = self.db.conn.cursor()
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] == 2:
+                cursor.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+                cursor.fetchall()
+
+    def run_maintenance(self) -> Dict[str, int]:
+        """
+        Run one rollup and retention pass.
+
+        :return: Counts of rolled-up and deleted rows
+        """
+        try:
+            return {'rolled_up': self.rollup(), 'deleted': self.enforce_retention()}
+        except sqlite3.Error as e:
+            print(f"Database error during time-series maintenance: {e}")
+            return {'rolled_up': 0, 'deleted': 0}
+
+    def start(self, interval: float = 60.0):
+        """
+        Run maintenance periodically on a background thread.
+
+        :param interval: Seconds between maintenance passes
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+
+        def loop():
+            while not self._stop_event.wait(interval):
+                self.run_maintenance()
+
+        self._thread = threading.Thread(target=loop, name='timeseries-maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop background maintenance."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    @staticmethod
+    def pick_table(resolution: float) -> str:
+        """
+        Choose the coarsest table whose bucket size fits the resolution.
+
+        :param resolution: Requested seconds per point
+        :return: 'raw', '1m', '1h' or '1d'
+        """
+        chosen = 'raw'
+        for name, (seconds, _) in ROLLUPS.items():
+            if resolution >= seconds:
+                chosen = name
+        return chosen
+
+    def query_health(self, start: Timestamp, end: Timestamp, resolution: float = 0,
+                     device_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Query CPU and memory statistics over a time range.
+
+        :param start: Range start (inclusive, UTC)
+        :param end: Range end (exclusive, UTC)
+        :param resolution: Desired seconds per point; selects raw data or a rollup
+        :param device_id: Restrict to one device, or None for all devices
+        :return: Points with bucket, device_id, samples and min/max/avg values
+        """
+        table = self.pick_table(resolution)
+        params = [_format_timestamp(start), _format_timestamp(end)]
+        device_filter = ''
+        if device_id is not None:
+            device_filter = 'AND device_id = ?'
+            params.append(device_id)
+
+        if table == 'raw':
+            self.db.flush()
+            sql = f'''
+                SELECT timestamp, device_id, 1,
+                       cpu_usage, cpu_usage, cpu_usage,
+                       memory_usage, memory_usage, memory_usage
+                FROM device_health
+                WHERE timestamp >= ? AND timestamp < ? {device_filter}
+                ORDER BY timestamp
+            '''
+        else:
+            # Include the bucket that contains the range start
+            bucket_format = ROLLUPS[table][1]
+            sql = f'''
+                SELECT bucket, device_id, samples,
+                       cpu_min, cpu_max, cpu_sum / samples,
+                       memory_min, memory_max, memory_sum / samples
+                FROM device_health_{table}
+                WHERE bucket >= strftime('{bucket_format}', ?) AND bucket < ? {device_filter}
+                ORDER BY bucket
+            '''
+
+        columns = ('bucket', 'device_id', 'samples', 'cpu_min', 'cpu_max', 'cpu_avg',
+                   'memory_min', 'memory_max', 'memory_avg')
+        try:
+            with self.db.read_cursor() as cursor:
+                cursor.execute(sql, params)
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Database error when querying health time series: {e}")
+            return []
@@ -0,0 +1,178 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from update_tracker import get_update_tracker, WindowsUpdateTracker
+from protocol import UpdateRecord
+
+
+class PendingUpdatesCache:
+    """
+    TTL cache in front of pending-update scans.
+    Concurrent requests share one in-flight scan, and every new scan is
+    diffed against the previous one so consumers only process changes.
+    """
+    def __init__(self, tracker: WindowsUpdateTracker = None, ttl: float = 900.0,
+                 db=None, device_id: Optional[str] = None):
+        """
+        Initialize the pending updates cache.
+
+        :param tracker: Tracker used to scan (defaults to the shared tracker)
+        :param ttl: Seconds a successful scan stays fresh
+        :param db: Optional DatabaseManager whose pending_updates snapshot is
+                   kept in sync by applying each diff
+        :param device_id: Device the snapshot belongs to (defaults to this machine)
+        """
+        self.tracker = tracker or get_update_tracker()
+        self.ttl = ttl
+        self.db = db
+        self.device_id = device_id
+
+        self._lock = threading.Lock()
+        self._inflight = None
+        self._result = None
+        self._expires_at = 0.0
+        self._generation = 0
+
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'scans': 0,
+            'scan_errors': 0,
+            'invalidations': 0,
+            'last_scan_seconds': 0.0,
+            'total_scan_seconds': 0.0,
+        }
+
+    def invalidate(self):
+        """Expire the cached scan, e.g. after an install or rollback."""
+        with self._lock:
+            self._expires_at = 0.0
+            self._stats['invalidations'] += 1
+            # A scan already running may predate the change; don't trust it either
+            if self._inflight is not None:
+                self._inflight['stale'] = True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return cache counters.
+
+        :return: Hits, misses, coalesced waits, scan counts and scan latency
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        scans = stats['scans'] or 1
+        stats['avg_scan_seconds'] = stats['total_scan_seconds'] / scans
+        return stats
+
+    def get(self, force: bool = False,
+            on_record: Optional[Callable[[UpdateRecord], None]] = None) -> Dict[str, Any]:
+        """
+        Return pending updates, scanning only if the cache is stale.
+
+        :param force: Scan even if the cached result is still fresh
+        :param on_record: Called with each update record as the scan streams
+                          (only for the caller that performs the scan)
+        :return: Dictionary with status, pending_updates, the diff against the
+                 previous scan (added, removed, unchanged), generation and cached
+        """
+        with self._lock:
+            if not force and self._result is not None and time.monotonic() < self._expires_at:
+                self._stats['hits'] += 1
+                return dict(self._result, cached=True)
+
+            inflight = self._inflight
+            leader = inflight is None
+            if leader:
+                self._stats['misses'] += 1
+                inflight = self._inflight = {'done': threading.Event(), 'result': None, 'stale': False}
+            else:
+                # Single flight: wait for the scan that is already running
+                self._stats['coalesced'] += 1
+
+        if leader:
+            return self._scan(inflight, on_record)
+
+        inflight['done'].wait()
+        return dict(inflight['result'], cached=True)
+
+    def _scan(self, inflight: Dict[str, Any], on_record) -> Dict[str, Any]:
+        """Run a scan, diff it against the previous one and publish the result."""
+        started = time.monotonic()
+        records = []
+        error = None
+        aborted = None
+        scan = self.tracker.iter_pending_updates()
+        try:
+            for record in scan:
+                records.append(record)
+                if on_record:
+                    try:
+                        on_record(record)
+                    except BaseException as e:
+                        # The caller gave up (e.g. cancellation): stop the scan
+                        aborted = e
+                        error = f"Scan aborted: {e!r}"
+                        break
+        except Exception as e:
+            error = str(e)
+        finally:
+            scan.close()
+        elapsed = time.monotonic() - started
+
+        with self._lock:
+            self._stats['scans'] += 1
+            self._stats['last_scan_seconds'] = elapsed
+            self._stats['total_scan_seconds'] += elapsed
+
+            if error is not None:
+                self._stats['scan_errors'] += 1
+                result = {'status': 'error', 'message': error}
+            else:
+                result = self._publish(records, expired=inflight['stale'])
+
+            self._inflight = None
+
+        inflight['result'] = result
+        inflight['done'].set()
+
+        if aborted is not None:
+            raise aborted
+
+        if error is None and self.db is not None:
+            self._sync_database(result)
+
+        return dict(result, cached=False)
+
+    def _publish(self, records: List[UpdateRecord], expired: bool) -> Dict[str, Any]:
+        """Store a successful scan and compute its diff (caller holds the lock)."""
+        titles = list(dict.fromkeys(record.title for record in records))
+        previous = self._result['pending_updates'] if self._result else []
+        previous_set = set(previous)
+        current_set = set(titles)
+
+        self._generation += 1
+        self._result = {
+            'status': 'success',
+            'pending_updates': titles,
+            'records': records,
+            'added': [title for title in titles if title not in previous_set],
+            'removed': [title for title in previous if title not in current_set],
+            'unchanged': [title for title in titles if title in previous_set],
+            'generation': self._generation,
+            'scanned_at': time.time(),
+        }
+        self._expires_at = 0.0 if expired else time.monotonic() + self.ttl
+        return self._result
+
+    def _sync_database(self, result: Dict[str, Any]):
+        """Apply the scan diff to the stored pending-update snapshot."""
+        from database import LOCAL_DEVICE_ID
+        device_id = self.device_id or LOCAL_DEVICE_ID
+
+        if result['generation'] == 1:
+            self.db.replace_pending_updates(device_id, result['pending_updates'])
+        else:
+            # An empty diff still records the time of the successful scan
+            self.db.apply_pending_updates_diff(device_id, result['added'], result['removed'])
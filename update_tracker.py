@@ -1,18 +1,43 @@
-import subprocess
 import os
 import sys
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Iterator, List, Optional
+
+from shell_host import ShellHost, ShellActionError, ShellHostTimeout, get_shell_host, iter_process_lines
+from protocol import UpdateRecord, iter_records
+from metrics import instrumented, registry as metrics
+from output_store import OutputCapture, OutputStore, STDERR, get_output_store
+
+@instrumented('parse', 'pending_updates')
+def parse_pending_updates(output: str) -> List[str]:
+    """
+    Parse CheckUpdates output (NDJSON update records or legacy title lines)
+    into update titles.
+    
+    :param output: Script stdout
+    :return: List of pending update titles
+    """
+    return [record.title for record in iter_records(output.splitlines(), 'update')]
 
 class WindowsUpdateTracker:
     """
     Manages Windows update tracking, installation, and rollback operations.
     Integrates with PowerShell scripts for update management.
     """
-    def __init__(self, powershell_script_path: str = None):
+    # Per-request timeouts in seconds
+    scan_timeout = 1800.0
+    install_timeout = 4 * 3600.0
+
+    def __init__(self, powershell_script_path: str = None, shell_host: ShellHost = None,
+                 output_store: OutputStore = None):
         """
         Initialize Windows Update Tracker.
         
         :param powershell_script_path: Path to PowerShell update management script
+        :param shell_host: Warm shell host to run actions on. Defaults to the
+                           shared host unless a custom script path is given,
+                           in which case a process is spawned per call.
+        :param output_store: Where the full output of installs and rollbacks
+                             is kept (defaults to the shared database on first use)
         """
         # Default script path if not provided
         if not powershell_script_path:
@@ -21,9 +46,52 @@ class WindowsUpdateTracker:
                 'powershell', 
                 'update_manager.ps1'
             )
+            if shell_host is None:
+                shell_host = get_shell_host()
         
         self.script_path = powershell_script_path
+        self.shell_host = shell_host
+        self.output_store = output_store
+    
+    def _command(self, action: str, args: Dict[str, Any] = None) -> List[str]:
+        """Build the command line for running an action in a new process."""
+        cmd_args = ['powershell.exe', '-ExecutionPolicy', 'Bypass', '-File', self.script_path, 
+                    '-Action', action]
+        for name, value in (args or {}).items():
+            if isinstance(value, (list, tuple)):
+                value = ','.join(value)
+            cmd_args.extend([f'-{name}', str(value)])
+        return cmd_args
+    
+    def _iter_action_lines(self, action: str, timeout: float = None,
+                           args: Dict[str, Any] = None) -> Iterator[str]:
+        """
+        Run an update management action and yield output lines as they arrive.
+        
+        :param action: Script action to run
+        :param timeout: Request timeout in seconds
+        :param args: Additional named script arguments
+        :return: Iterator of output lines
+        """
+        if self.shell_host is not None:
+            # The bundled scripts served by the host emit NDJSON records
+            return self.shell_host.iter_lines('update_manager', action,
+                                              dict(args or {}, Format='Json'), timeout)
+        
+        return metrics.timed_iterator('subprocess', f'update_manager.{action}',
+                                      iter_process_lines(self._command(action, args), timeout))
+    
+    def iter_pending_updates(self) -> Iterator[UpdateRecord]:
+        """
+        Stream pending Windows updates while the scan is still running.
+        
+        :return: Iterator of update records, one per pending update
+        :raises ShellHostError: If the scan fails or times out
+        :raises ProtocolError: If the script emits a malformed record
+        """
+        return iter_records(self._iter_action_lines('CheckUpdates', self.scan_timeout), 'update')
     
+    @instrumented('update_tracker')
     def check_pending_updates(self) -> Dict[str, Any]:
         """
         Check for pending Windows updates.
@@ -31,97 +99,117 @@ class WindowsUpdateTracker:
         :return: Dictionary of pending update information
         """
         try:
-            # Execute PowerShell script to check updates
-            result = subprocess.run(
-                ['powershell.exe', '-ExecutionPolicy', 'Bypass', '-File', self.script_path, 
-                 '-Action', 'CheckUpdates'],
-                capture_output=True, 
-                text=True
-            )
-            
-            # Parse and return update information
-            # This is a simplified mock implementation
-            if result.returncode == 0:
-                return {
-                    'status': 'success',
-                    'pending_updates': result.stdout.strip().split('\n') if result.stdout else []
-                }
-            else:
-                return {
-                    'status': 'error',
-                    'message': result.stderr
-                }
+            # Collect streamed update records
+            return {
+                'status': 'success',
+                'pending_updates': [record.title for record in self.iter_pending_updates()]
+            }
         except Exception as e:
             return {
                 'status': 'error',
                 'message': str(e)
             }
     
+    def _capture_action(self, action: str, args: Dict[str, Any] = None, subject: str = None,
+                        on_output: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Run a long action, streaming its output into the output store.
+        
+        :param action: Script action to run
+        :param args: Additional named script arguments
+        :param subject: What the action runs on, recorded with the output
+        :param on_output: Called with each output line as it arrives (must not raise)
+        :return: Result with status, the last lines of 'output' and 'error',
+                 and 'output_id' for reading the full output from the store
+        """
+        if self.output_store is None:
+            self.output_store = get_output_store()
+        capture = OutputCapture(self.output_store, f'update_manager.{action}', subject)
+        try:
+            for line in self._iter_action_lines(action, self.install_timeout, args):
+                capture.add(line)
+                if on_output:
+                    on_output(line)
+        except Exception as e:
+            if isinstance(e, ShellActionError):
+                for line in e.stderr.splitlines():
+                    capture.add(line, STDERR)
+            status = 'timeout' if isinstance(e, ShellHostTimeout) else 'error'
+            return dict(capture.finish(status), status='error', message=str(e))
+        return dict(capture.finish('success'), status='success')
+    
+    @instrumented('update_tracker')
     def install_updates(self, updates: list = None) -> Dict[str, Any]:
         """
         Install specified Windows updates.
         
         :param updates: List of specific updates to install
-        :return: Update installation result
+        :return: Update installation result (output tails plus 'output_id')
         """
-        try:
-            # Prepare command arguments
-            cmd_args = ['powershell.exe', '-ExecutionPolicy', 'Bypass', '-File', self.script_path, 
-                        '-Action', 'InstallUpdates']
-            
-            if updates:
-                cmd_args.extend(['-Updates', ','.join(updates)])
-            
-            # Execute update installation
-            result = subprocess.run(
-                cmd_args,
-                capture_output=True, 
-                text=True
-            )
-            
-            return {
-                'status': 'success' if result.returncode == 0 else 'error',
-                'output': result.stdout,
-                'error': result.stderr
-            }
-        except Exception as e:
-            return {
-                'status': 'error',
-                'message': str(e)
-            }
+        # Prepare action arguments
+        args = {}
+        if updates:
+            args['Updates'] = list(updates)
+        
+        return self._capture_action('InstallUpdates', args, ', '.join(updates or []) or None)
     
+    @instrumented('update_tracker')
+    def download_update(self, update: str,
+                        on_output: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Download one update without installing it.
+        
+        :param update: KB id or update title
+        :param on_output: Called with each output line as it arrives
+        :return: Download result (output tails plus 'output_id')
+        """
+        return self._capture_action('DownloadUpdate', {'UpdateID': update}, update, on_output)
+    
+    @instrumented('update_tracker')
+    def install_update(self, update: str,
+                       on_output: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Install one previously downloaded update, without rebooting.
+        
+        :param update: KB id or update title
+        :param on_output: Called with each output line as it arrives
+        :return: Installation result (output tails plus 'output_id')
+        """
+        return self._capture_action('InstallUpdate', {'UpdateID': update}, update, on_output)
+    
+    @instrumented('update_tracker')
     def rollback_updates(self, update_id: str = None) -> Dict[str, Any]:
         """
         Roll back specific or recent Windows updates.
         
         :param update_id: Specific update to roll back
-        :return: Rollback operation result
+        :return: Rollback operation result (output tails plus 'output_id')
         """
-        try:
-            # Prepare rollback command
-            cmd_args = ['powershell.exe', '-ExecutionPolicy', 'Bypass', '-File', self.script_path, 
-                        '-Action', 'RollbackUpdates']
-            
-            if update_id:
-                cmd_args.extend(['-UpdateID', update_id])
-            
-            # Execute rollback
-            result = subprocess.run(
-                cmd_args,
-                capture_output=True, 
-                text=True
-            )
-            
-            return {
-                'status': 'success' if result.returncode == 0 else 'error',
-                'output': result.stdout,
-                'error': result.stderr
-            }
-        except Exception as e:
-            return {
-                'status': 'error',
-                'message': str(e)
-            }
+        # Prepare rollback arguments
+        args = {}
+        if update_id:
+            args['UpdateID'] = update_id
+        
+        return self._capture_action('RollbackUpdates', args, update_id)
+
+# Singleton instance for global access, created on first use
+_update_tracker = None
+
+
+def get_update_tracker() -> WindowsUpdateTracker:
+    """
+    Return the shared update tracker, creating it on first use.
+
+    :return: Process-wide WindowsUpdateTracker instance
+    """
+    global _update_tracker
+    if _update_tracker is None:
+        _update_tracker = WindowsUpdateTracker()
+    return _update_tracker
+
 
-# Singleton instance for global access
-update_tracker = WindowsUpdateTracker()
\ No newline at end of file
+def __getattr__(name):
+    # Keeps ``from update_tracker import update_tracker`` working lazily
+    if name == 'update_tracker':
+        return get_update_tracker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file